@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+"""
+aio
+~~~
+
+An asyncio client for the Scryfall.com API. It has the same API
+calls as scrycli, as coroutines, and validates their responses at
+the same trust boundaries. It needs aiohttp, which is an optional
+dependency of scrycli.
+
+Requests share the rate limiter in scrycli.LIMITER with the
+synchronous client, so the two together stay under Scryfall.com's
+rate limit. They also share the retry policy in scrycli.RETRY. Both
+are looked up for each request, so replacing them in scrycli also
+changes them here.
+Responses are not stored in scrycli's HTTP cache.
+
+:copyright: © 2018 Paul J. Iutzi
+:license: MIT, see LICENSE for more details.
+"""
+from asyncio import (ensure_future, get_running_loop, 
+                     run_coroutine_threadsafe, sleep)
+from warnings import warn
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from scrycli import config
+from scrycli import scrycli as SC
+import scrycli.pyvalidate.pyvalidate as PV
+
+
+# Global configuration settings.
+FQDN = config.fqdn
+POOL_MAXSIZE = config.pool_maxsize
+
+# Exception messages.
+msg = {
+    'aiohttp': 'scrycli.aio requires aiohttp.',
+    'unclosed': ('The scrycli.aio session of a finished event loop '
+                 'was not closed. Await scrycli.aio.close() before '
+                 'the loop finishes.'),
+}
+
+
+# API calls.
+@PV.trust_boundary
+async def sets():
+    """Get a list of the MtG sets from Scryfall.com.
+    
+    :return: :class:tuple of the Content-Type header and the raw
+        response contents from Scryfall.com
+    :rtype: tuple
+    
+    Warning::
+        
+        The PV.trust_boundary decorator alters the return type of
+        this coroutine to a :class:dict that contains a list of the
+        details of each MtG set, like scrycli.sets().
+    """
+    url = FQDN + '/sets'
+    ctype, content = await _get(url)
+    return ctype, content
+
+
+@PV.trust_boundary
+async def sets_code(code: str, pretty: bool = False):
+    """Get the details for a specific set.
+    
+    :param code: The three of four letter set code.
+    :param pretty: (Optional.) Indicate whether you want the
+        JSON to be returned in a human readable format. Only
+        use for testing.
+    :return: :class:tuple of the Content-Type header and the raw
+        response contents from Scryfall.com
+    :rtype: tuple
+    
+    Warning::
+        
+        The PV.trust_boundary decorator alters the return type of
+        this coroutine to a :class:dict that contains the details
+        of a MtG set, like scrycli.sets_code().
+    """
+    url = FQDN + '/sets/' + code
+    params = {}
+    if pretty:
+        params['pretty'] = True
+    ctype, content = await _get(url, params)
+    return ctype, content
+
+
+@PV.trust_boundary
+async def cards(page: int = None):
+    """Pull a list of cards from Scryfall.com.
+    
+    :param page: (Optional.) The results page to request from
+        Scryfall.com.
+    :return: :class:tuple of the Content-Type header and the raw
+        response contents from Scryfall.com
+    :rtype: tuple
+    
+    Warning::
+        
+        The PV.trust_boundary decorator alters the return type of
+        this coroutine to a :class:dict that contains a page of the
+        list of MtG cards, like scrycli.cards().
+    """
+    url = FQDN + '/cards'
+    params = {}
+    if page:
+        params['page'] = page
+    ctype, content = await _get(url, params)
+    return ctype, content
+
+
+@PV.trust_boundary
+async def cards_search(q, unique=None, order=None, dir=None,
+                       include_extras=None, include_multilingual=None,
+                       page=None, format=None, pretty=None):
+    """Search the cards in the Scryfall.com database. The parameters
+    are the same as scrycli.cards_search().
+    
+    :return: The content type and response data as a :class:tuple.
+    :rtype: tuple
+    
+    Warning::
+        
+        The PV.trust_boundary decorator alters the return type of
+        this coroutine to a :class:dict that contains the results
+        of the search, like scrycli.cards_search().
+    """
+    url = FQDN + '/cards/search'
+    params = {
+        'q': q,
+        'unique': unique,
+        'order': order,
+        'dir': dir,
+        'include_extras': include_extras,
+        'include_multilingual': include_multilingual,
+        'page': page,
+        'format': format,
+        'pretty': pretty,
+    }
+    params = {key: params[key] for key in params if params[key]}
+    ctype, content = await _get(url, params)
+    return ctype, content
+
+
+# Paging.
+def iter_cards(page: int = 1, prefetch: bool = False):
+    """Iterate over every card in Scryfall.com's card list, fetching
+    each page as it is needed.
+    
+    :param page: (Optional.) The page to start from. If missing, it
+        defaults to 1.
+    :param prefetch: (Optional.) If true, the next page is requested
+        in another task while the current page is consumed. If
+        missing, it defaults to false.
+    :return: An async generator that yields a :class:dict that
+        contains the details of each MtG card.
+    :rtype: async_generator
+    """
+    return _iter_pages(cards, {}, page, prefetch)
+
+
+def iter_cards_search(q, unique=None, order=None, dir=None,
+                      include_extras=None, include_multilingual=None,
+                      page=1, prefetch=False):
+    """Iterate over every card matching a search, fetching each page
+    of results as it is needed. The parameters are the same as
+    scrycli.iter_cards_search().
+    
+    :return: An async generator that yields a :class:dict that
+        contains the details of each MtG card.
+    :rtype: async_generator
+    
+    Usage::
+        
+        async for card in iter_cards_search('set:ktk'):
+            print(card['name'])
+    """
+    kwargs = {
+        'unique': unique,
+        'order': order,
+        'dir': dir,
+        'include_extras': include_extras,
+        'include_multilingual': include_multilingual,
+    }
+    return _iter_pages(cards_search, dict(kwargs, q=q), page, prefetch)
+
+
+# HTTP session management.
+_session = None
+_session_loop = None
+
+
+async def close():
+    """Close the pooled HTTP session used to talk to Scryfall.com.
+    
+    The session belongs to the event loop it was opened in, so close
+    it before that loop finishes. The next API call opens a new
+    session.
+    
+    :return: None.
+    :rtype: NoneType
+    """
+    global _session
+    if _session is not None:
+        session = _session
+        _session = None
+        await session.close()
+
+
+# Private functions.
+async def _iter_pages(fn, kwargs, page, prefetch=False):
+    """Yield the items in each page returned by a paged API call 
+    until there are no more pages. If prefetch is true, the request 
+    for the next page is made in a task while the current page is 
+    yielded.
+    """
+    task = None
+    try:
+        while True:
+            if task is not None:
+                cardslist = await task
+                task = None
+            else:
+                cardslist = await fn(page=page, **kwargs)
+            has_more = cardslist['has_more']
+            if has_more:
+                page += 1
+                if prefetch:
+                    task = ensure_future(fn(page=page, **kwargs))
+            for card in cardslist['data']:
+                yield card
+            if not has_more:
+                break
+    finally:
+        if task is not None:
+            task.cancel()
+
+
+async def _get_session():
+    """Get the pooled HTTP session for the running event loop,
+    creating it if needed. An open session from another event loop
+    is closed first.
+    """
+    global _session, _session_loop
+    if aiohttp is None:
+        raise ImportError(msg['aiohttp'])
+    loop = get_running_loop()
+    if _session is not None and _session_loop is not loop:
+        session, _session = _session, None
+        await _close_session(session, _session_loop)
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(limit_per_host=POOL_MAXSIZE)
+        _session = aiohttp.ClientSession(connector=connector)
+        _session_loop = loop
+    return _session
+
+
+async def _close_session(session, loop):
+    """Close a session from another event loop. If that loop is 
+    running in another thread, the session is closed there. If the 
+    loop has already finished, its connections can't be closed 
+    cleanly, so a ResourceWarning is raised.
+    """
+    if session.closed:
+        return
+    if loop.is_running():
+        run_coroutine_threadsafe(session.close(), loop)
+        return
+    if loop.is_closed():
+        warn(msg['unclosed'], ResourceWarning)
+    await session.close()
+
+
+async def _get(url: str, params: dict = {}):
+    """Make an HTTP request and handle error responses. If 
+    scrycli.LIMITER is set, each try waits until the rate limit 
+    allows it. If scrycli.RETRY is set, failed requests it allows 
+    are retried after its delay.
+    """
+    params = {key: _param(params[key]) for key in params}
+    limiter = SC.LIMITER
+    policy = SC.RETRY
+    if policy:
+        policy.record_request()
+    attempt = 0
+    while True:
+        if limiter:
+            await limiter.acquire_async()
+        session = await _get_session()
+        async with session.get(url, params=params) as resp:
+            attempt += 1
+            wait = None
+            if policy and resp.status >= 400:
+                wait = policy.delay(attempt, resp.status, 
+                                    resp.headers.get('Retry-After'))
+            if wait is None:
+                SC._raise_for_status(resp.status, resp.reason)
+                content = await resp.read()
+                return resp.headers['Content-Type'], content
+        await sleep(wait)
+
+
+def _param(value):
+    """Convert a parameter to a type aiohttp accepts."""
+    if isinstance(value, bool):
+        return str(value).lower()
+    return value
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+bulk
+~~~~
+
+Ingestion of Scryfall.com's bulk data files. The cards in a file are
+parsed and validated one at a time and emitted into a sink in
+batches, so the file is never loaded whole.
+
+A sink is any callable that takes a list of card :class:dict
+objects.
+
+:copyright: © 2018 Paul J. Iutzi
+:license: MIT, see LICENSE for more details.
+"""
+from itertools import islice
+import os
+from urllib.parse import urlparse
+
+from scrycli import config
+from scrycli import scrycli as SC
+
+
+# Common exception messages.
+msg = {
+    'batch': 'Batch size must be at least 1.',
+    'type': 'Scryfall.com has no bulk data of type {}.',
+}
+
+
+def find_bulk_data(type: str = 'default_cards'):
+    """Get the details of a bulk data file.
+    
+    :param type: (Optional.) The type of the bulk data file. This
+        defaults to 'default_cards'.
+    :return: A :class:dict that contains the details of the bulk
+        data file.
+    :rtype: dict
+    """
+    bulkdatalist = SC.bulk_data()
+    for bulkdata in bulkdatalist['data']:
+        if bulkdata['type'] == type:
+            return bulkdata
+    raise ValueError(msg['type'].format(type))
+
+
+def download(type: str = 'default_cards', dir: str = '.'):
+    """Download the current version of a bulk data file, unless it
+    has already been downloaded.
+    
+    :param type: (Optional.) The type of the bulk data file. This
+        defaults to 'default_cards'.
+    :param dir: (Optional.) The directory to save the file in. This
+        defaults to the current working directory.
+    :return: The path of the downloaded file.
+    :rtype: str
+    
+    The file is named after the file on Scryfall.com, which changes
+    when the file is updated.
+    """
+    bulkdata = find_bulk_data(type)
+    uri = bulkdata['download_uri']
+    path = os.path.join(dir, os.path.basename(urlparse(uri).path))
+    if not os.path.exists(path):
+        SC.download_bulk(uri, path)
+    return path
+
+
+def emit(cards, sink, batch_size: int = config.bulk_batch_size):
+    """Pass cards into a sink in batches.
+    
+    :param cards: An iterable of cards.
+    :param sink: A callable that takes a list of cards.
+    :param batch_size: (Optional.) The number of cards in each
+        batch.
+    :return: The number of cards passed to the sink.
+    :rtype: int
+    """
+    if batch_size < 1:
+        raise ValueError(msg['batch'])
+    count = 0
+    cards = iter(cards)
+    batch = list(islice(cards, batch_size))
+    while batch:
+        sink(batch)
+        count += len(batch)
+        batch = list(islice(cards, batch_size))
+    return count
+
+
+def ingest(sink, type: str = 'default_cards', dir: str = '.',
+           batch_size: int = config.bulk_batch_size):
+    """Download a bulk data file and pass its cards into a sink.
+    
+    :param sink: A callable that takes a list of cards.
+    :param type: (Optional.) The type of the bulk data file. This
+        defaults to 'default_cards'.
+    :param dir: (Optional.) The directory to save the file in. This
+        defaults to the current working directory.
+    :param batch_size: (Optional.) The number of cards in each
+        batch.
+    :return: The number of cards passed to the sink.
+    :rtype: int
+    
+    Usage::
+        
+        cards = []
+        count = ingest(cards.extend)
+    """
+    path = download(type, dir)
+    return emit(SC.bulk_cards(path), sink, batch_size)
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""
+cache
+~~~~~
+
+A persistent cache for the HTTP responses scrycli gets from 
+Scryfall.com. Responses are stored in a SQLite database on disk 
+and are keyed by URL and query parameters.
+
+:copyright: © 2018 Paul J. Iutzi
+:license: MIT, see LICENSE for more details.
+"""
+from collections import namedtuple
+from hashlib import sha256
+import sqlite3
+from threading import Lock
+from time import time
+from urllib.parse import urlencode, urlparse
+
+# Exception messages.
+msg = {
+    'ttl': 'TTL cannot be negative. Was {}.',
+    'maxsize': 'Maximum size must be greater than zero. Was {}.',
+}
+
+# The database schema for the cache.
+schema = '''
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    endpoint TEXT NOT NULL,
+    ctype TEXT NOT NULL,
+    content BLOB NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    stored REAL NOT NULL,
+    accessed REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_endpoint ON responses (endpoint);
+CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed);
+'''
+
+# A cached response.
+Entry = namedtuple('Entry', 'ctype content etag last_modified fresh')
+
+
+class HTTPCache:
+    """A size limited, on-disk cache of HTTP responses.
+    
+    :param path: The path to the cache's database file.
+    :param ttl: (Optional.) The number of seconds a response is 
+        fresh after it is stored or revalidated. This defaults to 
+        one day.
+    :param maxsize: (Optional.) The maximum total size in bytes of 
+        the cached content. The least recently used responses are 
+        evicted when it is exceeded. This defaults to 256 MiB.
+    
+    Stale responses are kept so they can be revalidated with the 
+    ETag and Last-Modified values Scryfall.com sent with them. The 
+    counts of fresh hits, stale hits, and misses are kept in the 
+    hits, stale, and misses attributes.
+    
+    Usage::
+    
+        >>> cache = HTTPCache(':memory:')
+        >>> url = 'https://api.scryfall.com/sets'
+        >>> cache.put(url, {}, 'application/json', b'{}')
+        >>> cache.get(url, {})
+        Entry(ctype='application/json', content=b'{}', etag=None, last_modified=None, fresh=True)
+    """
+    def __init__(self, path: str, ttl: float = 86400, 
+                 maxsize: int = 256 * 2 ** 20):
+        if ttl < 0:
+            raise ValueError(msg['ttl'].format(ttl))
+        if maxsize <= 0:
+            raise ValueError(msg['maxsize'].format(maxsize))
+        self.path = path
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.stale = 0
+        self.misses = 0
+        self._lock = Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(schema)
+    
+    def get(self, url: str, params: dict = None):
+        """Get a cached response.
+        
+        :param url: The URL of the request.
+        :param params: (Optional.) The query parameters of the 
+            request.
+        :return: The cached response as an :class:Entry, or None 
+            if the response is not cached.
+        :rtype: Entry
+        """
+        key = _key(url, params)
+        now = time()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT ctype, content, etag, last_modified, stored '
+                'FROM responses WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            with self._conn:
+                self._conn.execute(
+                    'UPDATE responses SET accessed = ? WHERE key = ?', 
+                    (now, key)
+                )
+            fresh = now - row[4] < self.ttl
+            if fresh:
+                self.hits += 1
+            else:
+                self.stale += 1
+        return Entry(row[0], row[1], row[2], row[3], fresh)
+    
+    def put(self, url: str, params: dict, ctype: str, content: bytes, 
+            etag: str = None, last_modified: str = None):
+        """Store a response in the cache, evicting the least recently 
+        used responses if the cache is over its maximum size.
+        
+        :param url: The URL of the request.
+        :param params: The query parameters of the request.
+        :param ctype: The Content-Type header of the response.
+        :param content: The content of the response.
+        :param etag: (Optional.) The ETag header of the response.
+        :param last_modified: (Optional.) The Last-Modified header 
+            of the response.
+        :return: None.
+        :rtype: NoneType
+        """
+        if len(content) > self.maxsize:
+            return
+        key = _key(url, params)
+        endpoint = urlparse(url).path
+        now = time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO responses VALUES '
+                '(?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (key, url, endpoint, ctype, content, etag, last_modified, 
+                 now, now, len(content))
+            )
+            self._evict()
+    
+    def refresh(self, url: str, params: dict = None):
+        """Mark a cached response as fresh again. Use this when 
+        Scryfall.com confirms the response has not changed.
+        
+        :param url: The URL of the request.
+        :param params: (Optional.) The query parameters of the 
+            request.
+        :return: None.
+        :rtype: NoneType
+        """
+        key = _key(url, params)
+        with self._lock, self._conn:
+            self._conn.execute(
+                'UPDATE responses SET stored = ? WHERE key = ?', 
+                (time(), key)
+            )
+    
+    def purge(self, endpoint: str = None):
+        """Remove responses from the cache.
+        
+        :param endpoint: (Optional.) The path of the API endpoint 
+            to remove responses for, such as '/sets'. Responses for 
+            paths under it, such as '/sets/mmq', are also removed. 
+            If missing, all responses are removed.
+        :return: The number of responses removed.
+        :rtype: int
+        """
+        with self._lock, self._conn:
+            if endpoint is None:
+                cur = self._conn.execute('DELETE FROM responses')
+            else:
+                endpoint = endpoint.rstrip('/')
+                prefix = endpoint + '/'
+                cur = self._conn.execute(
+                    'DELETE FROM responses WHERE endpoint = ? '
+                    'OR substr(endpoint, 1, ?) = ?', 
+                    (endpoint, len(prefix), prefix)
+                )
+        return cur.rowcount
+    
+    def size(self):
+        """The total size in bytes of the cached content.
+        
+        :return: The size of the cache.
+        :rtype: int
+        """
+        with self._lock:
+            return self._size()
+    
+    def close(self):
+        """Close the cache's database.
+        
+        :return: None.
+        :rtype: NoneType
+        """
+        with self._lock:
+            self._conn.close()
+    
+    def _evict(self):
+        """Remove least recently used responses until the cache is 
+        no larger than its maximum size. The caller must hold the 
+        lock.
+        """
+        excess = self._size() - self.maxsize
+        if excess <= 0:
+            return
+        cur = self._conn.execute(
+            'SELECT key, size FROM responses ORDER BY accessed'
+        )
+        keys = []
+        for key, size in cur:
+            keys.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        self._conn.executemany('DELETE FROM responses WHERE key = ?', keys)
+    
+    def _size(self):
+        """The total size of the cached content. The caller must 
+        hold the lock.
+        """
+        row = self._conn.execute('SELECT SUM(size) FROM responses').fetchone()
+        return row[0] or 0
+
+
+def _key(url, params):
+    """Build the cache key for a request."""
+    query = urlencode(sorted((params or {}).items()))
+    return sha256('{}?{}'.format(url, query).encode('utf_8')).hexdigest()
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+checkpoint
+~~~~~~~~~~
+
+Checkpoint files for resuming long paged downloads. A checkpoint
+holds the last page that was finished and a fingerprint of the
+search it belongs to, so a restarted job can pick up after that
+page rather than start over.
+
+Checkpoints are written to a temporary file that then replaces the
+checkpoint, so a crash while saving leaves the last checkpoint
+whole.
+
+:copyright: © 2018 Paul J. Iutzi
+:license: MIT, see LICENSE for more details.
+"""
+from hashlib import sha256
+from json import dumps, loads
+import os
+
+# Exception messages.
+msg = {
+    'fingerprint': 'Checkpoint {} is for a different search.',
+    'invalid': 'Checkpoint {} is not a valid checkpoint.',
+}
+
+
+class Checkpoint:
+    """A checkpoint file for a paged download.
+    
+    :param path: The path of the checkpoint file.
+    :param fingerprint: The fingerprint of the download. See
+        fingerprint().
+    
+    Usage::
+    
+        >>> import os, tempfile
+        >>> path = os.path.join(tempfile.mkdtemp(), 'ktk.checkpoint')
+        >>> checkpoint = Checkpoint(path, fingerprint('cards_search',
+        ...                                           {'q': 'set:ktk'}))
+        >>> checkpoint.load()
+        0
+        >>> checkpoint.save(3)
+        >>> checkpoint.load()
+        3
+        >>> checkpoint.clear()
+    """
+    def __init__(self, path: str, fingerprint: str):
+        self.path = path
+        self.fingerprint = fingerprint
+    
+    def load(self):
+        """Get the last page that was finished.
+        
+        :return: The page number, or 0 if there is no checkpoint.
+        :rtype: int
+        """
+        try:
+            with open(self.path, 'r', encoding='utf_8') as fh:
+                text = fh.read()
+        except FileNotFoundError:
+            return 0
+        try:
+            state = loads(text)
+            fingerprint = state['fingerprint']
+            page = state['page']
+        except (ValueError, TypeError, KeyError):
+            raise ValueError(msg['invalid'].format(self.path))
+        if fingerprint != self.fingerprint:
+            raise ValueError(msg['fingerprint'].format(self.path))
+        return page
+    
+    def save(self, page: int, next_page: str = None):
+        """Record that a page was finished.
+        
+        :param page: The page number.
+        :param next_page: (Optional.) The URL of the next page.
+        :return: None.
+        :rtype: NoneType
+        """
+        state = {
+            'fingerprint': self.fingerprint,
+            'page': page,
+            'next_page': next_page,
+        }
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf_8') as fh:
+            fh.write(dumps(state))
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, self.path)
+    
+    def clear(self):
+        """Delete the checkpoint once the download is finished.
+        
+        :return: None.
+        :rtype: NoneType
+        """
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def fingerprint(name: str, params: dict):
+    """Get the fingerprint of a paged download.
+    
+    :param name: The name of the API call.
+    :param params: The parameters of the call, other than the page.
+        Parameters that are None are left out.
+    :return: A hex digest.
+    :rtype: str
+    """
+    params = {key: params[key] for key in params
+              if params[key] is not None}
+    text = dumps([name, params], sort_keys=True)
+    return sha256(text.encode('utf_8')).hexdigest()
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -8,8 +8,7 @@ demonstrate and experiment with than for actual use.
 """
 from argparse import ArgumentParser
 from operator import itemgetter
-from time import sleep
-from .scrycli import cards, sets, cards_search
+from .scrycli import cards, sets, iter_cards_in_sets, iter_cards_search
 from .utility import build_query
 
 def list_cards():
@@ -33,15 +32,16 @@ def list_cards_in_set(cardset):
     """Print a list of MtG cards in a given set to stdout."""
     fmt = '{:<40}{:<10}{:<10}'
     q = build_query(cardset=cardset)
-    page = 1
-    cardslistobj = cards_search(q)
-    cards = cardslistobj['data']
-    while cardslistobj['has_more']:
-        sleep(.25)
-        page += 1
-        cardslistobj = cards_search(q, page=page)
-        cards.extend(cardslistobj['data'])
-    for card in cards:
+    for card in iter_cards_search(q, prefetch=True):
+        print(fmt.format(card['name'], card['collector_number'], card['set']))
+
+
+def list_cards_in_sets(cardsets):
+    """Print a list of MtG cards in the given sets to stdout, 
+    fetching the sets concurrently.
+    """
+    fmt = '{:<40}{:<10}{:<10}'
+    for _, card in iter_cards_in_sets(cardsets, order='input'):
         print(fmt.format(card['name'], card['collector_number'], card['set']))
 
 
@@ -53,8 +53,9 @@ def _cli():
                         action='store_true')
     parser.add_argument('-s', '--sets', help='list MtG sets', 
                         action='store_true')
-    parser.add_argument('-C', '--cardsinset', help='list MtG cards in a set',
-                        nargs=1, action='store')
+    parser.add_argument('-C', '--cardsinset', 
+                        help='list MtG cards in one or more sets',
+                        nargs='+', action='store')
     args = parser.parse_args()
     
     # Act on the command line arguments.
@@ -62,8 +63,10 @@ def _cli():
         list_cards()
     if args.sets:
         list_sets()
-    if args.cardsinset:
+    if args.cardsinset and len(args.cardsinset) == 1:
         list_cards_in_set(args.cardsinset[0])
+    elif args.cardsinset:
+        list_cards_in_sets(args.cardsinset)
 
 
 if __name__ == '__main__':
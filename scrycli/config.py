@@ -7,6 +7,29 @@ Configuration settings for the scrycli module. It contains the
 following settings:
 
     url     The url for the Scryfall.com API.
+    bulk_*  Settings for Scryfall.com's bulk data files.
+    pool_*  Connection pool settings for the HTTP session.
+    rate_*  Rate limit settings for requests to Scryfall.com.
+    retry_* Retry settings for failed requests.
+    stream_chunk_size
+            The size of the chunks read from streamed responses.
+    fetch_workers
+            The number of searches to run at once when fetching 
+            several sets.
+    collection_size
+            The number of identifiers sent in each request for a 
+            card collection.
+    single_flight
+            Whether identical API calls made at the same time share 
+            one request.
+    cache_* Settings for the on-disk HTTP response cache.
+    result_cache_*
+            Settings for the cache of validated results.
+    normalize_leaves
+            Whether to normalize decoded strings rather than 
+            response text.
+    json_decoder
+            The JSON decoder to use.
     vals    Validation patterns for Scryfall.com data.
     cvals   Validation patterns for Scryfall.com objects.
     tbvals  Validation configuration for trust boundaries.
@@ -18,6 +41,85 @@ import scrycli.utility as U
 # The url for the Scryfall.com API.
 fqdn = 'https://api.scryfall.com'
 
+# Bulk data settings. bulk_fqdn is the url for the bulk data files, 
+# and bulk_batch_size is the number of cards passed to a sink at a 
+# time when the files are ingested.
+bulk_fqdn = 'https://data.scryfall.io'
+bulk_batch_size = 1000
+
+# Connection pool settings for the HTTP session. pool_connections is 
+# the number of hosts to keep pools for, pool_maxsize is the number 
+# of keep-alive connections kept per host, and pool_block makes 
+# pool_maxsize a hard limit rather than a limit on idle connections.
+pool_connections = 1
+pool_maxsize = 10
+pool_block = False
+
+# Rate limit settings. Scryfall.com asks for 50-100 milliseconds 
+# between requests, so the default is ten requests per second with 
+# no bursting.
+rate_limit = 10
+rate_burst = 1
+
+# Retry settings for requests that fail with 429 or a temporary 5xx 
+# status. retry_attempts is the most times a request is tried, and 
+# setting it to 1 turns retries off. The wait before each retry 
+# starts at retry_backoff seconds and doubles up to retry_max_backoff, 
+# and retry_jitter is the fraction of it that is random. A 
+# Retry-After header replaces the wait, and if it is longer than 
+# retry_max_backoff the request isn't retried. retry_budget is the 
+# most retries saved up, and each request adds retry_budget_ratio of 
+# a retry to it.
+retry_attempts = 4
+retry_backoff = .5
+retry_max_backoff = 30
+retry_jitter = 1
+retry_budget = 10
+retry_budget_ratio = .2
+
+# The number of bytes to read at a time from streamed responses.
+stream_chunk_size = 64 * 2 ** 10
+
+# The default number of worker threads for concurrent searches. The 
+# workers share the rate limit, so more than a few only adds threads 
+# waiting on it.
+fetch_workers = 4
+
+# The number of identifiers in each request to /cards/collection. 
+# Scryfall.com rejects requests with more than 75.
+collection_size = 75
+
+# Whether identical API calls made at the same time by different 
+# threads share one request and one validation of its response. The 
+# callers then share the result, so it must not be changed.
+single_flight = False
+
+# HTTP response cache settings. The cache is off unless cache_path 
+# is set to the path of the cache's database file. cache_ttl is the 
+# number of seconds a response is fresh, and cache_maxsize is the 
+# maximum size of the cached content in bytes.
+cache_path = None
+cache_ttl = 86400
+cache_maxsize = 256 * 2 ** 20
+
+# The number of validated results the trust boundary keeps, so repeat 
+# calls skip the request, parsing, and validation. Cached results are 
+# shared between callers and must not be changed. Set to zero to turn 
+# this off. result_cache_ttl is the number of seconds a result is 
+# fresh. After that, the call is made again, and the result is reused 
+# without validation if the response hasn't changed.
+result_cache_size = 0
+result_cache_ttl = 300
+
+# Whether the trust boundary puts the strings in decoded responses 
+# into normal form, rather than the text of the whole response.
+normalize_leaves = False
+
+# The name of the JSON decoder in pyvalidate.normalize.decoders to 
+# use. If None, the json module is used. Set it to 'orjson' to use 
+# orjson, which must be installed.
+json_decoder = None
+
 # The validation patterns for Scryfall.com data.
 vals = {
     # For isvalid.
@@ -107,7 +209,8 @@ vals = {
     },
     'object': {
         'validtype': str,
-        'enum': ['card', 'card_face', 'related_card', 'set', 'list']
+        'enum': ['card', 'card_face', 'related_card', 'set', 'list', 
+                 'bulk_data']
     },
     'rarity': {
         'validtype': str,
@@ -132,6 +235,10 @@ vals = {
         'vscheme': 'https',
         'vnetloc': 'api.scryfall.com',
     },
+    'url_bulk': {
+        'vscheme': 'https',
+        'vnetloc': 'data.scryfall.io',
+    },
     'url_img': {
         'vscheme': 'https',
         'vnetloc': 'img.scryfall.com',
@@ -178,6 +285,10 @@ vals = {
         'validtype': str,
         'enum': ['utf-8',]
     },
+    'mt_encoding': {
+        'validtype': str,
+        'enum': ['gzip', 'identity',]
+    },
 }
 
 # Complex validation config for Scryfall.com objects.
@@ -509,6 +620,63 @@ cvals['sf_set'] = {
         },
     },
 }
+cvals['sf_bulkdata'] = {
+    'val': PV.isvalidmap,
+    'valkwargs': {
+        'req': {
+            'object': {
+                'val': PV.isvalid, 
+                'valkwargs': vals['object'],
+            },
+            'id': {
+                'val': PV.isvalid, 
+                'valkwargs': vals['id'],
+            },
+            'type': {
+                'val': PV.isvalid, 
+                'valkwargs': vals['text'],
+            },
+            'name': {
+                'val': PV.isvalid, 
+                'valkwargs': vals['text'],
+            },
+            'updated_at': {
+                'val': PV.isvalid, 
+                'valkwargs': vals['text'],
+            },
+            'download_uri': {
+                'val': PV.isvalidurl,
+                'valkwargs': vals['url_bulk'],
+            },
+            'content_type': {
+                'val': PV.isvalid, 
+                'valkwargs': vals['mt_json'],
+            },
+            'content_encoding': {
+                'val': PV.isvalid, 
+                'valkwargs': vals['mt_encoding'],
+            },
+        },
+        'opt': {
+            'uri': {
+                'val': PV.isvalidurl,
+                'valkwargs': vals['url_api'],
+            },
+            'description': {
+                'val': PV.isvalid, 
+                'valkwargs': vals['text'],
+            },
+            'size': {
+                'val': PV.isvalid, 
+                'valkwargs': vals['integer'],
+            },
+            'compressed_size': {
+                'val': PV.isvalid, 
+                'valkwargs': vals['integer'],
+            },
+        },
+    },
+}
 cvals['sf_card'] = {
     'val': PV.isvalidmap,
     'valkwargs': {
@@ -904,4 +1072,82 @@ cvals['sf_cardlist'] = {
             },
         },
     },
-}
\ No newline at end of file
+}
+cvals['sf_bulkdatalist'] = {
+    'val': PV.isvalidmap,
+    'valkwargs': {
+        'req': {
+            'object': {
+                'val': PV.isvalid,
+                'valkwargs': vals['object'],
+            },
+            'has_more': {
+                'val': PV.isvalid,
+                'valkwargs': vals['boolean'],
+            },
+            'data': {
+                'val': PV.isvalidseq,
+                'valkwargs': cvals['sf_bulkdata'],
+            },
+        },
+    },
+}
+cvals['sf_identifier'] = {
+    'val': PV.isvalidmap,
+    'valkwargs': {
+        'opt': {
+            'id': {
+                'val': PV.isvalid,
+                'valkwargs': vals['id'],
+            },
+            'mtgo_id': {
+                'val': PV.isvalid,
+                'valkwargs': vals['integer'],
+            },
+            'multiverse_id': {
+                'val': PV.isvalid,
+                'valkwargs': vals['integer'],
+            },
+            'oracle_id': {
+                'val': PV.isvalid,
+                'valkwargs': vals['id'],
+            },
+            'illustration_id': {
+                'val': PV.isvalid,
+                'valkwargs': vals['id'],
+            },
+            'name': {
+                'val': PV.isvalid,
+                'valkwargs': vals['text'],
+            },
+            'set': {
+                'val': PV.isvalid,
+                'valkwargs': vals['code'],
+            },
+            'collector_number': {
+                'val': PV.isvalid,
+                'valkwargs': vals['text'],
+            },
+        },
+    },
+}
+cvals['sf_cardcollection'] = {
+    'val': PV.isvalidmap,
+    'valkwargs': {
+        'req': {
+            'object': {
+                'val': PV.isvalid,
+                'valkwargs': vals['object'],
+            },
+            'not_found': {
+                'val': PV.isvalidseq,
+                'valkwargs': cvals['sf_identifier'],
+            },
+            'data': cvals['sf_cardlist']['valkwargs']['req']['data'],
+        },
+        'opt': dict(
+            cvals['sf_cardlist']['valkwargs']['opt'],
+            has_more=cvals['sf_cardlist']['valkwargs']['req']['has_more']
+        ),
+    },
+}
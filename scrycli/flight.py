@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+flight
+~~~~~~
+
+Request coalescing for scrycli. When threads make the same call at
+the same time, only the first one runs it, and the others wait for
+and share its result.
+
+:copyright: © 2018 Paul J. Iutzi
+:license: MIT, see LICENSE for more details.
+"""
+from copy import copy
+from threading import Event, Lock
+
+
+class _Call:
+    """A call in flight."""
+    __slots__ = ('done', 'result', 'error')
+    
+    def __init__(self):
+        self.done = Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesce identical calls that are in flight at the same time.
+    
+    Calls are identified by a hashable key. The first caller for a
+    key runs the call. Callers that arrive with the same key while
+    it is running wait for it and get the same result. If the call
+    raises an exception, each waiter raises a copy of it chained to
+    the original, so the threads don't share one traceback. Once the
+    call finishes, the next caller for the key runs it again, so
+    results are never reused after the fact.
+    
+    Usage::
+    
+        >>> flights = SingleFlight()
+        >>> flights.do('spam', str.upper, 'spam')
+        'SPAM'
+    """
+    def __init__(self):
+        self._calls = {}
+        self._lock = Lock()
+        self.calls = 0
+        self.shared = 0
+    
+    def do(self, key, fn, *args, **kwargs):
+        """Run a call, or wait for an identical call in flight.
+        
+        :param key: The key identifying the call.
+        :param fn: The function to call.
+        :param args: The positional arguments for the function.
+        :param kwargs: The keyword arguments for the function.
+        :return: The return value of the call.
+        :rtype: Any
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = _Call()
+                self._calls[key] = call
+                self.calls += 1
+                leader = True
+            else:
+                self.shared += 1
+                leader = False
+        
+        if leader:
+            try:
+                call.result = fn(*args, **kwargs)
+            except BaseException as ex:
+                call.error = ex
+                raise
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+            return call.result
+        
+        call.done.wait()
+        if call.error is not None:
+            raise copy(call.error) from call.error
+        return call.result
+    
+    def in_flight(self):
+        """The number of calls in flight.
+        
+        :return: The number of calls.
+        :rtype: int
+        """
+        with self._lock:
+            return len(self._calls)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+"""
+index
+~~~~~
+
+An in-memory index of cards for instant lookups and name
+autocomplete. Cards can be added a page at a time as they arrive.
+
+:copyright: © 2018 Paul J. Iutzi
+:license: MIT, see LICENSE for more details.
+"""
+from array import array
+from bisect import bisect_left
+from re import compile as re_compile
+from sys import intern
+
+
+# The number of tombstones an index can have before it is compacted.
+_min_dead = 1024
+
+# The words in card text.
+_word = re_compile(r"[a-z0-9+\-/{}]+(?:'[a-z]+)?")
+
+
+class CardIndex:
+    """An in-memory index of validated cards.
+    
+    :param cards: (Optional.) The cards to index.
+    
+    The index has exact lookups by Scryfall.com ID, by set code,
+    collector number, and language, and by Oracle ID. It has prefix
+    lookups on card names for autocomplete, and an inverted index on
+    the words of the Oracle text, type line, and keywords. Calling a
+    CardIndex adds a batch of cards, so it can be used as a sink for
+    bulk.ingest().
+    
+    Each card is stored once. The other lookups hold the card's
+    position in compact arrays, and index words are interned. A card
+    that is replaced leaves a tombstone at its old position, which
+    lookups skip, so replacing cards doesn't have to search the
+    arrays. The index is compacted once most positions are
+    tombstones.
+    
+    Usage::
+        
+        >>> index = CardIndex([{
+        ...     'id': '0900e494-962d-48c6-8e78-66a489be4bb2',
+        ...     'name': 'Hanweir Garrison',
+        ...     'type_line': 'Creature — Human Soldier',
+        ... }])
+        >>> index.complete('han')
+        ['Hanweir Garrison']
+        >>> [card['name'] for card in index.search(type='soldier')]
+        ['Hanweir Garrison']
+    """
+    def __init__(self, cards=()):
+        self._cards = []
+        self._by_id = {}
+        self._by_number = {}
+        self._by_oracle = {}
+        self._names = []
+        self._display = {}
+        self._text = {}
+        self._types = {}
+        self._keywords = {}
+        self._dead = 0
+        self._order = {}
+        self.add(cards)
+    
+    def __call__(self, cards):
+        """Add a batch of cards. See add()."""
+        return self.add(cards)
+    
+    def __len__(self):
+        return len(self._by_id)
+    
+    def add(self, cards):
+        """Add cards to the index, replacing the indexed version of
+        any card already in it.
+        
+        :param cards: An iterable of validated card :class:dict
+            objects.
+        :return: The number of cards added.
+        :rtype: int
+        """
+        names = []
+        count = 0
+        for card in cards:
+            old = self._by_id.get(card['id'])
+            if old is not None:
+                self._bury(old)
+            else:
+                self._order[card['id']] = len(self._order)
+            pos = len(self._cards)
+            self._cards.append(card)
+            self._by_id[card['id']] = pos
+            self._index(pos, card, names)
+            count += 1
+        if names:
+            self._names.extend(names)
+            self._names.sort()
+        if self._dead > _min_dead and self._dead * 2 > len(self._cards):
+            self.compact()
+        return count
+    
+    def compact(self):
+        """Rebuild the lookups without the tombstones of replaced
+        cards.
+        
+        :return: None.
+        :rtype: NoneType
+        """
+        cards = [card for card in self._cards if card is not None]
+        self._cards = []
+        self._by_id = {}
+        self._by_number = {}
+        self._by_oracle = {}
+        self._text = {}
+        self._types = {}
+        self._keywords = {}
+        self._dead = 0
+        names = []
+        for pos, card in enumerate(cards):
+            self._cards.append(card)
+            self._by_id[card['id']] = pos
+            self._index(pos, card, names)
+    
+    def get(self, id: str):
+        """Get a card by its Scryfall.com ID.
+        
+        :param id: The ID of the card.
+        :return: The card, or None if it is not indexed.
+        :rtype: dict
+        """
+        pos = self._by_id.get(id)
+        if pos is None:
+            return None
+        return self._cards[pos]
+    
+    def get_by_number(self, set: str, collector_number: str,
+                      lang: str = 'en'):
+        """Get a card by its set and collector number.
+        
+        :param set: The set code of the card.
+        :param collector_number: The collector number of the card.
+        :param lang: (Optional.) The language of the card's print.
+            This defaults to English.
+        :return: The card, or None if it is not indexed.
+        :rtype: dict
+        """
+        pos = self._by_number.get((set, collector_number, lang))
+        if pos is None:
+            return None
+        return self._cards[pos]
+    
+    def get_by_oracle_id(self, oracle_id: str):
+        """Get every print of a card by its Oracle ID.
+        
+        :param oracle_id: The Oracle ID of the card.
+        :return: A :class:list of the cards.
+        :rtype: list
+        """
+        positions = self._by_oracle.get(oracle_id, ())
+        cards = (self._cards[pos] for pos in positions)
+        return [card for card in cards if card is not None]
+    
+    def complete(self, prefix: str, limit: int = 10):
+        """Get the card names that start with a prefix. Case is
+        ignored.
+        
+        :param prefix: The start of the name.
+        :param limit: (Optional.) The maximum number of names to
+            return. This defaults to ten.
+        :return: A :class:list of the names in alphabetical order.
+        :rtype: list
+        """
+        prefix = prefix.casefold()
+        names = []
+        i = bisect_left(self._names, prefix)
+        while i < len(self._names) and len(names) < limit:
+            name = self._names[i]
+            if not name.startswith(prefix):
+                break
+            names.append(self._display[name])
+            i += 1
+        return names
+    
+    def search(self, text: str = None, type: str = None,
+               keyword: str = None):
+        """Get the cards that have all of the given words.
+        
+        :param text: (Optional.) Words in the card's Oracle text.
+        :param type: (Optional.) Words in the card's type line.
+        :param keyword: (Optional.) The card's keyword abilities.
+        :return: A :class:list of the cards, in the order they were
+            added.
+        :rtype: list
+        """
+        postings = []
+        for words, index in ((text, self._text), (type, self._types),
+                             (keyword, self._keywords)):
+            if words:
+                for word in _words(words):
+                    postings.append(index.get(word, ()))
+        if not postings:
+            return []
+        postings.sort(key=len)
+        found = set(postings[0])
+        for posting in postings[1:]:
+            if not found:
+                break
+            found.intersection_update(posting)
+        cards = [self._cards[pos] for pos in found
+                 if self._cards[pos] is not None]
+        cards.sort(key=lambda card: self._order[card['id']])
+        return cards
+    
+    def _index(self, pos, card, names):
+        """Add a card's position to the lookups and its new names to
+        names.
+        """
+        key = (card.get('set'), card.get('collector_number'),
+               card.get('lang'))
+        self._by_number[key] = pos
+        oracle_id = card.get('oracle_id')
+        if oracle_id:
+            self._by_oracle.setdefault(oracle_id, array('I')).append(pos)
+        for name in _names(card):
+            folded = name.casefold()
+            if folded not in self._display:
+                self._display[folded] = name
+                names.append(folded)
+        indexes = (self._text, self._types, self._keywords)
+        for index, words in zip(indexes, _fields(card)):
+            for word in words:
+                posting = index.get(word)
+                if posting is None:
+                    posting = array('I')
+                    index[intern(word)] = posting
+                posting.append(pos)
+    
+    def _bury(self, pos):
+        """Replace a card with a tombstone. Its position is left in
+        the arrays, and its names are kept for autocomplete.
+        """
+        card = self._cards[pos]
+        key = (card.get('set'), card.get('collector_number'),
+               card.get('lang'))
+        if self._by_number.get(key) == pos:
+            del self._by_number[key]
+        self._cards[pos] = None
+        self._dead += 1
+
+
+def _names(card):
+    """The names of a card and its faces."""
+    yield card['name']
+    for face in card.get('card_faces', ()):
+        if face['name'] != card['name']:
+            yield face['name']
+
+
+def _fields(card):
+    """The sets of words in a card's Oracle text, type line, and 
+    keywords.
+    """
+    text = [card.get('oracle_text', '')]
+    types = [card.get('type_line', '')]
+    for face in card.get('card_faces', ()):
+        text.append(face.get('oracle_text', ''))
+        types.append(face.get('type_line', ''))
+    keywords = ' '.join(card.get('keywords', ()))
+    return (
+        set(_words(' '.join(text))),
+        set(_words(' '.join(types))),
+        set(_words(keywords)),
+    )
+
+
+def _words(s):
+    """Split text into index words."""
+    return _word.findall(s.casefold())
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
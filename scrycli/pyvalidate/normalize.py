@@ -8,16 +8,23 @@ Provides canonicalization and normalization functions.
 :copyright: © 2018 Paul J. Iutzi
 :license: MIT, see LICENSE for more details.
 """
-from json import loads
+from codecs import getincrementaldecoder
+from json import JSONDecoder, loads
 from json.decoder import JSONDecodeError
+from re import compile as re_compile
+from unicodedata import is_normalized as ucd_is_normalized
 from unicodedata import normalize as ucd_normalize
 
 # Exception messages.
 msg = {
     'type': '{} must be of type {}. Was {}.',
     'decode': '{} was not valid {}.',
+    'decoder': 'No JSON decoder named {}.',
 }
 
+# The Unicode normal forms.
+forms = ('NFC', 'NFD', 'NFKC', 'NFKD')
+
 
 def canonicalize(text, dest_encoding='utf_8', dest_form='NFC'):
     r"""Canonicalize text data.
@@ -26,10 +33,15 @@ def canonicalize(text, dest_encoding='utf_8', dest_form='NFC'):
     :param dest_encoding: (Optional.) The character set to transform 
         the text to. This defaults to UTF-8.
     :param dest_form: (Optional.) The "normal form" to transform the 
-        text into. This defaults to NFC.
+        text into. This defaults to NFC. If None, the text is only 
+        decoded.
     :return: The canon text.
     :rtype: str
     
+    Text that is already in the normal form is returned without 
+    being copied. ASCII text is always in every normal form, so it 
+    isn't checked.
+    
     Usage::
     
         >>> text = b'Montr\xc3\xa9al'
@@ -48,10 +60,58 @@ def canonicalize(text, dest_encoding='utf_8', dest_form='NFC'):
         decoded_text = text
     
     # Transform into normal form and return the canon text.
+    if dest_form is None:
+        return decoded_text
+    if dest_form in forms and decoded_text.isascii():
+        return decoded_text
+    if ucd_is_normalized(dest_form, decoded_text):
+        return decoded_text
     canon_text = ucd_normalize(dest_form, decoded_text)
     return canon_text
 
 
+def canonicalize_leaves(item, dest_form='NFC'):
+    """Transform the strings in decoded JSON into a normal form. 
+    This can be used instead of canonicalizing the JSON text.
+    
+    :param item: The decoded JSON.
+    :param dest_form: (Optional.) The "normal form" to transform the 
+        strings into. This defaults to NFC.
+    :return: The decoded JSON with its strings in the normal form. 
+        Lists and dicts are changed in place.
+    :rtype: Same as item.
+    
+    Usage::
+    
+        >>> canonicalize_leaves({'city': 'Montre\u0301al'})
+        {'city': 'Montréal'}
+    """
+    if isinstance(item, str):
+        return canonicalize(item, dest_form=dest_form)
+    if isinstance(item, list):
+        for i in range(len(item)):
+            value = item[i]
+            if isinstance(value, (str, list, dict)):
+                item[i] = canonicalize_leaves(value, dest_form)
+        return item
+    if isinstance(item, dict):
+        rekey = False
+        for key in item:
+            value = item[key]
+            if isinstance(value, (str, list, dict)):
+                item[key] = canonicalize_leaves(value, dest_form)
+            if canonicalize(key, dest_form=dest_form) is not key:
+                rekey = True
+        if rekey:
+            canon = {}
+            for key in item:
+                canon[canonicalize(key, dest_form=dest_form)] = item[key]
+            item.clear()
+            item.update(canon)
+        return item
+    return item
+
+
 def normalize(item, transform):
     """Normalize data.
     
@@ -64,12 +124,81 @@ def normalize(item, transform):
     return transform(item)
 
 
+# JSON decoders.
+decoders = {}
+decoder = None
+
+
+def register_decoder(name, loads, errors, native_bytes=False):
+    """Register a JSON decoder for from_json.
+    
+    :param name: The name of the decoder.
+    :param loads: The function that decodes JSON. It must accept 
+        a str, and it must accept UTF-8 bytes if native_bytes is 
+        true.
+    :param errors: The exception types loads raises for invalid 
+        JSON.
+    :param native_bytes: (Optional.) Whether loads parses UTF-8 
+        bytes directly, without decoding them to a str first. This 
+        defaults to false.
+    :return: None.
+    :rtype: NoneType
+    """
+    decoders[name] = {
+        'loads': loads,
+        'errors': tuple(errors),
+        'native_bytes': native_bytes,
+    }
+
+
+def set_decoder(name):
+    """Set the JSON decoder used by from_json.
+    
+    :param name: The name of a registered decoder.
+    :return: None.
+    :rtype: NoneType
+    """
+    global decoder
+    if name not in decoders:
+        raise ValueError(msg['decoder'].format(name))
+    decoder = name
+
+
+def decodes_bytes():
+    """Whether the current JSON decoder parses UTF-8 bytes directly.
+    
+    :return: True if from_json can be given UTF-8 bytes without 
+        an extra decoding step.
+    :rtype: bool
+    """
+    return decoders[decoder]['native_bytes']
+
+
+# The standard library decoder is always available and is the 
+# default. orjson is registered if it is installed, but it is only 
+# used if it is set with set_decoder.
+register_decoder('json', loads, [JSONDecodeError])
+set_decoder('json')
+try:
+    import orjson
+except ImportError:
+    pass
+else:
+    register_decoder('orjson', orjson.loads, [orjson.JSONDecodeError], 
+                     native_bytes=True)
+
+
 # Common transform functions.
 def from_json(text):
-    """Transform json text into a Python object."""
+    """Transform json text into a Python object.
+    
+    The text can be a str or UTF-8 bytes. It is decoded with the 
+    decoder set by set_decoder.
+    """
+    current = decoders[decoder]
     try:
-        return loads(text)
-    except JSONDecodeError:
+        return current['loads'](text)
+    except current['errors']:
         raise TypeError(msg['decode'].format('Text', 'JSON'))
 
 
@@ -94,6 +223,174 @@ def from_ctype(text):
     return ctype
 
 
+# Streaming JSON.
+def iter_json(chunks, stream_key=None, encoding='utf_8'):
+    r"""Parse JSON from an iterable of chunks, yielding the items of 
+    one array as each is parsed.
+    
+    :param chunks: An iterable of bytes or str chunks of JSON text.
+    :param stream_key: (Optional.) If the JSON is an object, the key 
+        of the array to stream. If missing, the JSON must be an 
+        array, and its items are streamed.
+    :param encoding: (Optional.) The character set of bytes chunks. 
+        This defaults to UTF-8.
+    :return: A generator that yields each item of the array. When 
+        the JSON is an object, the generator returns a dict with 
+        the object's other keys and values. If the stream_key was 
+        in the object, its value in the dict is an empty list.
+    :rtype: generator
+    
+    Only the current item and the unparsed text are held in memory, 
+    not the whole JSON. The items are not canonicalized.
+    
+    Usage::
+    
+        >>> chunks = [b'{"has_more": false, "da', b'ta": [1, {"a"', 
+        ...           b': 2}]}']
+        >>> items = iter_json(chunks, 'data')
+        >>> list(items)
+        [1, {'a': 2}]
+    """
+    reader = _JSONReader(chunks, encoding)
+    char = reader.next_char()
+    if stream_key is None:
+        if char != '[':
+            reader.error()
+        yield from reader.iter_array()
+        fields = None
+    else:
+        if char != '{':
+            reader.error()
+        reader.pos += 1
+        fields = {}
+        char = reader.next_char()
+        if char == '}':
+            reader.pos += 1
+        while char != '}':
+            key = reader.value()
+            if not isinstance(key, str) or reader.next_char() != ':':
+                reader.error()
+            reader.pos += 1
+            if key == stream_key and reader.next_char() == '[':
+                yield from reader.iter_array()
+                fields[key] = []
+            else:
+                fields[key] = reader.value()
+            char = reader.next_char()
+            if char not in (',', '}'):
+                reader.error()
+            reader.pos += 1
+            if char == ',':
+                char = reader.next_char()
+    if reader.next_char() != '':
+        reader.error()
+    return fields
+
+
+class _JSONReader:
+    """Reads JSON values from a buffer that is refilled from an 
+    iterable of chunks as needed.
+    """
+    def __init__(self, chunks, encoding):
+        self.chunks = iter(chunks)
+        self.decode = getincrementaldecoder(encoding)().decode
+        self.buf = ''
+        self.pos = 0
+        self.done = False
+    
+    def error(self):
+        """Raise the exception for invalid JSON."""
+        raise TypeError(msg['decode'].format('Text', 'JSON'))
+    
+    def fill(self):
+        """Add the next chunk to the buffer, dropping the text that 
+        has been parsed. Returns False if there are no more chunks.
+        """
+        while not self.done:
+            try:
+                chunk = next(self.chunks)
+            except StopIteration:
+                self.done = True
+                chunk = b''
+                final = True
+            else:
+                final = False
+            if isinstance(chunk, bytes):
+                try:
+                    chunk = self.decode(chunk, final)
+                except UnicodeDecodeError:
+                    raise ValueError(msg['decode'].format('Text', 
+                                                          'character set'))
+            if chunk:
+                self.buf = self.buf[self.pos:] + chunk
+                self.pos = 0
+                return True
+        return False
+    
+    def grow(self):
+        """Fill the buffer until its unparsed text has at least 
+        doubled, so a value that spans many chunks isn't parsed 
+        again for every chunk. Returns False if there are no more 
+        chunks.
+        """
+        target = 2 * (len(self.buf) - self.pos)
+        grown = self.fill()
+        while grown and len(self.buf) - self.pos < target:
+            if not self.fill():
+                break
+        return grown
+    
+    def next_char(self):
+        """Skip whitespace and return the next character, or an empty 
+        string at the end of the JSON.
+        """
+        while True:
+            self.pos = _whitespace.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ''
+    
+    def value(self):
+        """Parse the next value."""
+        self.next_char()
+        while True:
+            try:
+                item, end = _decoder.raw_decode(self.buf, self.pos)
+            except JSONDecodeError:
+                if not self.grow():
+                    self.error()
+                continue
+            
+            # A number at the end of the buffer may continue in the 
+            # next chunk.
+            if end == len(self.buf) and self.fill():
+                continue
+            self.pos = end
+            return item
+    
+    def iter_array(self):
+        """Yield the items of the array at the current position."""
+        self.pos += 1
+        char = self.next_char()
+        if char == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            char = self.next_char()
+            if char not in (',', ']'):
+                self.error()
+            self.pos += 1
+            if char == ']':
+                return
+
+
+# Used by the streaming JSON parser.
+_decoder = JSONDecoder()
+_whitespace = re_compile(r'[ \t\n\r]*')
+
+
 if __name__ == '__main__':
     import doctest
     doctest.testmod()
\ No newline at end of file
@@ -5,11 +5,20 @@ pyvalidate
 
 This implements the core features of the pyvalidate module.
 """
+from collections import OrderedDict
 from collections.abc import Mapping, Sequence
-from functools import wraps
-from re import match
+from functools import partial, wraps
+from hashlib import blake2b
+from inspect import iscoroutinefunction, signature
+from math import ceil
+from random import sample as random_sample
+from re import compile as re_compile, match
+from threading import Lock
+from time import monotonic, perf_counter
 from urllib.parse import urlparse
-from .normalize import from_ctype, from_json, canonicalize, normalize
+from .normalize import (from_ctype, from_json, canonicalize, 
+                        canonicalize_leaves, decodes_bytes, iter_json, 
+                        normalize)
 
 # Exception messages.
 msg = {
@@ -24,10 +33,76 @@ msg = {
     'reqkey': '{} is missing required key(s): {}.',
     'value': '{} has invalid value.',
     'novalidate': 'No validator configured for {}.',
+    'maxsize': 'Maximum size must be greater than zero. Was {}.',
+    'mode': '{} is not a validation mode.',
 }
 
 # Configuration for trust_boundary.
 tbvals = {}
+tbcache = None
+tbstats = {}
+
+# The compiled validators for trust_boundary, by function name.
+_tbcompiled = {}
+_tbstats_lock = Lock()
+
+# Marks a call that isn't in tbcache.
+_miss = object()
+
+# Names of nested items.
+class NamePath:
+    """The name of an item nested in a sequence or mapping, such 
+    as 'cards_search:data:3:legalities'. The name is only joined into 
+    a str when it is used, which is usually only when an exception 
+    is raised.
+    
+    :param parent: The name of the sequence or mapping. This can 
+        be a str or another NamePath.
+    :param key: The index or key of the item.
+    
+    Usage::
+    
+        >>> name = NamePath(NamePath('cards_search', 'data'), 3)
+        >>> str(name)
+        'cards_search:data:3'
+        >>> '{} is bad.'.format(name)
+        'cards_search:data:3 is bad.'
+    """
+    __slots__ = ('parent', 'key')
+    
+    def __init__(self, parent, key):
+        self.parent = parent
+        self.key = key
+    
+    def __str__(self):
+        parts = []
+        node = self
+        while isinstance(node, NamePath):
+            parts.append(node.key)
+            node = node.parent
+        parts.append(node)
+        return ':'.join(str(part) for part in reversed(parts))
+    
+    def __repr__(self):
+        return 'NamePath({!r})'.format(str(self))
+    
+    def __format__(self, format_spec):
+        return format(str(self), format_spec)
+    
+    def __add__(self, other):
+        return str(self) + other
+    
+    def __radd__(self, other):
+        return other + str(self)
+    
+    def __eq__(self, other):
+        if isinstance(other, (str, NamePath)):
+            return str(self) == str(other)
+        return NotImplemented
+    
+    def __hash__(self):
+        return hash(str(self))
+
 
 # Simple validation.
 def isvalid(item, name, validtype, min=None, max=None, minlen=None, 
@@ -42,8 +117,10 @@ def isvalid(item, name, validtype, min=None, max=None, minlen=None,
     :param max: (Optional.) The maximum value for the item.
     :param minlen: (Optional.) The minumum length for the item.
     :param maxlen: (Optional.) The maximum length for the item.
-    :param pattern: (Optional.) The regular expression for the item.
-    :param enum: (Optional.) A list of values for the item.
+    :param pattern: (Optional.) The regular expression for the item. 
+        This can be a str or a compiled pattern.
+    :param enum: (Optional.) A list of values for the item. Any 
+        container works, and a set or frozenset is fastest.
     :return: True.
     :rtype: bool.
     
@@ -75,6 +152,8 @@ def isvalid(item, name, validtype, min=None, max=None, minlen=None,
     """
     if not isinstance(item, validtype):
         raise TypeError(msg['type'].format(name, validtype, type(item)))
+    if min is max is minlen is maxlen is pattern is enum is None:
+        return True
     if min:
         if item < min:
             raise ValueError(msg['min'].format(name, min))
@@ -88,8 +167,11 @@ def isvalid(item, name, validtype, min=None, max=None, minlen=None,
         if len(item) > maxlen:
             raise ValueError(msg['maxlen'].format(name, maxlen))
     if pattern:
-        if not match(pattern, item):
-            raise ValueError(msg['pattern'].format(name, pattern))
+        if isinstance(pattern, str):
+            if not match(pattern, item):
+                raise ValueError(msg['pattern'].format(name, pattern))
+        elif not pattern.match(item):
+            raise ValueError(msg['pattern'].format(name, pattern.pattern))
     if enum:
         if item not in enum:
             raise ValueError(msg['enum'].format(name))
@@ -125,7 +207,7 @@ def isvalidseq(L, name, val, valkwargs={}):
     """
     if not isinstance(L, Sequence):
         raise TypeError(msg['type'].format(name, Sequence, type(L)))
-    [val(L[i], '{}:{}'.format(name, i), **valkwargs) for i in range(len(L))]
+    [val(L[i], NamePath(name, i), **valkwargs) for i in range(len(L))]
     return True
 
 
@@ -208,7 +290,7 @@ def isvalidmap(d, name, req={}, opt={}):
     
     # Test each key/value pair in d.
     for key in d:
-        newname = '{}:{}'.format(name, key)
+        newname = NamePath(name, key)
         if key in reqcp:
             reqcp[key]['val'](d[key], newname, **reqcp[key]['valkwargs'])
             del(reqcp[key])
@@ -276,8 +358,294 @@ def isvalidurl(s, name, vscheme=None, vnetloc=None, vpath=None,
     return True
 
 
+# Schema compilation.
+def compile_validator(val, valkwargs={}):
+    """Compile a validator and its keyword arguments into a single 
+    callable. The callable takes the item to validate and its name, 
+    and it raises the same exceptions as calling the validator with 
+    the keyword arguments would.
+    
+    :param val: The validator function.
+    :param valkwargs: (Optional.) The keyword arguments for the 
+        validator.
+    :return: The compiled validator.
+    :rtype: function
+    
+    Validators with an entry in compilers are turned into closures 
+    with their arguments, and the validators nested in them, bound 
+    in advance. Other validators are called with their keyword 
+    arguments as usual.
+    
+    Usage::
+    
+        >>> valkwargs = {
+        ...     'val': isvalid,
+        ...     'valkwargs': {
+        ...         'validtype': int,
+        ...         'min': 1,
+        ...         'max': 100,
+        ...     },
+        ... }
+        >>> validate = compile_validator(isvalidseq, valkwargs)
+        >>> validate([83, 29, 4, 73, 43], 'List')
+        True
+    """
+    compiler = compilers.get(val)
+    if compiler is not None:
+        return compiler(**valkwargs)
+    
+    def validate(item, name):
+        return val(item, name, **valkwargs)
+    return validate
+
+
+def _compile_spec(spec):
+    """Compile a 'val'/'valkwargs' mapping from a req or opt 
+    configuration.
+    """
+    if spec is None:
+        def validate(item, name):
+            raise NotImplementedError(msg['novalidate'].format(name))
+        return validate
+    return compile_validator(spec['val'], spec.get('valkwargs', {}))
+
+
+def _compile_isvalid(validtype, min=None, max=None, minlen=None, 
+                     maxlen=None, pattern=None, enum=None):
+    """Compile isvalid. Only the checks for constraints that are set 
+    are included. Patterns are compiled and enums are turned into 
+    frozensets for faster lookups.
+    """
+    checks = []
+    if min:
+        def check_min(item, name):
+            if item < min:
+                raise ValueError(msg['min'].format(name, min))
+        checks.append(check_min)
+    if max:
+        def check_max(item, name):
+            if item > max:
+                raise ValueError(msg['max'].format(name, max))
+        checks.append(check_max)
+    if minlen:
+        def check_minlen(item, name):
+            if len(item) < minlen:
+                raise ValueError(msg['minlen'].format(name, minlen))
+        checks.append(check_minlen)
+    if maxlen:
+        def check_maxlen(item, name):
+            if len(item) > maxlen:
+                raise ValueError(msg['maxlen'].format(name, maxlen))
+        checks.append(check_maxlen)
+    if pattern:
+        regex = re_compile(pattern) if isinstance(pattern, str) else pattern
+        match_pattern = regex.match
+        
+        def check_pattern(item, name):
+            if not match_pattern(item):
+                raise ValueError(msg['pattern'].format(name, regex.pattern))
+        checks.append(check_pattern)
+    if enum:
+        values = _freeze(enum)
+        
+        def check_enum(item, name):
+            try:
+                found = item in values
+            except TypeError:
+                found = False
+            if not found:
+                raise ValueError(msg['enum'].format(name))
+        checks.append(check_enum)
+    
+    if not checks:
+        def validate(item, name):
+            if not isinstance(item, validtype):
+                raise TypeError(msg['type'].format(name, validtype, 
+                                                   type(item)))
+            return True
+    elif len(checks) == 1:
+        check = checks[0]
+        def validate(item, name):
+            if not isinstance(item, validtype):
+                raise TypeError(msg['type'].format(name, validtype, 
+                                                   type(item)))
+            check(item, name)
+            return True
+    else:
+        checks = tuple(checks)
+        def validate(item, name):
+            if not isinstance(item, validtype):
+                raise TypeError(msg['type'].format(name, validtype, 
+                                                   type(item)))
+            for check in checks:
+                check(item, name)
+            return True
+    return validate
+
+
+def _freeze(enum):
+    """Turn an enum into a frozenset if its values can be hashed."""
+    try:
+        return frozenset(enum)
+    except TypeError:
+        return enum
+
+
+def _compile_isvalidseq(val, valkwargs={}):
+    """Compile isvalidseq."""
+    validate_item = compile_validator(val, valkwargs)
+    
+    def validate(L, name):
+        if not isinstance(L, Sequence):
+            raise TypeError(msg['type'].format(name, Sequence, type(L)))
+        for i in range(len(L)):
+            validate_item(L[i], NamePath(name, i))
+        return True
+    return validate
+
+
+def _compile_isvalidmap(req={}, opt={}, compile_spec=None):
+    """Compile isvalidmap. The values are compiled with compile_spec 
+    if it is given.
+    """
+    if compile_spec is None:
+        compile_spec = _compile_spec
+    creq = {key: compile_spec(req[key]) for key in req}
+    copt = {key: compile_spec(opt[key]) for key in opt}
+    reqcount = len(creq)
+    
+    def validate(d, name):
+        if not isinstance(d, Mapping):
+            raise TypeError(msg['type'].format(name, Mapping, type(d)))
+        found = 0
+        for key in d:
+            newname = NamePath(name, key)
+            check = creq.get(key)
+            if check is not None:
+                check(d[key], newname)
+                found += 1
+                continue
+            check = copt.get(key)
+            if check is None:
+                raise KeyError(msg['key'].format(name))
+            try:
+                check(d[key], newname)
+            except KeyError:
+                raise KeyError(name + ':' + key)
+        if found != reqcount:
+            missing = [key for key in creq if key not in d]
+            raise KeyError(msg['reqkey'].format(name, ', '.join(missing)))
+        return True
+    return validate
+
+
+# The compilers for validators. Other modules can register compilers 
+# for their own validators here.
+compilers = {
+    isvalid: _compile_isvalid,
+    isvalidseq: _compile_isvalidseq,
+    isvalidmap: _compile_isvalidmap,
+}
+
+
+# Validation modes.
+def compile_mode(val, valkwargs={}, mode='full', sample=.1):
+    """Compile a validator for a validation mode.
+    
+    :param val: The validator function.
+    :param valkwargs: (Optional.) The keyword arguments for the 
+        validator.
+    :param mode: (Optional.) The validation mode. This defaults 
+        to full.
+    :param sample: (Optional.) The fraction of the items in each 
+        top-level sequence to validate in sampled mode. This 
+        defaults to 0.1.
+    :return: The compiled validator.
+    :rtype: function
+    
+    Modes::
+    
+        full        Validate everything.
+        sampled     Validate every top-level field, but only a 
+                    random sample of the items in top-level 
+                    sequences, such as the data of a list.
+        structural  Validate the top-level keys and the types of 
+                    their values, but nothing nested in them.
+        off         Do not validate.
+    """
+    if mode not in modes:
+        raise ValueError(msg['mode'].format(mode))
+    if mode == 'full':
+        return compile_validator(val, valkwargs)
+    if mode == 'off':
+        def validate(item, name):
+            return True
+        return validate
+    
+    if mode == 'sampled':
+        compile_field = partial(_compile_sampled, sample=sample)
+    else:
+        compile_field = _compile_structural
+    if val is isvalidmap:
+        req = valkwargs.get('req', {})
+        opt = valkwargs.get('opt', {})
+        return _compile_isvalidmap(req, opt, compile_field)
+    return compile_field({'val': val, 'valkwargs': valkwargs})
+
+
+def _compile_sampled(spec, sample):
+    """Compile a spec so that only a sample of the items in a 
+    sequence are validated.
+    """
+    if spec is None or spec['val'] is not isvalidseq:
+        return _compile_spec(spec)
+    valkwargs = spec.get('valkwargs', {})
+    validate_item = compile_validator(valkwargs['val'], 
+                                      valkwargs.get('valkwargs', {}))
+    
+    def validate(L, name):
+        if not isinstance(L, Sequence):
+            raise TypeError(msg['type'].format(name, Sequence, type(L)))
+        length = len(L)
+        count = min(length, ceil(length * sample))
+        for i in sorted(random_sample(range(length), count)):
+            validate_item(L[i], NamePath(name, i))
+        return True
+    return validate
+
+
+def _compile_structural(spec):
+    """Compile a spec so that only the type of the item is checked."""
+    if spec is None:
+        return _compile_spec(spec)
+    val = spec['val']
+    if val is isvalid:
+        validtype = spec['valkwargs']['validtype']
+    elif val is isvalidseq:
+        validtype = Sequence
+    elif val is isvalidmap:
+        validtype = Mapping
+    elif val is isvalidurl:
+        validtype = str
+    else:
+        def validate(item, name):
+            return True
+        return validate
+    
+    def validate(item, name):
+        if not isinstance(item, validtype):
+            raise TypeError(msg['type'].format(name, validtype, type(item)))
+        return True
+    return validate
+
+
+# The validation modes for compile_mode.
+modes = ('full', 'sampled', 'structural', 'off')
+
+
 # Sample validate function.
-def validate_httpjson(ctype, content, name, val, valkwargs):
+def validate_httpjson(ctype, content, name, val, valkwargs, 
+                      normalize_leaves=False):
     """A trust boundary validator for the response from a JSON 
     web service.
     
@@ -287,42 +655,252 @@ def validate_httpjson(ctype, content, name, val, valkwargs):
     :param name: The name of the response. Used for exceptions.
     :param validate: The validation function for the content.
     :param valkwargs: The arguments for the validation function.
+    :param normalize_leaves: (Optional.) If true, the strings in the 
+        decoded JSON are put in normal form rather than the JSON 
+        text. If missing, it defaults to false.
     :return: The JSON transformed to a list or a dict.
     :rtype: list or dict
-    """
-    # Configuration setting for the Content-Type validator.
-    ctype_valkwargs = {
-        'req': {
-            'mediatype': {
-                'val': isvalid,
-                'valkwargs': {
-                    'validtype': str,
-                    'enum': ['application/json',],
-                },
-            },
-            'charset': {
-                'val': isvalid,
-                'valkwargs': {
-                    'validtype': str,
-                    'enum': ['utf-8',],
-                },
-            },
-        },
-    }
     
+    If normalize_leaves is true, the content is UTF-8 bytes, and 
+    the JSON decoder can parse bytes directly, the content is 
+    parsed without being decoded to a str first.
+    """
     # Validate ctype.
-    canon_ctype = canonicalize(ctype, dest_form='NFC')
-    normal_ctype = normalize(canon_ctype, from_ctype)
-    isvalidmap(normal_ctype, 'Content-Type', **ctype_valkwargs)
+    normal_ctype = _validate_ctype(ctype)
     
     # Validate content.
     enc = normal_ctype['charset']
-    canon_content = canonicalize(content, dest_encoding=enc)
-    normal_content = normalize(canon_content, from_json)
+    direct = (normalize_leaves and enc == 'utf-8' 
+              and isinstance(content, bytes) and decodes_bytes())
+    if direct:
+        normal_content = normalize(content, from_json)
+        normal_content = canonicalize_leaves(normal_content)
+    elif normalize_leaves:
+        canon_content = canonicalize(content, dest_encoding=enc, 
+                                     dest_form=None)
+        normal_content = normalize(canon_content, from_json)
+        normal_content = canonicalize_leaves(normal_content)
+    else:
+        canon_content = canonicalize(content, dest_encoding=enc)
+        normal_content = normalize(canon_content, from_json)
     val(normal_content, name, **valkwargs)
     return normal_content
 
 
+def iter_httpjson(ctype, chunks, name, val, valkwargs, envelope=None, 
+                  stream_key='data'):
+    """A streaming trust boundary validator for the response from 
+    a JSON web service. The items of an array in the response are 
+    parsed, canonicalized, and validated one at a time.
+    
+    :param ctype: The text of the Content-Type header from 
+        the response.
+    :param chunks: An iterable of the chunks of the content from 
+        the HTTP response as bytes.
+    :param name: The name of the response. Used for exceptions.
+    :param val: The validation function for each item.
+    :param valkwargs: The arguments for the validation function.
+    :param envelope: (Optional.) The 'val' and 'valkwargs' for the 
+        JSON object that holds the array. It is validated after the 
+        last item, with an empty list in place of the array. If 
+        missing, the content must be a JSON array.
+    :param stream_key: (Optional.) The key of the array in the 
+        envelope. This defaults to 'data'.
+    :return: A generator that yields each validated item. It returns 
+        the validated envelope, or None if there isn't one.
+    :rtype: generator
+    
+    The Content-Type is validated before this returns. Exceptions 
+    for the content are raised as the generator reaches the invalid 
+    part, so items before it will already have been yielded.
+    """
+    normal_ctype = _validate_ctype(ctype)
+    enc = normal_ctype['charset']
+    validate_envelope = None
+    if envelope is not None:
+        validate_envelope = _compile_cached(envelope)
+    else:
+        stream_key = None
+    return _iter_httpjson(chunks, enc, name, val, valkwargs, 
+                          validate_envelope, stream_key)
+
+
+def _iter_httpjson(chunks, enc, name, val, valkwargs, validate_envelope, 
+                   stream_key):
+    """The generator for iter_httpjson."""
+    items = iter_json(chunks, stream_key, enc)
+    parent = NamePath(name, stream_key) if stream_key else name
+    i = 0
+    while True:
+        try:
+            item = next(items)
+        except StopIteration as ex:
+            fields = ex.value
+            break
+        item = canonicalize_leaves(item)
+        val(item, NamePath(parent, i), **valkwargs)
+        yield item
+        i += 1
+    if validate_envelope is not None:
+        fields = canonicalize_leaves(fields)
+        validate_envelope(fields, name)
+    return fields
+
+
+def _validate_ctype(ctype):
+    """Validate the Content-Type header of a JSON response and 
+    return it as a dict.
+    """
+    canon_ctype = canonicalize(ctype, dest_form='NFC')
+    normal_ctype = normalize(canon_ctype, from_ctype)
+    isvalidmap(normal_ctype, 'Content-Type', **_ctype_valkwargs)
+    return normal_ctype
+
+
+def _compile_cached(spec):
+    """Compile a 'val'/'valkwargs' spec, reusing the result for 
+    the same spec.
+    """
+    compiled = _specs_compiled.get(id(spec))
+    if compiled is None or compiled[0] is not spec:
+        compiled = (spec, _compile_spec(spec))
+        _specs_compiled[id(spec)] = compiled
+    return compiled[1]
+
+
+# Configuration setting for the Content-Type validator.
+_ctype_valkwargs = {
+    'req': {
+        'mediatype': {
+            'val': isvalid,
+            'valkwargs': {
+                'validtype': str,
+                'enum': ['application/json',],
+            },
+        },
+        'charset': {
+            'val': isvalid,
+            'valkwargs': {
+                'validtype': str,
+                'enum': ['utf-8',],
+            },
+        },
+    },
+}
+
+# Specs compiled by _compile_cached, by id.
+_specs_compiled = {}
+
+
+# Validated result cache.
+class ResultCache:
+    """A least recently used cache of validated results for 
+    trust_boundary.
+    
+    :param maxsize: (Optional.) The maximum number of results to 
+        keep. This defaults to 128.
+    :param ttl: (Optional.) The number of seconds a result is fresh. 
+        This defaults to 300.
+    
+    Results are kept after they go stale with the digest of the raw 
+    output they were validated from, so trust_boundary can reuse a 
+    stale result if the output hasn't changed. The counts of hits 
+    and misses are kept in the hits and misses attributes.
+    
+    Warning::
+    
+        A cached result is returned to every caller that gets a 
+        hit for it, so callers must not change the results they 
+        get while the cache is in use.
+    """
+    def __init__(self, maxsize=128, ttl=300):
+        if maxsize <= 0:
+            raise ValueError(msg['maxsize'].format(maxsize))
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = Lock()
+    
+    def __len__(self):
+        return len(self._data)
+    
+    def get(self, key):
+        """Get a fresh cached result.
+        
+        :param key: The key of the result.
+        :return: The result.
+        :rtype: Varies.
+        :raises KeyError: If the result is not cached or is stale.
+        """
+        with self._lock:
+            try:
+                value, _, expires = self._data[key]
+            except KeyError:
+                self.misses += 1
+                raise
+            if monotonic() >= expires:
+                self.misses += 1
+                raise KeyError(key)
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def get_stale(self, key):
+        """Get a cached result and its digest, even if it is stale.
+        
+        :param key: The key of the result.
+        :return: The result and the digest it was stored with.
+        :rtype: tuple
+        :raises KeyError: If the result is not cached.
+        """
+        with self._lock:
+            value, digest, _ = self._data[key]
+            return value, digest
+    
+    def put(self, key, value, digest=None):
+        """Store a result, evicting the least recently used result 
+        if the cache is full.
+        
+        :param key: The key of the result.
+        :param value: The result.
+        :param digest: (Optional.) The digest of the raw output the 
+            result was validated from.
+        :return: None.
+        :rtype: NoneType
+        """
+        with self._lock:
+            self._data[key] = (value, digest, monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+    
+    def clear(self):
+        """Remove all results from the cache.
+        
+        :return: None.
+        :rtype: NoneType
+        """
+        with self._lock:
+            self._data.clear()
+
+
+def _digest(result):
+    """Hash the raw output of a function wrapped by trust_boundary. 
+    Returns None if the output can't be hashed.
+    """
+    h = blake2b(digest_size=32)
+    for part in result:
+        if isinstance(part, str):
+            part = part.encode('utf_8')
+        elif not isinstance(part, (bytes, bytearray)):
+            return None
+        h.update(len(part).to_bytes(8, 'big'))
+        h.update(part)
+    return h.digest()
+
+
 # Trust boundary decorator.
 def trust_boundary(fn):
     """Marks the existence of a trust boundary between the 
@@ -334,6 +912,9 @@ def trust_boundary(fn):
         function.
     :rtype: Varies. See the validator for the decorated function.
     
+    If the decorated function is a coroutine function, the wrapper 
+    is too, and it validates the awaited output.
+    
     Configuration::
     
         trust_boundary uses the following global value to allow 
@@ -352,27 +933,169 @@ def trust_boundary(fn):
                     <function2>: {
                         'val': <function2's_validator>,
                         'valkwargs': <function2's_validator's_kwargs>,
+                        'mode': <validation_mode>,
+                        'sample': <fraction_to_sample>,
                     }
                 }
+        
+        If a validator takes a nested validator through val and 
+        valkwargs keyword arguments, like validate_httpjson does, 
+        the nested validator is compiled with compile_mode the 
+        first time it is used. The optional mode and sample keys 
+        select the validation mode for the function and default 
+        to 'full' and 0.1. They can be changed at runtime. Assign 
+        a new entry in tbvals to change a validator after it has 
+        been used.
+        
+        :global pyvalidate.tbcache: (Optional.) A ResultCache. If 
+            set, validated results are cached by the name of the 
+            function, its validation mode and sample, and the 
+            arguments of the call. A repeat of a call with a fresh 
+            result returns it without calling the function. For a 
+            stale result, the function is called, and its result is 
+            reused without validation if the digest of the raw 
+            output hasn't changed. Calls with arguments that can't 
+            be hashed aren't cached, and neither are results with 
+            raw output that can't be hashed, like streams, since 
+            they can only be read once.
+        
+        :global pyvalidate.tbstats: trust_boundary records the 
+            following for each function it wraps, keyed by the 
+            name of the function:
+            
+                {
+                    'mode': <last_validation_mode>,
+                    'calls': <number_of_calls>,
+                    'cache_hits': <number_of_tbcache_hits>,
+                    'seconds': <total_seconds_spent_validating>,
+                }
     """
+    key = fn.__name__
+    sig = signature(fn)
+    if iscoroutinefunction(fn):
+        @wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            cachekey, validated = _tblookup(key, sig, args, kwargs)
+            if validated is not _miss:
+                return validated
+            result = await fn(*args, **kwargs)
+            return _tbvalidate(key, result, cachekey)
+        return async_wrapper
+    
     @wraps(fn)
     def wrapper(*args, **kwargs):
-        # Get the result of the wrapped function.
+        cachekey, validated = _tblookup(key, sig, args, kwargs)
+        if validated is not _miss:
+            return validated
         result = fn(*args, **kwargs)
-        
-        # Find the validator.
-        key = fn.__name__
-        try:
-            validator = tbvals[key]['val']
-            valkwargs = tbvals[key]['valkwargs']
-        except KeyError:
-            raise NotImplementedError(msg['novalidate'].format(key))
-        
-        # Validate and return the result.
-        return validator(*result, key, **valkwargs)
+        return _tbvalidate(key, result, cachekey)
     
     # Return the wrapped function.
     return wrapper
+
+
+def _tblookup(key, sig, args, kwargs):
+    """Look up a call to a function wrapped by trust_boundary in 
+    tbcache. Returns the cache key for the call, or None if it can't 
+    be cached, and the fresh cached result, or _miss if there isn't 
+    one.
+    """
+    cache = tbcache
+    if cache is None:
+        return None, _miss
+    _, _, mode, sample = _tbvalidator(key)
+    try:
+        bound = sig.bind(*args, **kwargs)
+    except TypeError:
+        return None, _miss
+    bound.apply_defaults()
+    cachekey = (key, mode, sample, tuple(bound.arguments.items()))
+    try:
+        validated = cache.get(cachekey)
+    except TypeError:
+        return None, _miss
+    except KeyError:
+        return cachekey, _miss
+    _tbrecord(key, mode, 0, True)
+    return cachekey, validated
+
+
+def _tbvalidate(key, result, cachekey=None):
+    """Validate the result of a function wrapped by trust_boundary."""
+    # Find the validator.
+    validator, valkwargs, mode, _ = _tbvalidator(key)
+    
+    # Reuse a stale cached result if the output hasn't changed.
+    cache = tbcache if cachekey is not None else None
+    digest = None
+    if cache is not None:
+        digest = _digest(result)
+        try:
+            validated, cached = cache.get_stale(cachekey)
+        except KeyError:
+            pass
+        else:
+            if digest is not None and digest == cached:
+                cache.put(cachekey, validated, digest)
+                _tbrecord(key, mode, 0, True)
+                return validated
+    
+    # Validate and return the result.
+    start = perf_counter()
+    validated = validator(*result, key, **valkwargs)
+    _tbrecord(key, mode, perf_counter() - start, False)
+    if cache is not None and digest is not None:
+        cache.put(cachekey, validated, digest)
+    return validated
+
+
+def _tbvalidator(key):
+    """Get the validator, its keyword arguments, the validation 
+    mode, and the sample for a function wrapped by trust_boundary, 
+    compiling the nested validator if there is one.
+    """
+    try:
+        entry = tbvals[key]
+        validator = entry['val']
+        valkwargs = entry['valkwargs']
+    except KeyError:
+        raise NotImplementedError(msg['novalidate'].format(key))
+    mode = entry.get('mode', 'full')
+    sample = entry.get('sample', .1)
+    
+    # Reuse the compiled validator unless the entry was replaced or 
+    # its mode changed.
+    compiled = _tbcompiled.get(key)
+    if (compiled is not None and compiled[0] is entry 
+            and compiled[1] == mode and compiled[2] == sample):
+        return compiled[3], compiled[4], mode, sample
+    
+    if 'val' in valkwargs:
+        nested = compile_mode(valkwargs['val'], 
+                              valkwargs.get('valkwargs', {}), 
+                              mode, sample)
+        valkwargs = dict(valkwargs, val=nested, valkwargs={})
+    elif mode not in modes:
+        raise ValueError(msg['mode'].format(mode))
+    _tbcompiled[key] = (entry, mode, sample, validator, valkwargs)
+    return validator, valkwargs, mode, sample
+
+
+def _tbrecord(key, mode, seconds, cache_hit):
+    """Record a call to a function wrapped by trust_boundary in 
+    tbstats.
+    """
+    with _tbstats_lock:
+        stats = tbstats.setdefault(key, {
+            'mode': mode,
+            'calls': 0,
+            'cache_hits': 0,
+            'seconds': 0.0,
+        })
+        stats['mode'] = mode
+        stats['calls'] += 1
+        stats['cache_hits'] += cache_hit
+        stats['seconds'] += seconds
     
 
 if __name__ == '__main__':
@@ -0,0 +1,533 @@
+# -*- coding: utf-8 -*-
+"""
+query
+~~~~~
+
+An offline search engine for the cards in a local store. It parses
+a practical subset of Scryfall.com's search syntax and compiles it
+to SQL against the store's tables:
+
+    name        Bare words, name:, n:, or !"exact name".
+    set:        s:, e:, edition:, or set:.
+    type:       t: or type:.
+    o:          o: or oracle:.
+    c:          c: or color:, with id: or identity: for the color
+                identity. Colors are W, U, B, R, G, C (colorless),
+                or M (multicolored), or the color names. c: finds
+                cards with at least the colors, and id: finds cards
+                whose identity fits within them, as on Scryfall.com.
+                C and M only support :, =, and !=, and M also
+                supports < and <= for at most one color.
+    cmc         cmc:, cmc=, cmc<, cmc<=, cmc>, cmc>=, cmc!=.
+    rarity:     r: or rarity:, with comparisons.
+    is:         is:foil, is:nonfoil, is:reprint, is:promo,
+                is:digital, is:reserved, is:fullart, and the layouts.
+    lang:       lang: or language:.
+
+Terms next to each other must all match. They can be joined with
+"or", grouped with parentheses, and negated with "-" or "not". The
+word "and" is allowed but not needed.
+
+:copyright: © 2018 Paul J. Iutzi
+:license: MIT, see LICENSE for more details.
+"""
+from re import VERBOSE, compile as re_compile
+
+from scrycli.pyvalidate.normalize import from_json
+
+
+# Exception messages.
+msg = {
+    'dir': 'Invalid sort direction {}.',
+    'end': 'Unexpected end of query.',
+    'keyword': 'Unknown search keyword {}.',
+    'op': 'Keyword {} does not support {}.',
+    'order': 'Invalid sort order {}.',
+    'syntax': 'Invalid query near {!r}.',
+    'unique': 'Invalid unique strategy {}.',
+    'value': 'Invalid value for {}: {}.',
+}
+
+# The number of cards in a page of results, as on Scryfall.com.
+page_size = 175
+
+# The search keywords and their aliases.
+keywords = {
+    'name': 'name', 'n': 'name',
+    'set': 'set', 's': 'set', 'e': 'set', 'edition': 'set',
+    'type': 'type', 't': 'type',
+    'oracle': 'oracle', 'o': 'oracle',
+    'color': 'color', 'c': 'color',
+    'identity': 'identity', 'id': 'identity', 'ci': 'identity',
+    'cmc': 'cmc',
+    'rarity': 'rarity', 'r': 'rarity',
+    'is': 'is',
+    'lang': 'lang', 'language': 'lang',
+}
+
+# Color names and their symbols.
+colors = 'WUBRG'
+color_names = {
+    'white': 'W', 'blue': 'U', 'black': 'B', 'red': 'R', 'green': 'G',
+    'colorless': 'C', 'multicolor': 'M',
+}
+
+# Rarities in order, with their abbreviations.
+rarities = ('common', 'uncommon', 'rare', 'mythic')
+rarity_names = {
+    'c': 'common', 'u': 'uncommon', 'r': 'rare', 'm': 'mythic',
+}
+
+# The is: values that are boolean fields and those that are layouts.
+is_fields = {
+    'foil': 'foil', 'nonfoil': 'nonfoil', 'reprint': 'reprint',
+    'promo': 'promo', 'digital': 'digital', 'reserved': 'reserved',
+    'fullart': 'full_art',
+}
+is_layouts = (
+    'split', 'flip', 'transform', 'meld', 'leveler', 'saga',
+    'augment', 'host',
+)
+
+# The layouts of extra cards, which are left out unless asked for.
+extra_layouts = (
+    'token', 'double_faced_token', 'emblem', 'planar', 'scheme',
+    'vanguard',
+)
+
+# The comparison operators.
+ops = {':': '=', '=': '=', '!=': '!=', '<': '<', '<=': '<=',
+       '>': '>', '>=': '>='}
+
+# The sort orders and their default directions for 'auto'.
+orders = {
+    'name': ('name', 'ASC'),
+    'set': ('set_code', 'ASC'),
+    'released': ('released_at', 'DESC'),
+    'rarity': ("CASE rarity WHEN 'common' THEN 0 WHEN 'uncommon' "
+               "THEN 1 WHEN 'rare' THEN 2 WHEN 'mythic' THEN 3 END",
+               'DESC'),
+    'cmc': ('cmc', 'ASC'),
+    'power': ('CAST(power AS REAL)', 'DESC'),
+    'toughness': ('CAST(toughness AS REAL)', 'DESC'),
+    'artist': ('artist', 'ASC'),
+}
+dirs = {'auto': None, 'asc': 'ASC', 'desc': 'DESC'}
+
+# The column that groups cards for each unique strategy.
+uniques = {
+    'cards': 'COALESCE(oracle_id, id)',
+    'art': "COALESCE(json_extract(data, '$.illustration_id'), id)",
+    'prints': None,
+}
+
+# The tokens of a query.
+_token = re_compile(r'''
+    \s*(?:
+        (?P<lparen>\()
+        | (?P<rparen>\))
+        | (?P<neg>-)(?=[^\s)])
+        | !(?P<exact>"[^"]*"|[^\s()]+)
+        | (?P<key>[A-Za-z]+)(?P<op>!=|<=|>=|:|=|<|>)
+          (?P<value>"[^"]*"|[^\s()]*)
+        | (?P<word>"[^"]*"|[^\s()]+)
+    )
+''', VERBOSE)
+_space = re_compile(r'\s*')
+
+
+def parse(q: str):
+    """Parse a search query.
+    
+    :param q: The search query.
+    :return: The syntax tree of the query. Each node is a
+        :class:tuple: ('and', [nodes]), ('or', [nodes]),
+        ('not', node), or ('term', keyword, operator, value).
+    :rtype: tuple
+    
+    Usage::
+        
+        >>> parse('set:uma -t:creature')
+        ('and', [('term', 'set', ':', 'uma'), ('not', ('term', 'type', ':', 'creature'))])
+    """
+    parser = _Parser(_tokenize(q))
+    node = parser.expr()
+    if parser.peek() is not None:
+        raise ValueError(msg['syntax'].format(parser.peek()[1]))
+    return node
+
+
+def compile_query(q: str):
+    """Compile a search query to a SQL condition on the cards table.
+    
+    :param q: The search query.
+    :return: The SQL condition and a :class:list of its parameters.
+    :rtype: tuple
+    
+    Usage::
+        
+        >>> compile_query('s:UMA cmc>=3')
+        ('(set_code = ? AND cmc >= ?)', ['uma', 3.0])
+    """
+    return _compile(parse(q))
+
+
+def uses_keyword(node, keyword):
+    """Whether a syntax tree has a term with the given keyword."""
+    if node[0] == 'term':
+        return node[1] == keyword
+    if node[0] == 'not':
+        return uses_keyword(node[1], keyword)
+    return any(uses_keyword(child, keyword) for child in node[1])
+
+
+def cards_search(store, q, unique=None, order=None, dir=None,
+                 include_extras=None, include_multilingual=None,
+                 page=None):
+    """Search the cards in a local store.
+    
+    :param store: The :class:scrycli.store.Store to search.
+    :param q: A fulltext search query.
+    :param unique: (Optional.) Strategy for omitting similar cards:
+        'cards', 'art', or 'prints'. If missing, it defaults to
+        'cards'.
+    :param order: (Optional.) Sort order for the returned cards. If
+        missing, it defaults to 'name'.
+    :param dir: (Optional.) The direction to sort the returned cards:
+        'auto', 'asc', or 'desc'. If missing, it defaults to 'auto'.
+    :param include_extras: (Optional.) Include extra cards, like
+        tokens, in the returned cards.
+    :param include_multilingual: (Optional.) If true, will return
+        each language version of each card returned. If missing, only
+        English cards are returned unless the query has a lang: term.
+    :param page: (Optional.) Which page of the results to return.
+        If missing, it defaults to 1.
+    :return: A :class:dict in the shape of a Scryfall.com card list.
+    :rtype: dict
+    
+    This has the call shape of scrycli.cards_search(), so it can
+    stand in for it::
+        
+        >>> from functools import partial
+        >>> from scrycli.store import Store
+        >>> search = partial(cards_search, Store(':memory:'))
+        >>> search('set:uma', order='set')['total_cards']
+        0
+    """
+    if unique is None:
+        unique = 'cards'
+    if unique not in uniques:
+        raise ValueError(msg['unique'].format(unique))
+    if order is None:
+        order = 'name'
+    if order not in orders:
+        raise ValueError(msg['order'].format(order))
+    if dir is None:
+        dir = 'auto'
+    if dir not in dirs:
+        raise ValueError(msg['dir'].format(dir))
+    if not page:
+        page = 1
+    
+    node = parse(q)
+    where, params = _compile(node)
+    if not include_extras:
+        where += ' AND layout NOT IN ({})'.format(
+            ', '.join('?' * len(extra_layouts))
+        )
+        params.extend(extra_layouts)
+    if not include_multilingual and not uses_keyword(node, 'lang'):
+        where += " AND lang = 'en'"
+    
+    column, auto_dir = orders[order]
+    direction = dirs[dir] or auto_dir
+    sql = ('SELECT data, {} AS sort_key, name, set_code, collector_number'
+           ).format(column)
+    group = uniques[unique]
+    if group:
+        sql += (', ROW_NUMBER() OVER (PARTITION BY {} ORDER BY '
+                'released_at DESC, set_code, collector_number) AS rn'
+                ).format(group)
+    sql += ' FROM cards WHERE ' + where
+    if group:
+        sql = 'SELECT * FROM ({}) WHERE rn = 1'.format(sql)
+    
+    total = store.fetchall('SELECT COUNT(*) FROM ({})'.format(sql), 
+                           params)[0][0]
+    offset = (page - 1) * page_size
+    rows = store.fetchall(
+        ('SELECT data FROM ({}) ORDER BY sort_key {}, name, set_code, '
+         'collector_number LIMIT ? OFFSET ?').format(sql, direction),
+        params + [page_size, offset]
+    )
+    return {
+        'object': 'list',
+        'total_cards': total,
+        'has_more': offset + len(rows) < total,
+        'data': [from_json(row[0]) for row in rows],
+    }
+
+
+def _tokenize(q):
+    """Split a query into (kind, text, key, op, value) tokens."""
+    tokens = []
+    pos = _space.match(q).end()
+    while pos < len(q):
+        match = _token.match(q, pos)
+        if not match or match.end() == pos:
+            raise ValueError(msg['syntax'].format(q[pos:]))
+        text = match.group().strip()
+        if match.group('lparen'):
+            tokens.append(('(', text))
+        elif match.group('rparen'):
+            tokens.append((')', text))
+        elif match.group('neg'):
+            tokens.append(('not', text))
+        elif match.group('exact') is not None:
+            value = _unquote(match.group('exact'))
+            tokens.append(('term', text, 'name', '==', value))
+        elif match.group('key') is not None:
+            key = match.group('key').lower()
+            if key not in keywords:
+                raise ValueError(msg['keyword'].format(key))
+            value = _unquote(match.group('value'))
+            if not value:
+                raise ValueError(msg['value'].format(key, value))
+            tokens.append(('term', text, keywords[key],
+                           match.group('op'), value))
+        else:
+            word = match.group('word')
+            if word.lower() in ('and', 'or', 'not'):
+                tokens.append((word.lower(), text))
+            else:
+                tokens.append(('term', text, 'name', ':', _unquote(word)))
+        pos = _space.match(q, match.end()).end()
+    return tokens
+
+
+def _unquote(value):
+    """Remove the quotes from a quoted value."""
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        return value[1:-1]
+    return value
+
+
+class _Parser:
+    """A recursive descent parser for query tokens."""
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+    
+    def peek(self):
+        if self.pos < len(self.tokens):
+            return self.tokens[self.pos]
+        return None
+    
+    def expr(self):
+        """expr := and_expr ('or' and_expr)*"""
+        nodes = [self.and_expr(),]
+        while self.peek() and self.peek()[0] == 'or':
+            self.pos += 1
+            nodes.append(self.and_expr())
+        if len(nodes) == 1:
+            return nodes[0]
+        return ('or', nodes)
+    
+    def and_expr(self):
+        """and_expr := unary (['and'] unary)*"""
+        nodes = [self.unary(),]
+        while self.peek() and self.peek()[0] not in ('or', ')'):
+            if self.peek()[0] == 'and':
+                self.pos += 1
+            nodes.append(self.unary())
+        if len(nodes) == 1:
+            return nodes[0]
+        return ('and', nodes)
+    
+    def unary(self):
+        """unary := ('-' | 'not') unary | '(' expr ')' | term"""
+        token = self.peek()
+        if token is None:
+            raise ValueError(msg['end'])
+        self.pos += 1
+        if token[0] == 'not':
+            return ('not', self.unary())
+        if token[0] == '(':
+            node = self.expr()
+            if self.peek() is None or self.peek()[0] != ')':
+                raise ValueError(msg['end'])
+            self.pos += 1
+            return node
+        if token[0] == 'term':
+            return ('term',) + token[2:]
+        raise ValueError(msg['syntax'].format(token[1]))
+
+
+def _compile(node):
+    """Compile a syntax tree node to SQL and parameters."""
+    if node[0] == 'term':
+        return _compilers[node[1]](*node[1:])
+    if node[0] == 'not':
+        sql, params = _compile(node[1])
+        return 'NOT COALESCE({}, 0)'.format(sql), params
+    sqls = []
+    params = []
+    for child in node[1]:
+        sql, child_params = _compile(child)
+        sqls.append(sql)
+        params.extend(child_params)
+    joiner = ' AND ' if node[0] == 'and' else ' OR '
+    return '({})'.format(joiner.join(sqls)), params
+
+
+def _equality(key, op):
+    """Get the SQL operator for a keyword that only supports
+    equality.
+    """
+    if op not in (':', '='):
+        raise ValueError(msg['op'].format(key, op))
+    return '='
+
+
+def _contains(value):
+    """Get the LIKE pattern for text containing a value, escaping 
+    the LIKE wildcards in it.
+    """
+    for char in ('\\', '%', '_'):
+        value = value.replace(char, '\\' + char)
+    return '%{}%'.format(value)
+
+
+def _all(sqls):
+    """Join SQL conditions with AND. No conditions is true."""
+    if not sqls:
+        return '1'
+    return ' AND '.join(sqls)
+
+
+def _compile_name(key, op, value):
+    if op == '==':
+        return 'name = ?', [value,]
+    _equality(key, op)
+    return "name LIKE ? ESCAPE '\\'", [_contains(value),]
+
+
+def _compile_set(key, op, value):
+    return 'set_code {} ?'.format(_equality(key, op)), [value.lower(),]
+
+
+def _compile_lang(key, op, value):
+    return 'lang {} ?'.format(_equality(key, op)), [value.lower(),]
+
+
+def _compile_like(column):
+    def compile_like(key, op, value):
+        _equality(key, op)
+        sql = "{} LIKE ? ESCAPE '\\'".format(column)
+        return sql, [_contains(value),]
+    return compile_like
+
+
+def _compile_colors(column, within=False):
+    def compile_colors(key, op, value):
+        if op not in ops:
+            raise ValueError(msg['op'].format(key, op))
+        value = color_names.get(value.lower(), value.upper())
+        field = 'COALESCE({}, \'\')'.format(column)
+        count = 'length({})'.format(field)
+        if value == 'C':
+            if op in (':', '='):
+                return "{} = ''".format(field), []
+            if op == '!=':
+                return "{} != ''".format(field), []
+            raise ValueError(msg['op'].format(key, op))
+        if value == 'M':
+            if op in (':', '='):
+                return '{} > 1'.format(count), []
+            if op in ('!=', '<', '<='):
+                return '{} <= 1'.format(count), []
+            raise ValueError(msg['op'].format(key, op))
+        if any(color not in colors for color in value):
+            raise ValueError(msg['value'].format(key, value))
+        if within and op == ':':
+            op = '<='
+        
+        wanted = set(value)
+        has = ['instr({}, ?) > 0'.format(field) for _ in wanted]
+        lacks = ['instr({}, ?) = 0'.format(field)
+                 for color in colors if color not in wanted]
+        others = [color for color in colors if color not in wanted]
+        if op in (':', '>='):
+            return '({})'.format(_all(has)), sorted(wanted)
+        if op == '>':
+            sql = '({} AND {} > ?)'.format(_all(has), count)
+            return sql, sorted(wanted) + [len(wanted),]
+        if op == '<=':
+            return '({})'.format(_all(lacks)), others
+        if op == '<':
+            sql = '({} AND {} < ?)'.format(_all(lacks), count)
+            return sql, others + [len(wanted),]
+        sql = '({} AND {} = ?)'.format(_all(has), count)
+        if op == '!=':
+            sql = 'NOT ' + sql
+        return sql, sorted(wanted) + [len(wanted),]
+    return compile_colors
+
+
+def _compile_cmc(key, op, value):
+    if op not in ops:
+        raise ValueError(msg['op'].format(key, op))
+    try:
+        number = float(value)
+    except ValueError:
+        raise ValueError(msg['value'].format(key, value))
+    return 'cmc {} ?'.format(ops[op]), [number,]
+
+
+def _compile_rarity(key, op, value):
+    if op not in ops:
+        raise ValueError(msg['op'].format(key, op))
+    value = rarity_names.get(value.lower(), value.lower())
+    if value not in rarities:
+        raise ValueError(msg['value'].format(key, value))
+    rank = rarities.index(value)
+    compare = {
+        '=': lambda i: i == rank, '!=': lambda i: i != rank,
+        '<': lambda i: i < rank, '<=': lambda i: i <= rank,
+        '>': lambda i: i > rank, '>=': lambda i: i >= rank,
+    }[ops[op]]
+    matches = [r for i, r in enumerate(rarities) if compare(i)]
+    if not matches:
+        return '0', []
+    return 'rarity IN ({})'.format(', '.join('?' * len(matches))), matches
+
+
+def _compile_is(key, op, value):
+    _equality(key, op)
+    value = value.lower()
+    if value in is_fields:
+        sql = "json_extract(data, '$.{}') = 1".format(is_fields[value])
+        return sql, []
+    if value in is_layouts:
+        return 'layout = ?', [value,]
+    raise ValueError(msg['value'].format(key, value))
+
+
+# The compilers for each keyword.
+_compilers = {
+    'name': _compile_name,
+    'set': _compile_set,
+    'type': _compile_like('type_line'),
+    'oracle': _compile_like('oracle_text'),
+    'color': _compile_colors('colors'),
+    'identity': _compile_colors('color_identity', within=True),
+    'cmc': _compile_cmc,
+    'rarity': _compile_rarity,
+    'is': _compile_is,
+    'lang': _compile_lang,
+}
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
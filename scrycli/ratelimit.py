@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+ratelimit
+~~~~~~~~~
+
+A token bucket rate limiter for the requests scrycli makes to 
+Scryfall.com. One limiter can be shared by threads and asyncio 
+tasks.
+
+:copyright: © 2018 Paul J. Iutzi
+:license: MIT, see LICENSE for more details.
+"""
+from asyncio import sleep as async_sleep
+from threading import Lock
+from time import monotonic, sleep
+
+# Exception messages.
+msg = {
+    'rate': 'Rate must be greater than zero. Was {}.',
+    'burst': 'Burst must be at least one. Was {}.',
+}
+
+
+class RateLimiter:
+    """A token bucket rate limiter.
+    
+    :param rate: The number of requests allowed per second.
+    :param burst: (Optional.) The number of requests that can be 
+        made back to back before the rate applies. This defaults 
+        to 1.
+    
+    Each request takes a token from the bucket, and the bucket 
+    refills at the given rate. When the bucket is empty, the 
+    caller only waits for the time remaining until its token is 
+    available, so time spent on the previous request counts 
+    against the wait.
+    
+    Usage::
+    
+        >>> limiter = RateLimiter(10)
+        >>> limiter.acquire()
+    """
+    def __init__(self, rate: float, burst: int = 1):
+        if rate <= 0:
+            raise ValueError(msg['rate'].format(rate))
+        if burst < 1:
+            raise ValueError(msg['burst'].format(burst))
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._last = monotonic()
+        self._lock = Lock()
+    
+    def acquire(self):
+        """Block the calling thread until a request is allowed."""
+        wait = self._reserve()
+        if wait > 0:
+            sleep(wait)
+    
+    async def acquire_async(self):
+        """Suspend the calling task until a request is allowed."""
+        wait = self._reserve()
+        if wait > 0:
+            await async_sleep(wait)
+    
+    def _reserve(self):
+        """Take a token and return the number of seconds the caller 
+        must wait before using it.
+        
+        The bucket can go into debt, which queues callers in the 
+        order they reserved without holding the lock while they 
+        wait.
+        """
+        with self._lock:
+            now = monotonic()
+            elapsed = now - self._last
+            self._last = now
+            self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0
+            return -self._tokens / self.rate
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+"""
+records
+~~~~~~~
+
+Compact record types for the cards and sets scrycli gets from
+Scryfall.com. They are an optional alternative to the dicts the
+trust boundaries return for when many cards need to be held in
+memory.
+
+Each record type has a slot for each key in its validation config
+in config.cvals, so the keys aren't stored with every object.
+Strings that come from a fixed list of values, such as rarity or
+layout, are interned so every card shares one copy of them. Lists
+become tuples, and nested objects become records.
+
+Keys that aren't valid Python names, such as the '1v1' legality,
+get an 'f_' prefix for their attribute name. Keys that aren't in
+the validation config are dropped.
+
+:copyright: © 2018 Paul J. Iutzi
+:license: MIT, see LICENSE for more details.
+"""
+from sys import intern
+
+from scrycli import config
+import scrycli.pyvalidate.pyvalidate as PV
+
+
+class Record:
+    """The base class for records.
+    
+    Subclasses set __slots__ to the attribute names for a validation
+    config and _spec to how each attribute is read from JSON. Use
+    _define() to build both.
+    """
+    __slots__ = ()
+    _spec = ()
+    
+    def __init__(self, **kwargs):
+        for attr, _, _ in self._spec:
+            setattr(self, attr, kwargs.get(attr))
+    
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return all(getattr(self, attr) == getattr(other, attr)
+                   for attr in self.__slots__)
+    
+    def __repr__(self):
+        attrs = ('name', 'id', 'code')
+        args = ', '.join('{}={!r}'.format(attr, getattr(self, attr))
+                         for attr in attrs if attr in self.__slots__)
+        return '{}({})'.format(type(self).__name__, args)
+    
+    @classmethod
+    def from_json(cls, obj: dict):
+        """Build a record from a validated JSON object.
+        
+        :param obj: The validated object.
+        :return: The record.
+        :rtype: Record
+        """
+        self = cls.__new__(cls)
+        for attr, key, convert in cls._spec:
+            value = obj.get(key)
+            if value is not None and convert is not None:
+                value = convert(value)
+            setattr(self, attr, value)
+        return self
+    
+    def to_dict(self):
+        """Convert the record back to a JSON object. Attributes
+        that are None are left out.
+        
+        :return: The object.
+        :rtype: dict
+        """
+        obj = {}
+        for attr, key, _ in self._spec:
+            value = getattr(self, attr)
+            if value is None:
+                continue
+            if isinstance(value, Record):
+                value = value.to_dict()
+            elif isinstance(value, tuple):
+                value = [item.to_dict() if isinstance(item, Record)
+                         else item for item in value]
+            obj[key] = value
+        return obj
+
+
+def _define(cval: str, nested: dict = None):
+    """Build the __slots__ and _spec of a record type from a
+    validation config.
+    
+    :param cval: The key of the validation config in config.cvals.
+    :param nested: (Optional.) The record types for keys that hold
+        objects or lists of objects.
+    :return: The slots and the spec.
+    :rtype: tuple
+    """
+    nested = nested or {}
+    valkwargs = config.cvals[cval]['valkwargs']
+    fields = dict(valkwargs.get('req', {}))
+    fields.update(valkwargs.get('opt', {}))
+    slots = []
+    spec = []
+    for key, field in fields.items():
+        attr = key if key.isidentifier() else 'f_' + key
+        slots.append(attr)
+        spec.append((attr, key, _converter(key, field, nested)))
+    return tuple(slots), tuple(spec)
+
+
+def _converter(key, field, nested):
+    """Get the function that converts a JSON value for a record."""
+    if field is None:
+        return None
+    if field['val'] is PV.isvalidmap:
+        return nested[key].from_json
+    if field['val'] is PV.isvalidseq:
+        item = field['valkwargs']
+        if item['val'] is PV.isvalidmap:
+            from_json = nested[key].from_json
+            return lambda value: tuple(from_json(obj) for obj in value)
+        if 'enum' in item['valkwargs']:
+            return lambda value: tuple(intern(s) for s in value)
+        return tuple
+    if field['val'] is PV.isvalid and 'enum' in field['valkwargs']:
+        return intern
+    return None
+
+
+class Legalities(Record):
+    """The formats a card is legal in."""
+    __slots__, _spec = _define('sf_legalities')
+
+
+class ImageURIs(Record):
+    """The URIs of the images of a card."""
+    __slots__, _spec = _define('sf_imageuris')
+
+
+class PurchaseURIs(Record):
+    """The URIs for buying a card."""
+    __slots__, _spec = _define('sf_purchaseuris')
+
+
+class RelatedURIs(Record):
+    """The URIs for a card on other sites."""
+    __slots__, _spec = _define('sf_relateduris')
+
+
+class CardFace(Record):
+    """A face of a multiface card."""
+    __slots__, _spec = _define('sf_cardface', {
+        'image_uris': ImageURIs,
+    })
+
+
+class RelatedCard(Record):
+    """A card that is related to another card."""
+    __slots__, _spec = _define('sf_relatedcard')
+
+
+class Card(Record):
+    """A MtG card.
+    
+    Usage::
+        
+        >>> card = Card.from_json({
+        ...     'id': '0900e494-962d-48c6-8e78-66a489be4bb2',
+        ...     'name': 'Hanweir Garrison',
+        ...     'rarity': 'rare',
+        ...     'colors': ['R'],
+        ... })
+        >>> card
+        Card(name='Hanweir Garrison', id='0900e494-962d-48c6-8e78-66a489be4bb2')
+        >>> card.colors
+        ('R',)
+    """
+    __slots__, _spec = _define('sf_card', {
+        'all_parts': RelatedCard,
+        'card_faces': CardFace,
+        'image_uris': ImageURIs,
+        'legalities': Legalities,
+        'purchase_uris': PurchaseURIs,
+        'related_uris': RelatedURIs,
+    })
+
+
+class Set(Record):
+    """A MtG set."""
+    __slots__, _spec = _define('sf_set')
+
+
+def cards(objs):
+    """Convert validated card objects to records.
+    
+    :param objs: An iterable of validated card :class:dict objects.
+    :return: A generator that yields a :class:Card for each object.
+    :rtype: generator
+    
+    This works on the results of the paging and streaming
+    functions in scrycli, so pages are converted as they arrive.
+    """
+    for obj in objs:
+        yield Card.from_json(obj)
+
+
+def sets(objs):
+    """Convert validated set objects to records.
+    
+    :param objs: An iterable of validated set :class:dict objects.
+    :return: A generator that yields a :class:Set for each object.
+    :rtype: generator
+    """
+    for obj in objs:
+        yield Set.from_json(obj)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""
+retry
+~~~~~
+
+A retry policy for the requests scrycli makes to Scryfall.com. It
+decides whether a failed request is retried and how long to wait
+first, using exponential backoff with jitter and the Retry-After
+header. One policy can be shared by threads and asyncio tasks.
+
+:copyright: © 2018 Paul J. Iutzi
+:license: MIT, see LICENSE for more details.
+"""
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from random import random
+from threading import Lock
+
+# Exception messages.
+msg = {
+    'attempts': 'Attempts must be at least one. Was {}.',
+    'jitter': 'Jitter must be between zero and one. Was {}.',
+}
+
+
+class RetryPolicy:
+    """A retry policy with exponential backoff and a retry budget.
+    
+    :param attempts: (Optional.) The most times a request is tried,
+        including the first. This defaults to 4.
+    :param backoff: (Optional.) The wait in seconds before the first
+        retry. It doubles for each retry after that. This defaults
+        to 0.5.
+    :param max_backoff: (Optional.) The longest wait in seconds.
+        Backoff is capped at it, and a request whose Retry-After is
+        longer isn't retried. This defaults to 30.
+    :param jitter: (Optional.) The fraction of each wait that is
+        random, from 0 for none to 1 for a wait anywhere between
+        zero and the backoff. This defaults to 1.
+    :param budget: (Optional.) The most retries that can be saved
+        up. This defaults to 10.
+    :param budget_ratio: (Optional.) The retries each new request
+        adds to the budget. This defaults to 0.2, which allows one
+        retry for every five requests once the budget is spent.
+    :param statuses: (Optional.) The HTTP status codes to retry.
+        This defaults to 429 and the 5xx codes for temporary
+        failures.
+    
+    When a response has a Retry-After header, its wait is used
+    instead of the backoff. The request is never retried before
+    the server allows it. The budget starts full and keeps an
+    outage from turning every request into several.
+    
+    The policy counts the retries it allows, the seconds they wait,
+    and the requests it gives up on. See stats().
+    
+    Usage::
+    
+        >>> policy = RetryPolicy(3, backoff=1, jitter=0)
+        >>> policy.delay(1, 503)
+        1.0
+        >>> policy.delay(2, 503, '5')
+        5.0
+        >>> policy.delay(2, 503, '3600') is None
+        True
+        >>> policy.delay(3, 503) is None
+        True
+    """
+    def __init__(self, attempts: int = 4, backoff: float = .5,
+                 max_backoff: float = 30, jitter: float = 1,
+                 budget: float = 10, budget_ratio: float = .2,
+                 statuses=(429, 500, 502, 503, 504)):
+        if attempts < 1:
+            raise ValueError(msg['attempts'].format(attempts))
+        if not 0 <= jitter <= 1:
+            raise ValueError(msg['jitter'].format(jitter))
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.budget = budget
+        self.budget_ratio = budget_ratio
+        self.statuses = frozenset(statuses)
+        self._tokens = budget
+        self._lock = Lock()
+        self.reset_stats()
+    
+    def record_request(self):
+        """Add a new request's share to the retry budget. Call it
+        once for each request, not for its retries.
+        """
+        with self._lock:
+            self._tokens = min(self.budget,
+                               self._tokens + self.budget_ratio)
+    
+    def delay(self, attempt: int, status: int,
+              retry_after: str = None):
+        """Decide whether to retry a failed request.
+        
+        :param attempt: The number of times the request has been
+            tried.
+        :param status: The HTTP status code of the response.
+        :param retry_after: (Optional.) The value of the response's
+            Retry-After header.
+        :return: The seconds to wait before the retry, or None if
+            the request should not be retried.
+        :rtype: float
+        """
+        if status not in self.statuses:
+            return None
+        wait = parse_retry_after(retry_after)
+        with self._lock:
+            if (attempt >= self.attempts or self._tokens < 1
+                    or wait is not None and wait > self.max_backoff):
+                self.exhausted += 1
+                return None
+            self._tokens -= 1
+            if wait is None:
+                wait = min(self.max_backoff,
+                           self.backoff * 2 ** (attempt - 1))
+                wait *= 1 - self.jitter * random()
+            self.retries += 1
+            self.retry_seconds += wait
+            return float(wait)
+    
+    def stats(self):
+        """The retry counters.
+        
+        :return: A :class:dict with the number of retries, the total
+            seconds waited before them, and the number of failed
+            requests that were not retried because they ran out of
+            attempts or budget.
+        :rtype: dict
+        """
+        with self._lock:
+            return {
+                'retries': self.retries,
+                'retry_seconds': self.retry_seconds,
+                'exhausted': self.exhausted,
+            }
+    
+    def reset_stats(self):
+        """Set the retry counters back to zero."""
+        self.retries = 0
+        self.retry_seconds = 0.0
+        self.exhausted = 0
+
+
+def parse_retry_after(value: str):
+    """Get the wait from a Retry-After header.
+    
+    :param value: The value of the header, either seconds or an HTTP
+        date.
+    :return: The seconds to wait, or None if there is no valid value.
+    :rtype: float
+    
+    Usage::
+    
+        >>> parse_retry_after('120')
+        120.0
+        >>> parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT')
+        0.0
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    now = datetime.now(timezone.utc)
+    return max(0.0, (when - now).total_seconds())
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
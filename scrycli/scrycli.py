@@ -8,36 +8,100 @@ This implements the core features of the scrycli module.
 :copyright: © 2018 Paul J. Iutzi
 :license: MIT, see LICENSE for more details.
 """
+from concurrent.futures import ThreadPoolExecutor
 from functools import wraps
+import gzip
+from inspect import signature
 from json import loads
 from json.decoder import JSONDecodeError
+import os
+from queue import Queue
+from threading import Event, Lock
+from time import sleep
 from unicodedata import normalize
+from urllib.parse import urlparse
 
 import requests
 
 from scrycli import config
+from scrycli.cache import HTTPCache
+from scrycli.checkpoint import Checkpoint, fingerprint
+from scrycli.flight import SingleFlight
+from scrycli.ratelimit import RateLimiter
+from scrycli.retry import RetryPolicy
 import scrycli.pyvalidate.pyvalidate as PV
 import scrycli.pyvalidate.normalize as PN
 
 
 # Global configuration settings.
 FQDN = config.fqdn
+BULK_FQDN = config.bulk_fqdn
+POOL_CONNECTIONS = config.pool_connections
+POOL_MAXSIZE = config.pool_maxsize
+POOL_BLOCK = config.pool_block
+LIMITER = RateLimiter(config.rate_limit, config.rate_burst)
+RETRY = None
+if config.retry_attempts > 1:
+    RETRY = RetryPolicy(config.retry_attempts, config.retry_backoff, 
+                        config.retry_max_backoff, config.retry_jitter, 
+                        config.retry_budget, config.retry_budget_ratio)
+STREAM_CHUNK_SIZE = config.stream_chunk_size
+FETCH_WORKERS = config.fetch_workers
+COLLECTION_SIZE = config.collection_size
+FLIGHTS = SingleFlight() if config.single_flight else None
+CACHE = None
+if config.cache_path:
+    CACHE = HTTPCache(config.cache_path, config.cache_ttl, 
+                      config.cache_maxsize)
+if config.json_decoder:
+    PN.set_decoder(config.json_decoder)
+if config.result_cache_size:
+    PV.tbcache = PV.ResultCache(config.result_cache_size, 
+                                config.result_cache_ttl)
 PV.tbvals = {
     'sets': {
         'val': PV.validate_httpjson,
-        'valkwargs': config.cvals['sf_setlist'],
+        'valkwargs': dict(config.cvals['sf_setlist'], 
+                          normalize_leaves=config.normalize_leaves),
     },
     'sets_code': {
         'val': PV.validate_httpjson,
-        'valkwargs': config.cvals['sf_set'],
+        'valkwargs': dict(config.cvals['sf_set'], 
+                          normalize_leaves=config.normalize_leaves),
     },
     'cards': {
         'val': PV.validate_httpjson,
-        'valkwargs': config.cvals['sf_cardlist'],
+        'valkwargs': dict(config.cvals['sf_cardlist'], 
+                          normalize_leaves=config.normalize_leaves),
     },
     'cards_search': {
         'val': PV.validate_httpjson,
-        'valkwargs': config.cvals['sf_cardlist'],
+        'valkwargs': dict(config.cvals['sf_cardlist'], 
+                          normalize_leaves=config.normalize_leaves),
+    },
+    'bulk_data': {
+        'val': PV.validate_httpjson,
+        'valkwargs': dict(config.cvals['sf_bulkdatalist'], 
+                          normalize_leaves=config.normalize_leaves),
+    },
+    'cards_collection_chunk': {
+        'val': PV.validate_httpjson,
+        'valkwargs': dict(config.cvals['sf_cardcollection'], 
+                          normalize_leaves=config.normalize_leaves),
+    },
+    'bulk_cards': {
+        'val': PV.iter_httpjson,
+        'valkwargs': dict(config.cvals['sf_card']),
+    },
+    'cards_stream': {
+        'val': PV.iter_httpjson,
+        'valkwargs': dict(config.cvals['sf_card'], 
+                          envelope=config.cvals['sf_cardlist']),
+    },
+    'cards_search_stream': {
+        'val': PV.iter_httpjson,
+        'valkwargs': dict(config.cvals['sf_card'], 
+                          envelope=config.cvals['sf_cardlist']),
     },
 }
 
@@ -65,7 +129,36 @@ class HTTPServerError(Exception):
     """
 
 
+# Request coalescing.
+def _single_flight(fn):
+    """Coalesce identical API calls made at the same time by 
+    different threads, so they share one HTTP request and one 
+    validation pass. Calls are identical if they bind the same 
+    arguments. Apply it outside PV.trust_boundary.
+    
+    Calls are not coalesced if FLIGHTS is None, which is the default, 
+    or their arguments can't be hashed. Coalesced callers get the 
+    same result object, so it must not be changed.
+    """
+    sig = signature(fn)
+    
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        if FLIGHTS is None:
+            return fn(*args, **kwargs)
+        bound = sig.bind(*args, **kwargs)
+        bound.apply_defaults()
+        key = (fn.__name__, tuple(bound.arguments.items()))
+        try:
+            hash(key)
+        except TypeError:
+            return fn(*args, **kwargs)
+        return FLIGHTS.do(key, fn, *args, **kwargs)
+    return wrapper
+
+
 # API calls.
+@_single_flight
 @PV.trust_boundary
 def sets():
     """Pull a list of sets from Scryfall.com.
@@ -86,10 +179,11 @@ def sets():
         :rtype: list
     """
     url = FQDN + '/sets'
-    resp = _get(url)
-    return resp.headers['Content-Type'], resp.content
+    ctype, content = _get(url)
+    return ctype, content
 
 
+@_single_flight
 @PV.trust_boundary
 def sets_code(code: str, pretty: bool = False):
     """Get the details for a specific set.
@@ -117,10 +211,11 @@ def sets_code(code: str, pretty: bool = False):
     params = {}
     if pretty:
         params['pretty'] = True
-    resp = _get(url, params)
-    return resp.headers['Content-Type'], resp.content
+    ctype, content = _get(url, params)
+    return ctype, content
 
 
+@_single_flight
 @PV.trust_boundary
 def cards(page: int = None):
     """Pull a list of cards from Scryfall.com.
@@ -144,10 +239,11 @@ def cards(page: int = None):
     params = {}
     if page:
         params['page'] = page
-    resp = _get(url, params)
-    return resp.headers['Content-Type'], resp.content
+    ctype, content = _get(url, params)
+    return ctype, content
 
 
+@_single_flight
 @PV.trust_boundary
 def cards_search(q, unique=None, order=None, dir=None, include_extras=None, 
                  include_multilingual=None, page=None, format=None, 
@@ -209,25 +305,772 @@ def cards_search(q, unique=None, order=None, dir=None, include_extras=None,
         params['format'] = format
     if pretty:
         params['pretty'] = pretty
-    resp = _get(url, params)
-    return resp.headers['Content-Type'], resp.content
+    ctype, content = _get(url, params)
+    return ctype, content
+
+
+@_single_flight
+@PV.trust_boundary
+def bulk_data():
+    """Get the list of bulk data files from Scryfall.com.
+    
+    :return: :class:tuple of the Content-Type header and the raw 
+        response contents from Scryfall.com
+    :rtype: tuple
+    
+    Warning::
+    
+        The PV.trust_boundary decorator alters the return type of 
+        this function to the PV.validate_httpjson function's 
+        return type. That return type will vary based on the 
+        data fed into it. In this case it is:
+        
+        :return: A :class:dict that contains a list of the 
+            details of each bulk data file.
+        :rtype: dict
+    """
+    url = FQDN + '/bulk-data'
+    ctype, content = _get(url)
+    return ctype, content
+
+
+@PV.trust_boundary
+def cards_collection_chunk(identifiers):
+    """Get the cards for a list of identifiers in one request. Use 
+    cards_collection() for lists longer than COLLECTION_SIZE.
+    
+    :param identifiers: A :class:list of up to 75 card identifiers. 
+        Each is a :class:dict with an id, mtgo_id, multiverse_id, 
+        oracle_id, illustration_id, or name key, a name and set key, 
+        or a set and collector_number key.
+    :return: The content type and response data as a :class:tuple.
+    :rtype: tuple
+    
+    Warning::
+    
+        The PV.trust_boundary decorator alters the return type of 
+        this function to the PV.validate_httpjson function's 
+        return type. That return type will vary based on the 
+        data fed into it. In this case it is:
+        
+        :return: A :class:dict that contains the cards found and 
+            the identifiers that were not found.
+        :rtype: dict
+    """
+    url = FQDN + '/cards/collection'
+    ctype, content = _post(url, {'identifiers': list(identifiers)})
+    return ctype, content
+
+
+# Streaming API calls.
+@PV.trust_boundary
+def cards_stream(page: int = None):
+    """Pull a list of cards from Scryfall.com as a stream.
+    
+    :param page: (Optional.) The results page to request from 
+        Scryfall.com.
+    :return: :class:tuple of the Content-Type header and an 
+        iterator of the chunks of the response from Scryfall.com.
+    :rtype: tuple
+    
+    Warning::
+    
+        The PV.trust_boundary decorator alters the return type of 
+        this function to the PV.iter_httpjson function's return 
+        type. In this case it is:
+        
+        :return: A generator that yields a :class:dict for each 
+            MtG card in the page as it is parsed and validated. 
+            The generator returns the rest of the list object.
+        :rtype: generator
+    """
+    url = FQDN + '/cards'
+    params = {}
+    if page:
+        params['page'] = page
+    ctype, chunks = _get_stream(url, params)
+    return ctype, chunks
+
+
+@PV.trust_boundary
+def cards_search_stream(q, unique=None, order=None, dir=None, 
+                        include_extras=None, include_multilingual=None, 
+                        page=None):
+    """Search the cards in the Scryfall.com database, streaming 
+    the results.
+    
+    :param q: A fulltext search query.
+    :param unique: (Optional.) Strategy for omitting similar cards.
+    :param order: (Optional.) Sort order for the returned cards.
+    :param dir: (Optional.) The direction to sort the returned cards. 
+    :param include_extras: (Optional.) Include extra cards, like 
+        tokens, to the returned cards.
+    :param include_multilingual: (Optional.) If true, will return 
+        each language version of each card returned. If missing 
+        it defaults to false.
+    :param page: (Optional.) Which page of the results to return. 
+        If missing, it defaults to 1.
+    :return: :class:tuple of the Content-Type header and an 
+        iterator of the chunks of the response from Scryfall.com.
+    :rtype: tuple
+    
+    Warning::
+    
+        The PV.trust_boundary decorator alters the return type of 
+        this function to the PV.iter_httpjson function's return 
+        type. In this case it is:
+        
+        :return: A generator that yields a :class:dict for each 
+            MtG card in the page as it is parsed and validated. 
+            The generator returns the rest of the list object.
+        :rtype: generator
+    """
+    url = FQDN + '/cards/search'
+    params = {
+        'q': q,
+        'unique': unique,
+        'order': order,
+        'dir': dir,
+        'include_extras': include_extras,
+        'include_multilingual': include_multilingual,
+        'page': page,
+    }
+    params = {key: params[key] for key in params if params[key]}
+    ctype, chunks = _get_stream(url, params)
+    return ctype, chunks
+
+
+# Bulk data files.
+def download_bulk(uri: str, path: str):
+    """Download a bulk data file. If an earlier download of the 
+    file was interrupted, the download resumes where it stopped.
+    
+    :param uri: The download_uri of the bulk data file.
+    :param path: The path to save the file to. The file is written 
+        to path + '.part' until the download is complete.
+    :return: The path of the downloaded file.
+    :rtype: str
+    
+    The file is saved as it is served, so it may be compressed. 
+    Use bulk_cards() to read it. See _request() for the rate limit 
+    and retries.
+    """
+    url = BULK_FQDN + urlparse(uri).path
+    part = path + '.part'
+    offset = 0
+    if os.path.exists(part):
+        offset = os.path.getsize(part)
+    headers = {'Accept-Encoding': 'identity',}
+    if offset:
+        headers['Range'] = 'bytes={}-'.format(offset)
+    with _request('GET', url, headers=headers, stream=True) as resp:
+        if resp.status_code == 416 and offset:
+            os.replace(part, path)
+            return path
+        mode = 'wb'
+        if resp.status_code == 206:
+            mode = 'ab'
+        else:
+            _raise_for_status(resp.status_code, resp.reason)
+        with open(part, mode) as fh:
+            for chunk in resp.raw.stream(STREAM_CHUNK_SIZE, 
+                                         decode_content=False):
+                fh.write(chunk)
+    os.replace(part, path)
+    return path
+
+
+@PV.trust_boundary
+def bulk_cards(path: str):
+    """Read the cards in a downloaded bulk data file.
+    
+    :param path: The path to the bulk data file. It can be gzip 
+        compressed.
+    :return: :class:tuple of the Content-Type of the file and an 
+        iterator of the chunks of the file.
+    :rtype: tuple
+    
+    Warning::
+    
+        The PV.trust_boundary decorator alters the return type of 
+        this function to the PV.iter_httpjson function's return 
+        type. In this case it is:
+        
+        :return: A generator that yields a :class:dict for each 
+            MtG card in the file as it is parsed and validated.
+        :rtype: generator
+    """
+    return 'application/json; charset=utf-8', _read_chunks(path)
+
+
+# Paging.
+def iter_cards(page: int = 1, prefetch: bool = False, stream: bool = False, 
+               checkpoint: str = None):
+    """Iterate through the cards in the Scryfall.com database, 
+    requesting each page of results as it is needed.
+    
+    :param page: (Optional.) The results page to start from. If 
+        missing, it defaults to 1.
+    :param prefetch: (Optional.) If true, the next page is requested 
+        in a background thread while the current page is consumed. 
+        If missing, it defaults to false.
+    :param stream: (Optional.) If true, each page is parsed and 
+        validated one card at a time as it is received. This can't 
+        be used with prefetch. If missing, it defaults to false.
+    :param checkpoint: (Optional.) The path of a checkpoint file. 
+        See iter_cards_search().
+    :return: A generator that yields a :class:dict that contains 
+        the details of each MtG card.
+    :rtype: generator
+    
+    The cards are validated one page at a time by the trust 
+    boundary of cards(), so each card yielded has been validated. 
+    With stream, they are validated one card at a time by the trust 
+    boundary of cards_stream().
+    """
+    checkpoint, page = _open_checkpoint(checkpoint, 'cards', {}, page)
+    if stream:
+        return _iter_stream_pages(cards_stream, {}, page, prefetch, 
+                                  checkpoint)
+    return _iter_pages(cards, {}, page, prefetch, checkpoint)
+
+
+def iter_cards_search(q, unique=None, order=None, dir=None, 
+                      include_extras=None, include_multilingual=None, 
+                      page=1, prefetch=False, stream=False, 
+                      checkpoint=None):
+    """Iterate through the results of a search of the cards in the 
+    Scryfall.com database, requesting each page of results as it 
+    is needed.
+    
+    :param q: A fulltext search query.
+    :param unique: (Optional.) Strategy for omitting similar cards.
+    :param order: (Optional.) Sort order for the returned cards.
+    :param dir: (Optional.) The direction to sort the returned cards. 
+    :param include_extras: (Optional.) Include extra cards, like 
+        tokens, to the returned cards.
+    :param include_multilingual: (Optional.) If true, will return 
+        each language version of each card returned. If missing 
+        it defaults to false.
+    :param page: (Optional.) The results page to start from. If 
+        missing, it defaults to 1.
+    :param prefetch: (Optional.) If true, the next page is requested 
+        in a background thread while the current page is consumed. 
+        If missing, it defaults to false.
+    :param stream: (Optional.) If true, each page is parsed and 
+        validated one card at a time as it is received. This can't 
+        be used with prefetch. If missing, it defaults to false.
+    :param checkpoint: (Optional.) The path of a checkpoint file. If 
+        given, the last page finished is saved in it, and the search 
+        resumes after that page if it is restarted. The file is 
+        deleted when the search is finished.
+    :return: A generator that yields a :class:dict that contains 
+        the details of each MtG card.
+    :rtype: generator
+    
+    The cards are validated one page at a time by the trust 
+    boundary of cards_search(), so each card yielded has been 
+    validated. With prefetch, the validation of the next page 
+    also happens in the background thread. With stream, the cards 
+    are validated one at a time by the trust boundary of 
+    cards_search_stream().
+    
+    A page is finished when the card after its last card is asked 
+    for, so each card should be stored before the next one is. A 
+    restarted search repeats the page it stopped in. Use a sink that 
+    replaces cards by ID, like a store.Store, so the repeated cards 
+    aren't stored twice, or use ingest_cards_search().
+    """
+    kwargs = {
+        'q': q,
+        'unique': unique,
+        'order': order,
+        'dir': dir,
+        'include_extras': include_extras,
+        'include_multilingual': include_multilingual,
+    }
+    checkpoint, page = _open_checkpoint(checkpoint, 'cards_search', 
+                                        kwargs, page)
+    if stream:
+        return _iter_stream_pages(cards_search_stream, kwargs, page, 
+                                  prefetch, checkpoint)
+    return _iter_pages(cards_search, kwargs, page, prefetch, checkpoint)
+
+
+def ingest_cards_search(sink, q, unique=None, order=None, dir=None, 
+                        include_extras=None, include_multilingual=None, 
+                        page=1, checkpoint=None):
+    """Pass the results of a search of the cards in the Scryfall.com 
+    database into a sink one page at a time. The parameters are the 
+    same as iter_cards_search().
+    
+    :param sink: A callable that takes a list of cards.
+    :return: The number of cards passed to the sink.
+    :rtype: int
+    
+    With a checkpoint, a page is finished once the sink returns, so 
+    a restarted search resumes with the page the sink was writing 
+    when it stopped. The sink should replace cards by ID, like a 
+    store.Store or an index.CardIndex, so that page isn't written 
+    twice.
+    
+    Usage::
+        
+        db = store.Store('cards.db')
+        ingest_cards_search(db, 'set:ktk', checkpoint='ktk.checkpoint')
+        db.close()
+    """
+    kwargs = {
+        'q': q,
+        'unique': unique,
+        'order': order,
+        'dir': dir,
+        'include_extras': include_extras,
+        'include_multilingual': include_multilingual,
+    }
+    checkpoint, page = _open_checkpoint(checkpoint, 'cards_search', 
+                                        kwargs, page)
+    count = 0
+    while True:
+        cardslist = cards_search(page=page, **kwargs)
+        sink(cardslist['data'])
+        count += len(cardslist['data'])
+        if not cardslist['has_more']:
+            break
+        if checkpoint:
+            checkpoint.save(page, cardslist.get('next_page'))
+        page += 1
+    if checkpoint:
+        checkpoint.clear()
+    return count
+
+
+# Concurrent fetching.
+def iter_cards_in_sets(codes, max_workers: int = None, 
+                       order: str = 'completed', errors: dict = None):
+    """Iterate over every card in several sets, fetching the sets 
+    concurrently.
+    
+    :param codes: An iterable of set codes.
+    :param max_workers: (Optional.) See iter_cards_searches().
+    :param order: (Optional.) See iter_cards_searches().
+    :param errors: (Optional.) See iter_cards_searches().
+    :return: A generator that yields a :class:tuple of the set code 
+        and a :class:dict that contains the details of each MtG card.
+    :rtype: generator
+    """
+    queries = {code: 'set:{}'.format(code) for code in codes}
+    return iter_cards_searches(queries, max_workers, order, errors)
+
+
+def iter_cards_searches(queries, max_workers: int = None, 
+                        order: str = 'completed', errors: dict = None, 
+                        **kwargs):
+    """Iterate over every card matching each of several searches, 
+    running the searches concurrently.
+    
+    :param queries: A :class:dict of keys and the search queries 
+        for them, or an iterable of search queries, which are then 
+        their own keys.
+    :param max_workers: (Optional.) The number of searches to run 
+        at once. If missing, it defaults to FETCH_WORKERS.
+    :param order: (Optional.) The order to yield the cards in:
+        
+            completed   Each page as soon as it arrives. This is 
+                        the default.
+            grouped     All of the cards for a search together, 
+                        searches in the order they finish.
+            input       All of the cards for a search together, 
+                        searches in the order they were given.
+        
+    :param errors: (Optional.) A :class:dict. If given, the exception 
+        that stopped a search is stored in it under the search's key. 
+        If missing, the first exception is raised after the other 
+        searches finish.
+    :param kwargs: (Optional.) The other parameters for 
+        cards_search(), such as unique or order.
+    :return: A generator that yields a :class:tuple of the key of 
+        the search and a :class:dict that contains the details of 
+        each MtG card.
+    :rtype: generator
+    
+    The searches share the pooled HTTP session and the rate limiter 
+    in LIMITER, so more workers only help until the rate limit is 
+    reached. A failed search does not stop the others, though the 
+    cards it yielded before it failed are not taken back.
+    
+    Usage::
+        
+        for code, card in iter_cards_in_sets(['ktk', 'frf']):
+            print(code, card['name'])
+    """
+    if not isinstance(queries, dict):
+        queries = {q: q for q in queries}
+    if order not in _fetch_orders:
+        raise ValueError('Invalid order {}.'.format(order))
+    if max_workers is None:
+        max_workers = FETCH_WORKERS
+    return _iter_searches(queries, max_workers, order, errors, kwargs)
+
+
+def _iter_searches(queries, max_workers, order, errors, kwargs):
+    """The generator for iter_cards_searches."""
+    results = Queue()
+    stop = Event()
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        for key, q in queries.items():
+            executor.submit(_search_worker, results, stop, key, q, kwargs)
+        
+        keys = list(queries)
+        buffers = {key: [] for key in keys}
+        finished = set()
+        head = 0
+        first_error = None
+        while len(finished) < len(keys):
+            key, data, ex = results.get()
+            if data is not None:
+                if order == 'completed' or (order == 'input' 
+                                            and key == keys[head]):
+                    for card in data:
+                        yield key, card
+                else:
+                    buffers[key].extend(data)
+                continue
+            
+            # The search for key is done.
+            finished.add(key)
+            if ex is not None:
+                if errors is not None:
+                    errors[key] = ex
+                elif first_error is None:
+                    first_error = ex
+            if order == 'grouped':
+                for card in buffers.pop(key):
+                    yield key, card
+            elif order == 'input':
+                while head < len(keys) and keys[head] in finished:
+                    head += 1
+                    if head < len(keys):
+                        for card in buffers.pop(keys[head]):
+                            yield keys[head], card
+        if first_error is not None:
+            raise first_error
+    finally:
+        stop.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _search_worker(results, stop, key, q, kwargs):
+    """Page through a search, putting each page of cards on the 
+    results queue, then a done marker with any exception.
+    """
+    try:
+        page = 1
+        while not stop.is_set():
+            cardslist = cards_search(q, page=page, **kwargs)
+            results.put((key, cardslist['data'], None))
+            if not cardslist['has_more']:
+                break
+            page += 1
+    except Exception as ex:
+        results.put((key, None, ex))
+    else:
+        results.put((key, None, None))
+
+
+# The orders for iter_cards_searches.
+_fetch_orders = ('completed', 'grouped', 'input')
+
+
+# Collections.
+def cards_collection(identifiers, max_workers: int = None):
+    """Get the cards for any number of identifiers. The identifiers 
+    are sent in chunks of COLLECTION_SIZE, so each request looks up 
+    many cards.
+    
+    :param identifiers: An iterable of card identifiers. See 
+        cards_collection_chunk().
+    :param max_workers: (Optional.) The number of chunks to request 
+        at once. If missing, it defaults to FETCH_WORKERS.
+    :return: A :class:dict with a data key that holds the cards found 
+        and a not_found key that holds the identifiers that were not 
+        found, each in the order of the identifiers.
+    :rtype: dict
+    
+    The requests share the pooled HTTP session and the rate limiter 
+    in LIMITER. If a request fails, its exception is raised.
+    
+    Usage::
+        
+        result = cards_collection([
+            {'id': '0900e494-962d-48c6-8e78-66a489be4bb2'},
+            {'set': 'ktk', 'collector_number': '159'},
+            {'name': 'Noble Hierarch'},
+        ])
+        for card in result['data']:
+            print(card['name'])
+    """
+    identifiers = list(identifiers)
+    size = COLLECTION_SIZE
+    chunks = [identifiers[i:i + size] 
+              for i in range(0, len(identifiers), size)]
+    if max_workers is None:
+        max_workers = FETCH_WORKERS
+    result = {'object': 'list', 'not_found': [], 'data': []}
+    if not chunks:
+        return result
+    
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(chunks)))
+    try:
+        for collection in executor.map(cards_collection_chunk, chunks):
+            result['data'].extend(collection['data'])
+            result['not_found'].extend(collection['not_found'])
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    return result
+
+
+# HTTP session management.
+_session = None
+_session_lock = Lock()
+
+
+def close():
+    """Close the pooled HTTP session used to talk to Scryfall.com.
+    
+    Any idle keep-alive connections are closed. The next API call 
+    opens a new session using the current values of POOL_CONNECTIONS, 
+    POOL_MAXSIZE, and POOL_BLOCK, so this is also how to apply changes 
+    to those settings.
+    
+    :return: None.
+    :rtype: NoneType
+    """
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
 
 
 # Private functions.
+def _open_checkpoint(path, name, kwargs, page):
+    """Open the checkpoint for a paged API call if there is a path. 
+    Returns the checkpoint and the page to start from, which is the 
+    page after the checkpoint if it has one.
+    """
+    if path is None:
+        return None, page
+    checkpoint = Checkpoint(path, fingerprint(name, kwargs))
+    done = checkpoint.load()
+    if done:
+        page = done + 1
+    return checkpoint, page
+
+
+def _iter_pages(fn, kwargs, page, prefetch=False, checkpoint=None):
+    """Yield the items in each page returned by a paged API call 
+    until there are no more pages. If prefetch is true, the request 
+    for the next page is made while the current page is yielded. If 
+    there is a checkpoint, each page is saved in it once its items 
+    have been yielded.
+    """
+    executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+    try:
+        pending = _fetch_page(executor, fn, kwargs, page)
+        while True:
+            cardslist = pending()
+            has_more = cardslist['has_more']
+            if has_more:
+                page += 1
+                pending = _fetch_page(executor, fn, kwargs, page)
+            yield from cardslist['data']
+            if not has_more:
+                break
+            if checkpoint:
+                checkpoint.save(page - 1, cardslist.get('next_page'))
+        if checkpoint:
+            checkpoint.clear()
+    finally:
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _iter_stream_pages(fn, kwargs, page, prefetch=False, checkpoint=None):
+    """Yield the items in each page returned by a streaming paged 
+    API call until there are no more pages.
+    """
+    if prefetch:
+        raise ValueError('Streamed pages cannot be prefetched.')
+    return _iter_streams(fn, kwargs, page, checkpoint)
+
+
+def _iter_streams(fn, kwargs, page, checkpoint=None):
+    """The generator for _iter_stream_pages."""
+    while True:
+        cardslist = yield from fn(page=page, **kwargs)
+        if not cardslist['has_more']:
+            break
+        if checkpoint:
+            checkpoint.save(page, cardslist.get('next_page'))
+        page += 1
+    if checkpoint:
+        checkpoint.clear()
+
+
+def _fetch_page(executor, fn, kwargs, page):
+    """Request a page from a paged API call. If there is an 
+    executor, the request is made in the background. Returns a 
+    callable that returns the page.
+    """
+    def fetch():
+        return fn(page=page, **kwargs)
+    
+    if executor is None:
+        return fetch
+    return executor.submit(fetch).result
+
+
+def _read_chunks(path):
+    """Yield the chunks of a file, decompressing it if it is gzip 
+    compressed.
+    """
+    with open(path, 'rb') as fh:
+        if fh.read(2) == b'\x1f\x8b':
+            fh.seek(0)
+            fh = gzip.open(fh)
+        else:
+            fh.seek(0)
+        with fh:
+            chunk = fh.read(STREAM_CHUNK_SIZE)
+            while chunk:
+                yield chunk
+                chunk = fh.read(STREAM_CHUNK_SIZE)
+
+
+def _get_session():
+    """Get the pooled HTTP session, creating it if needed."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=POOL_CONNECTIONS,
+                pool_maxsize=POOL_MAXSIZE,
+                pool_block=POOL_BLOCK
+            )
+            session = requests.Session()
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _session = session
+        return _session
+
+
 def _get(url: str, params: dict = {}):
-    """Make the HTTP request and handle error responses."""
-    resp = requests.get(url, params)
-    if resp.status_code != 200:
-        msg = '{}: {}'.format(resp.status_code, resp.reason)
-        if resp.status_code >= 600:
+    """Make the HTTP request and handle error responses. See 
+    _request() for the rate limit and retries. If CACHE is set, 
+    fresh cached responses are used without a request, and stale 
+    ones are revalidated with a conditional request.
+    
+    :return: The Content-Type header and the content of the response.
+    :rtype: tuple
+    """
+    entry = CACHE.get(url, params) if CACHE else None
+    if entry and entry.fresh:
+        return entry.ctype, entry.content
+    headers = {}
+    if entry and entry.etag:
+        headers['If-None-Match'] = entry.etag
+    if entry and entry.last_modified:
+        headers['If-Modified-Since'] = entry.last_modified
+    
+    resp = _request('GET', url, params=params, headers=headers)
+    if resp.status_code == 304 and entry:
+        CACHE.refresh(url, params)
+        return entry.ctype, entry.content
+    _raise_for_status(resp.status_code, resp.reason)
+    
+    ctype = resp.headers['Content-Type']
+    if CACHE:
+        etag = resp.headers.get('ETag')
+        last_modified = resp.headers.get('Last-Modified')
+        CACHE.put(url, params, ctype, resp.content, etag, last_modified)
+    return ctype, resp.content
+
+
+def _post(url: str, data):
+    """Make an HTTP POST request with a JSON body and handle error 
+    responses. See _request() for the rate limit and retries. POST 
+    responses are not cached.
+    
+    :return: The Content-Type header and the content of the response.
+    :rtype: tuple
+    """
+    resp = _request('POST', url, json=data)
+    _raise_for_status(resp.status_code, resp.reason)
+    return resp.headers['Content-Type'], resp.content
+
+
+def _get_stream(url: str, params: dict = {}):
+    """Make a streaming HTTP request and handle error responses. See 
+    _request() for the rate limit and retries. Streamed responses 
+    are not cached.
+    
+    :return: The Content-Type header of the response and a generator 
+        of the chunks of its content. The response is closed when 
+        the generator finishes.
+    :rtype: tuple
+    """
+    resp = _request('GET', url, params=params, stream=True)
+    try:
+        _raise_for_status(resp.status_code, resp.reason)
+    except Exception:
+        resp.close()
+        raise
+    
+    def chunks():
+        with resp:
+            yield from resp.iter_content(STREAM_CHUNK_SIZE)
+    return resp.headers['Content-Type'], chunks()
+
+
+def _request(method: str, url: str, **kwargs):
+    """Send an HTTP request with the pooled session. If LIMITER is 
+    set, each try waits until the rate limit allows it. If RETRY is 
+    set, failed requests it allows are retried after its delay.
+    
+    :return: The last response.
+    :rtype: requests.Response
+    """
+    if RETRY:
+        RETRY.record_request()
+    attempt = 0
+    while True:
+        if LIMITER:
+            LIMITER.acquire()
+        resp = _get_session().request(method, url, **kwargs)
+        attempt += 1
+        if not RETRY or resp.status_code < 400:
+            return resp
+        wait = RETRY.delay(attempt, resp.status_code, 
+                           resp.headers.get('Retry-After'))
+        if wait is None:
+            return resp
+        resp.close()
+        sleep(wait)
+
+
+def _raise_for_status(status: int, reason: str):
+    """Raise the exception for an error response."""
+    if status != 200:
+        msg = '{}: {}'.format(status, reason)
+        if status >= 600:
             raise HTTPUnknownError(msg)
-        elif resp.status_code >= 500:
+        elif status >= 500:
             raise HTTPServerError(msg)
-        elif resp.status_code >= 400:
+        elif status >= 400:
             raise HTTPClientError(msg)
-        elif resp.status_code >= 300:
+        elif status >= 300:
             raise HTTPRedirectError(msg)
         else:
             raise HTTPUnknownError(msg)
-    return resp
-
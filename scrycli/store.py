@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+"""
+store
+~~~~~
+
+A local store for the cards and sets scrycli gets from Scryfall.com.
+Validated card and set objects are upserted into a SQLite database
+in batched transactions, so later lookups don't need the network.
+
+Only pass objects that have been through a trust boundary into the
+store. The store does not validate them again.
+
+:copyright: © 2018 Paul J. Iutzi
+:license: MIT, see LICENSE for more details.
+"""
+from json import dumps
+import sqlite3
+from threading import Lock
+
+from scrycli.pyvalidate.normalize import from_json
+
+# Exception messages.
+msg = {
+    'column': 'Cannot look up cards by {}.',
+}
+
+# The columns of the stored objects, in table order. Each is paired
+# with the key of its value in the Scryfall.com object. The full
+# object is also stored as JSON in the data column.
+card_columns = (
+    ('id', 'id'),
+    ('oracle_id', 'oracle_id'),
+    ('name', 'name'),
+    ('set_code', 'set'),
+    ('collector_number', 'collector_number'),
+    ('lang', 'lang'),
+    ('layout', 'layout'),
+    ('rarity', 'rarity'),
+    ('cmc', 'cmc'),
+    ('mana_cost', 'mana_cost'),
+    ('type_line', 'type_line'),
+    ('oracle_text', 'oracle_text'),
+    ('colors', 'colors'),
+    ('color_identity', 'color_identity'),
+    ('power', 'power'),
+    ('toughness', 'toughness'),
+    ('loyalty', 'loyalty'),
+    ('artist', 'artist'),
+    ('released_at', 'released_at'),
+)
+# The keys that multi-faced cards only have on their faces. If the
+# card doesn't have the key, the column gets the values of its faces.
+face_keys = ('oracle_text',)
+set_columns = (
+    ('id', 'id'),
+    ('code', 'code'),
+    ('name', 'name'),
+    ('set_type', 'set_type'),
+    ('released_at', 'released_at'),
+    ('card_count', 'card_count'),
+    ('parent_set_code', 'parent_set_code'),
+    ('digital', 'digital'),
+)
+
+# The database schema for the store.
+schema = '''
+CREATE TABLE IF NOT EXISTS cards (
+    id TEXT PRIMARY KEY,
+    oracle_id TEXT,
+    name TEXT NOT NULL,
+    set_code TEXT NOT NULL,
+    collector_number TEXT NOT NULL,
+    lang TEXT,
+    layout TEXT,
+    rarity TEXT,
+    cmc REAL,
+    mana_cost TEXT,
+    type_line TEXT,
+    oracle_text TEXT,
+    colors TEXT,
+    color_identity TEXT,
+    power TEXT,
+    toughness TEXT,
+    loyalty TEXT,
+    artist TEXT,
+    released_at TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cards_set_number
+    ON cards (set_code, collector_number, lang);
+CREATE INDEX IF NOT EXISTS cards_number ON cards (collector_number);
+CREATE INDEX IF NOT EXISTS cards_name ON cards (name);
+CREATE INDEX IF NOT EXISTS cards_oracle_id ON cards (oracle_id);
+CREATE TABLE IF NOT EXISTS sets (
+    id TEXT PRIMARY KEY,
+    code TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    set_type TEXT,
+    released_at TEXT,
+    card_count INTEGER,
+    parent_set_code TEXT,
+    digital INTEGER,
+    data TEXT NOT NULL
+);
+'''
+
+
+def _upsert(table, columns):
+    """Build the upsert statement for a table."""
+    names = [column for column, _ in columns] + ['data',]
+    updates = ['{0} = excluded.{0}'.format(name) for name in names[1:]]
+    sql = ('INSERT INTO {} ({}) VALUES ({}) '
+           'ON CONFLICT (id) DO UPDATE SET {}')
+    return sql.format(
+        table,
+        ', '.join(names),
+        ', '.join('?' * len(names)),
+        ', '.join(updates)
+    )
+
+
+# The upsert statements. They are built once, so sqlite3 reuses
+# the prepared statement for every row and every batch.
+card_upsert = _upsert('cards', card_columns)
+set_upsert = _upsert('sets', set_columns)
+
+# The columns cards can be looked up by.
+card_lookups = (
+    'id', 'oracle_id', 'name', 'set_code', 'collector_number', 'lang',
+)
+
+
+class Store:
+    """A SQLite store of MtG cards and sets.
+    
+    :param path: The path to the store's database file.
+    
+    File databases are opened in write-ahead log (WAL) mode, so
+    lookups can run while a batch is being written. A Store can be
+    used as a sink for bulk.ingest(), since calling it upserts a
+    batch of cards.
+    
+    Usage::
+        
+        >>> store = Store(':memory:')
+        >>> store.put_sets([{
+        ...     'id': '97a7fd84-8d89-45a3-b48b-c951f6a3f9f1',
+        ...     'code': 'rna',
+        ...     'name': 'Ravnica Allegiance',
+        ... }])
+        1
+        >>> store.get_set('rna')['name']
+        'Ravnica Allegiance'
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode = WAL')
+        self._conn.execute('PRAGMA synchronous = NORMAL')
+        self._conn.executescript(schema)
+    
+    def __call__(self, cards):
+        """Upsert a batch of cards. See put_cards()."""
+        return self.put_cards(cards)
+    
+    def put_cards(self, cards):
+        """Insert cards into the store, replacing the stored version
+        of any card already in it.
+        
+        :param cards: An iterable of validated card :class:dict
+            objects.
+        :return: The number of cards stored.
+        :rtype: int
+        """
+        rows = [_row(card, card_columns) for card in cards]
+        with self._lock, self._conn:
+            self._conn.executemany(card_upsert, rows)
+        return len(rows)
+    
+    def put_sets(self, sets):
+        """Insert sets into the store, replacing the stored version
+        of any set already in it.
+        
+        :param sets: An iterable of validated set :class:dict
+            objects.
+        :return: The number of sets stored.
+        :rtype: int
+        """
+        rows = [_row(set, set_columns) for set in sets]
+        with self._lock, self._conn:
+            self._conn.executemany(set_upsert, rows)
+        return len(rows)
+    
+    def get_card(self, id: str):
+        """Get a card from the store.
+        
+        :param id: The Scryfall.com ID of the card.
+        :return: The card, or None if it is not in the store.
+        :rtype: dict
+        """
+        cards = self.find_cards(id=id)
+        if not cards:
+            return None
+        return cards[0]
+    
+    def get_set(self, code: str):
+        """Get a set from the store.
+        
+        :param code: The set code of the set.
+        :return: The set, or None if it is not in the store.
+        :rtype: dict
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT data FROM sets WHERE code = ?', (code,)
+            ).fetchone()
+        if row is None:
+            return None
+        return from_json(row[0])
+    
+    def find_cards(self, **kwargs):
+        """Get the cards in the store that match the given column
+        values.
+        
+        :param id: (Optional.) The Scryfall.com ID of the card.
+        :param oracle_id: (Optional.) The Oracle ID of the card.
+        :param name: (Optional.) The name of the card.
+        :param set_code: (Optional.) The code of the card's set.
+        :param collector_number: (Optional.) The collector number
+            of the card.
+        :param lang: (Optional.) The language of the card's print.
+        :return: A :class:list of the matching cards, ordered by set
+            code and collector number.
+        :rtype: list
+        """
+        for key in kwargs:
+            if key not in card_lookups:
+                raise ValueError(msg['column'].format(key))
+        where = ' AND '.join('{} = ?'.format(key) for key in kwargs)
+        sql = 'SELECT data FROM cards'
+        if where:
+            sql += ' WHERE ' + where
+        sql += ' ORDER BY set_code, collector_number'
+        with self._lock:
+            cur = self._conn.execute(sql, tuple(kwargs.values()))
+            rows = cur.fetchall()
+        return [from_json(row[0]) for row in rows]
+    
+    def count_cards(self):
+        """The number of cards in the store.
+        
+        :return: The number of cards.
+        :rtype: int
+        """
+        with self._lock:
+            row = self._conn.execute('SELECT COUNT(*) FROM cards').fetchone()
+        return row[0]
+    
+    def fetchall(self, sql: str, params=()):
+        """Run a read-only query against the store.
+        
+        :param sql: The SQL of the query.
+        :param params: (Optional.) The values for the placeholders 
+            in the query.
+        :return: A :class:list of the result rows.
+        :rtype: list
+        """
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+    
+    def close(self):
+        """Close the store's database.
+        
+        :return: None.
+        :rtype: NoneType
+        """
+        with self._lock:
+            self._conn.close()
+
+
+def _row(obj, columns):
+    """Build the row for an object."""
+    row = []
+    for _, key in columns:
+        value = obj.get(key)
+        if value is None and key in face_keys:
+            value = _faces(obj, key)
+        if isinstance(value, list):
+            value = ''.join(value)
+        row.append(value)
+    row.append(dumps(obj, ensure_ascii=False, separators=(',', ':')))
+    return row
+
+
+def _faces(obj, key):
+    """Join the values of a key from the faces of a card."""
+    values = [face[key] for face in obj.get('card_faces', ())
+              if face.get(key) is not None]
+    if not values:
+        return None
+    return '\n'.join(values)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,330 @@
+# -*- coding: utf-8 -*-
+"""
+table
+~~~~~
+
+A columnar table of cards for analytics over a whole card pool. It
+needs NumPy, which is an optional dependency of scrycli.
+
+The columns are NumPy arrays:
+
+    Numeric     cmc, usd, eur, and tix as float64, with NaN for
+                missing prices, and released_at as datetime64[D].
+    Categories  rarity, layout, border_color, frame, lang, and set
+                as int16 codes into the lists in the categories
+                attribute. The lists start with the values in
+                config.vals.
+    Bitmasks    colors and color_identity as uint8, with a bit for
+                each color in config.vals['color']. legal,
+                restricted, and banned as uint32, with a bit for
+                each format in config.cvals['sf_legalities'].
+    Objects     id, name, and collector_number.
+
+:copyright: © 2018 Paul J. Iutzi
+:license: MIT, see LICENSE for more details.
+"""
+from scrycli import config
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# Exception messages.
+msg = {
+    'column': 'CardTable has no column {}.',
+    'format': 'Unknown format {}.',
+    'group': 'Cannot group by {}.',
+    'numpy': 'CardTable requires NumPy.',
+}
+
+# The category columns and the config.vals enums they start with.
+category_fields = {
+    'rarity': 'rarity',
+    'layout': 'layout',
+    'border_color': 'border',
+    'frame': 'frame',
+    'lang': 'lang',
+    'set': None,
+}
+
+# The numeric columns.
+price_fields = ('usd', 'eur', 'tix')
+
+# The bits of the bitmask columns.
+colors = tuple(config.vals['color']['enum'])
+formats = tuple(config.cvals['sf_legalities']['valkwargs']['req'])
+
+
+class CardTable:
+    """A columnar table of validated cards.
+    
+    :param cards: An iterable of validated card :class:dict objects,
+        such as the results of scrycli.iter_cards_search() or
+        scrycli.bulk_cards().
+    
+    Usage::
+        
+        >>> table = CardTable([
+        ...     {'id': 'a', 'name': 'Spam', 'set': 'ktk', 'cmc': 2.0,
+        ...      'rarity': 'rare', 'colors': ['G'], 'usd': '1.50'},
+        ...     {'id': 'b', 'name': 'Eggs', 'set': 'ktk', 'cmc': 3.0,
+        ...      'rarity': 'common', 'colors': ['W', 'G']},
+        ... ])
+        >>> table.count_by('rarity')
+        {'common': 1, 'rare': 1}
+        >>> table.filter(table.color_mask('G', exact=True)).name.tolist()
+        ['Spam']
+    """
+    def __init__(self, cards=()):
+        if np is None:
+            raise ImportError(msg['numpy'])
+        self.categories = {}
+        lookups = {}
+        for field, enum in category_fields.items():
+            values = []
+            if enum:
+                values = list(config.vals[enum]['enum'])
+            self.categories[field] = values
+            lookups[field] = {value: i for i, value in enumerate(values)}
+        
+        columns = {
+            'id': [], 'name': [], 'collector_number': [], 'cmc': [],
+            'released_at': [], 'colors': [], 'color_identity': [],
+            'legal': [], 'restricted': [], 'banned': [],
+        }
+        for field in price_fields:
+            columns[field] = []
+        for field in category_fields:
+            columns[field] = []
+        
+        for card in cards:
+            columns['id'].append(card['id'])
+            columns['name'].append(card['name'])
+            columns['collector_number'].append(card.get('collector_number'))
+            columns['cmc'].append(card.get('cmc', np.nan))
+            columns['released_at'].append(card.get('released_at', 'NaT'))
+            prices = card.get('prices', card)
+            for field in price_fields:
+                price = prices.get(field)
+                columns[field].append(np.nan if price is None else price)
+            for field in category_fields:
+                columns[field].append(_code(
+                    card.get(field),
+                    lookups[field],
+                    self.categories[field]
+                ))
+            columns['colors'].append(_color_bits(card.get('colors', ())))
+            columns['color_identity'].append(
+                _color_bits(card.get('color_identity', ()))
+            )
+            legalities = card.get('legalities', {})
+            for column, status in (('legal', 'legal'),
+                                   ('restricted', 'restricted'),
+                                   ('banned', 'banned')):
+                columns[column].append(_format_bits(legalities, status))
+        
+        self.id = np.array(columns['id'], dtype=object)
+        self.name = np.array(columns['name'], dtype=object)
+        self.collector_number = np.array(columns['collector_number'],
+                                         dtype=object)
+        self.cmc = np.array(columns['cmc'], dtype=np.float64)
+        self.released_at = np.array(columns['released_at'],
+                                    dtype='datetime64[D]')
+        for field in price_fields:
+            setattr(self, field, np.array(columns[field],
+                                          dtype=np.float64))
+        for field in category_fields:
+            setattr(self, field, np.array(columns[field], dtype=np.int16))
+        self.colors = np.array(columns['colors'], dtype=np.uint8)
+        self.color_identity = np.array(columns['color_identity'],
+                                       dtype=np.uint8)
+        for column in ('legal', 'restricted', 'banned'):
+            setattr(self, column, np.array(columns[column],
+                                           dtype=np.uint32))
+    
+    def __len__(self):
+        return len(self.id)
+    
+    def columns(self):
+        """The names of the columns of the table.
+        
+        :return: The column names.
+        :rtype: tuple
+        """
+        return (
+            ('id', 'name', 'collector_number', 'cmc', 'released_at')
+            + price_fields
+            + tuple(category_fields)
+            + ('colors', 'color_identity', 'legal', 'restricted', 'banned')
+        )
+    
+    def filter(self, mask):
+        """Get the rows of the table selected by a mask.
+        
+        :param mask: A boolean array, or an array of row indexes.
+        :return: A new table with the selected rows. It shares the
+            category lists of this table.
+        :rtype: CardTable
+        """
+        table = CardTable.__new__(CardTable)
+        table.categories = self.categories
+        for column in self.columns():
+            setattr(table, column, getattr(self, column)[mask])
+        return table
+    
+    def category_mask(self, field: str, *values):
+        """Get a mask of the rows with one of the given values in a
+        category column.
+        
+        :param field: The name of the category column.
+        :param values: The values to match.
+        :return: A boolean array.
+        :rtype: numpy.ndarray
+        """
+        if field not in category_fields:
+            raise ValueError(msg['column'].format(field))
+        categories = self.categories[field]
+        codes = [categories.index(value) for value in values
+                 if value in categories]
+        return np.isin(getattr(self, field), codes)
+    
+    def color_mask(self, colors: str, field: str = 'colors',
+                   exact: bool = False):
+        """Get a mask of the rows that have the given colors.
+        
+        :param colors: The color symbols, such as 'WU'. An empty
+            string matches colorless cards.
+        :param field: (Optional.) The color column, 'colors' or
+            'color_identity'. This defaults to 'colors'.
+        :param exact: (Optional.) Whether the row must have only the
+            given colors. If false, it must have at least them.
+        :return: A boolean array.
+        :rtype: numpy.ndarray
+        """
+        if field not in ('colors', 'color_identity'):
+            raise ValueError(msg['column'].format(field))
+        bits = _color_bits(colors)
+        column = getattr(self, field)
+        if exact or not bits:
+            return column == bits
+        return (column & bits) == bits
+    
+    def legal_mask(self, format: str, status: str = 'legal'):
+        """Get a mask of the rows with the given legality in a
+        format.
+        
+        :param format: The format, such as 'modern'.
+        :param status: (Optional.) 'legal', 'restricted', or
+            'banned'. This defaults to 'legal'.
+        :return: A boolean array.
+        :rtype: numpy.ndarray
+        """
+        if format not in formats:
+            raise ValueError(msg['format'].format(format))
+        if status not in ('legal', 'restricted', 'banned'):
+            raise ValueError(msg['column'].format(status))
+        bit = np.uint32(1 << formats.index(format))
+        return (getattr(self, status) & bit) != 0
+    
+    def count_by(self, field: str):
+        """Count the rows for each value of a column.
+        
+        :param field: A category column, a color column, cmc, or
+            released_at.
+        :return: A :class:dict of each value that has rows and its
+            count.
+        :rtype: dict
+        """
+        return self.sum_by(field)
+    
+    def sum_by(self, field: str, value: str = None):
+        """Sum a numeric column for each value of another column.
+        Missing values count as zero.
+        
+        :param field: The column to group by. See count_by().
+        :param value: (Optional.) The numeric column to sum. If
+            missing, the rows are counted.
+        :return: A :class:dict of each group value and its sum.
+        :rtype: dict
+        """
+        weights = None
+        if value is not None:
+            if value not in ('cmc',) + price_fields:
+                raise ValueError(msg['column'].format(value))
+            weights = np.nan_to_num(getattr(self, value))
+        
+        if field in category_fields:
+            labels = self.categories[field]
+            codes = getattr(self, field)
+            known = codes >= 0
+            if weights is not None:
+                weights = weights[known]
+            groups = _group(codes[known], weights, len(labels))
+            return {labels[i]: total for i, total in groups}
+        if field in ('colors', 'color_identity'):
+            bits = getattr(self, field)
+            groups = _group(bits, weights, 2 ** len(colors))
+            return {_color_string(i): total for i, total in groups}
+        if field in ('cmc', 'released_at'):
+            keys, inverse = np.unique(getattr(self, field), 
+                                      return_inverse=True)
+            groups = _group(inverse, weights, len(keys))
+            return {keys[i].item(): total for i, total in groups}
+        raise ValueError(msg['group'].format(field))
+
+
+def _code(value, lookup, categories):
+    """Get the category code of a value, adding new values to the
+    categories. Missing values are -1.
+    """
+    if value is None:
+        return -1
+    code = lookup.get(value)
+    if code is None:
+        code = len(categories)
+        categories.append(value)
+        lookup[value] = code
+    return code
+
+
+def _color_bits(symbols):
+    """Get the bitmask for a list of color symbols."""
+    bits = 0
+    for symbol in symbols:
+        bits |= 1 << colors.index(symbol)
+    return bits
+
+
+def _color_string(bits):
+    """Get the color symbols for a bitmask."""
+    return ''.join(color for i, color in enumerate(colors)
+                   if bits & 1 << i)
+
+
+def _format_bits(legalities, status):
+    """Get the bitmask of the formats with a legality."""
+    bits = 0
+    for i, format in enumerate(formats):
+        if legalities.get(format) == status:
+            bits |= 1 << i
+    return bits
+
+
+def _group(keys, weights, size):
+    """Count the rows for each key, or sum their weights. Yields each 
+    key that has rows with its count or sum.
+    """
+    counts = np.bincount(keys, minlength=size)
+    if weights is None:
+        totals = counts
+    else:
+        totals = np.bincount(keys, weights, minlength=size)
+    for i in np.flatnonzero(counts):
+        yield i, totals[i].item()
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -5,7 +5,8 @@ utility
 
 General utilities used for scrycli.
 """
-from scrycli.pyvalidate.pyvalidate import isvalidseq
+from scrycli.pyvalidate.pyvalidate import (compile_validator, compilers, 
+                                           isvalidseq)
 
 
 def build_query(cardset=None):
@@ -50,3 +51,18 @@ def ismanacostlist(s, name, val, valkwargs):
     mc = parse_manacost(s)
     return isvalidseq(mc, name, val, valkwargs)
 
+
+def _compile_ismanacostlist(val, valkwargs={}):
+    """Compile ismanacostlist for pyvalidate.compile_validator."""
+    validate_list = compile_validator(isvalidseq, {
+        'val': val,
+        'valkwargs': valkwargs,
+    })
+    
+    def validate(s, name):
+        mc = parse_manacost(s)
+        return validate_list(mc, name)
+    return validate
+
+
+compilers[ismanacostlist] = _compile_ismanacostlist
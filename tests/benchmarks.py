@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+benchmarks
+~~~~~~~~~~
+
+Benchmarks for the validation of Scryfall.com data. These report 
+the cost per validated field of the interpreted validators and of 
+the compiled validators trust_boundary uses, run against the card 
+page served by scryfake.
+
+Run from module root with:
+python3 -m tests.benchmarks
+"""
+from collections.abc import Mapping
+from json import loads
+from re import compile as re_compile
+from timeit import repeat
+
+from tests import scryfake
+from scrycli import config
+from scrycli.pyvalidate import pyvalidate as PV
+
+
+# Global configuration settings.
+NUMBER = 50
+REPEAT = 5
+
+
+def count_fields(item):
+    """Count the values validated in a decoded JSON object."""
+    if isinstance(item, Mapping):
+        return 1 + sum(count_fields(item[key]) for key in item)
+    if isinstance(item, list):
+        return 1 + sum(count_fields(value) for value in item)
+    return 1
+
+
+def best(fn, number=NUMBER):
+    """Return the best time in seconds for one call of fn."""
+    return min(repeat(fn, number=number, repeat=REPEAT)) / number
+
+
+def report(label, seconds, fields):
+    """Print the time per call and per field for a benchmark."""
+    fmt = '{:<40}{:>12.1f} us/call{:>10.0f} ns/field'
+    print(fmt.format(label, seconds * 1e6, seconds * 1e9 / fields))
+
+
+def bench_page():
+    """Compare validating a page of cards with the interpreted and 
+    the compiled validators.
+    """
+    page = loads(scryfake.resp['cards_search'], strict=False)
+    spec = config.cvals['sf_cardlist']
+    val = spec['val']
+    valkwargs = spec['valkwargs']
+    compiled = PV.compile_validator(val, valkwargs)
+    fields = count_fields(page)
+    
+    print('Card page: {} cards, {} fields'.format(len(page['data']), fields))
+    before = best(lambda: val(page, 'cards_search', **valkwargs))
+    after = best(lambda: compiled(page, 'cards_search'))
+    report('interpreted isvalidmap', before, fields)
+    report('compiled', after, fields)
+    print('Speedup: {:.2f}x'.format(before / after))
+
+
+def bench_isvalid():
+    """Compare single isvalid checks with raw and prepared specs."""
+    number = 20000
+    manacost = config.vals['manacost']
+    date = config.vals['date']
+    prepared_manacost = dict(manacost, enum=frozenset(manacost['enum']))
+    prepared_date = dict(date, pattern=re_compile(date['pattern']))
+    cases = [
+        ('isvalid enum list', lambda: PV.isvalid('{S}', 'x', **manacost)),
+        ('isvalid enum frozenset', 
+         lambda: PV.isvalid('{S}', 'x', **prepared_manacost)),
+        ('isvalid pattern str', 
+         lambda: PV.isvalid('2019-01-25', 'x', **date)),
+        ('isvalid pattern compiled', 
+         lambda: PV.isvalid('2019-01-25', 'x', **prepared_date)),
+        ('isvalid type only', 
+         lambda: PV.isvalid('spam', 'x', **config.vals['text'])),
+    ]
+    print()
+    print('Single fields:')
+    for label, fn in cases:
+        report(label, best(fn, number), 1)
+
+
+if __name__ == '__main__':
+    bench_page()
+    bench_isvalid()
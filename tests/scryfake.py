@@ -5,6 +5,8 @@ scryfake
 
 A dummy version of Scryfall.com for use in unit tests.
 """
+from json import dumps, loads
+
 from flask import Flask, request
 
 # Create the web application.
@@ -938,6 +940,49 @@ resp = {
     }'''.encode('utf_8'),
 }
 
+# The last page of paged responses. Requesting page 2 of a paged 
+# endpoint returns these.
+resp['cards_last'] = resp['cards'].replace(b'"has_more": true', 
+                                           b'"has_more": false')
+resp['cards_search_last'] = resp['cards_search'].replace(
+    b'"has_more": true', 
+    b'"has_more": false'
+)
+
+resp['bulk_data'] = b'''{
+  "object": "list",
+  "has_more": false,
+  "data": [
+    {
+      "object": "bulk_data",
+      "id": "e2ef41e3-5778-4bc2-af3f-78eca4dd9c23",
+      "type": "default_cards",
+      "updated_at": "2019-03-01T10:00:00.000+00:00",
+      "uri": "https://api.scryfall.com/bulk-data/e2ef41e3-5778-4bc2-af3f-78eca4dd9c23",
+      "name": "Default Cards",
+      "description": "A JSON file containing every card object on Scryfall in English or the printed language if the card is only available in one language.",
+      "size": 1024,
+      "download_uri": "https://data.scryfall.io/default-cards/default-cards-20190301100000.json",
+      "content_type": "application/json",
+      "content_encoding": "gzip"
+    }
+  ]
+}'''
+# The bulk data file is a JSON array of cards.
+resp['bulk_cards'] = dumps(
+    loads(resp['cards'], strict=False)['data'], 
+    indent=2
+).encode('utf_8')
+
+# The cards that can be looked up in the card collection.
+collection = (loads(resp['cards'], strict=False)['data'] 
+              + loads(resp['cards_search'], strict=False)['data'])
+
+# The error statuses for /sets/flaky and the bulk data files to 
+# return before they succeed. Tests put the statuses here, and each 
+# request takes the first one.
+flaky = []
+
 
 def shutdown_server():
     """Shutdown the server."""
@@ -957,7 +1002,24 @@ def sets():
 @app.route('/sets/mmq', methods=['GET',])
 def sets_code():
     """Return dummy set details."""
+    head = {
+        'Content-Type': 'application/json; charset=utf-8',
+        'ETag': '"mmq"',
+    }
+    if request.headers.get('If-None-Match') == head['ETag']:
+        return ('', 304, head)
+    return (resp['sets_code'], head)
+
+
+@app.route('/sets/flaky', methods=['GET',])
+def sets_flaky():
+    """Return the statuses in flaky, then dummy set details."""
     head = {'Content-Type': 'application/json; charset=utf-8',}
+    if flaky:
+        status = flaky.pop(0)
+        if status == 429:
+            head['Retry-After'] = '0'
+        return ('{"object": "error"}', status, head)
     return (resp['sets_code'], head)
 
 
@@ -965,6 +1027,8 @@ def sets_code():
 def cards():
     """Return a dummy cards list."""
     head = {'Content-Type': 'application/json; charset=utf-8',}
+    if request.args.get('page') == '2':
+        return (resp['cards_last'], head)
     return (resp['cards'], head)
 
 
@@ -972,9 +1036,66 @@ def cards():
 def cards_search():
     """Return a dummy cards list."""
     head = {'Content-Type': 'application/json; charset=utf-8',}
+    if request.args.get('page') == '2':
+        return (resp['cards_search_last'], head)
     return (resp['cards_search'], head)
 
 
+@app.route('/cards/collection', methods=['POST',])
+def cards_collection():
+    """Return the dummy cards that match the posted identifiers."""
+    head = {'Content-Type': 'application/json; charset=utf-8',}
+    identifiers = request.get_json()['identifiers']
+    if len(identifiers) > 75:
+        return ('{"object": "error", "status": 422}', 422, head)
+    found = []
+    not_found = []
+    for identifier in identifiers:
+        for card in collection:
+            if all(card.get(key) == identifier[key] for key in identifier):
+                found.append(card)
+                break
+        else:
+            not_found.append(identifier)
+    content = {
+        'object': 'list',
+        'not_found': not_found,
+        'data': found,
+    }
+    return (dumps(content), head)
+
+
+@app.route('/bulk-data', methods=['GET',])
+def bulk_data():
+    """Return a dummy bulk data list."""
+    head = {'Content-Type': 'application/json; charset=utf-8',}
+    return (resp['bulk_data'], head)
+
+
+@app.route('/default-cards/<filename>', methods=['GET',])
+def bulk_cards(filename):
+    """Return a dummy bulk data file, or the requested part of it."""
+    head = {
+        'Content-Type': 'application/json',
+        'Accept-Ranges': 'bytes',
+    }
+    if flaky:
+        return ('', flaky.pop(0), head)
+    content = resp['bulk_cards']
+    range_ = request.headers.get('Range')
+    if range_:
+        start = int(range_[len('bytes='):].rstrip('-'))
+        if start >= len(content):
+            return ('', 416, head)
+        head['Content-Range'] = 'bytes {}-{}/{}'.format(
+            start, 
+            len(content) - 1, 
+            len(content)
+        )
+        return (content[start:], 206, head)
+    return (content, head)
+
+
 @app.route('/shutdown', methods=['GET',])
 def shutdown():
     """Process request to shutdown the server."""
@@ -10,15 +10,30 @@ python3 -m unittest tests/tests.py
 """
 
 from collections.abc import Mapping, Sequence
+import asyncio
+import gzip
 from json import loads
-from threading import Thread
-from time import sleep
+import os
+from re import compile as re_compile
+from tempfile import TemporaryDirectory
+from threading import Event, Thread
+from time import monotonic, sleep
 import unittest
 
 from requests import get
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 from tests import scryfake
-from scrycli import scrycli, utility
+from scrycli import (aio, bulk, cache, checkpoint, config, flight, index, 
+                     query, ratelimit, records, retry, scrycli, store, 
+                     table, utility)
 from scrycli.pyvalidate import pyvalidate as PV
 from scrycli.pyvalidate import normalize as N
 
@@ -42,6 +57,8 @@ class ScrycliTestCase(unittest.TestCase):
         global FQDN
         FQDN = scrycli.FQDN
         scrycli.FQDN = SCRYFAKE_FQDN
+        scrycli.BULK_FQDN = SCRYFAKE_FQDN
+        aio.FQDN = SCRYFAKE_FQDN
         
         # Scryfake halts execution if run in same thread.
         T = Thread(target=scryfake.app.run)
@@ -87,7 +104,660 @@ class ScrycliTestCase(unittest.TestCase):
         self.assertEqual(scrycli.cards_search(q), expected)
 
 
+    # Tests for iter_cards().
+    def test_iter_cards(self):
+        """scrycli.iter_cards() should yield the cards from each page 
+        until there are no more pages.
+        """
+        data = loads(scryfake.resp['cards'])['data']
+        expected = data + data
+        self.assertEqual(list(scrycli.iter_cards()), expected)
+    
+    
+    # Tests for iter_cards_search().
+    def test_iter_cards_search(self):
+        """scrycli.iter_cards_search() should yield the cards from 
+        each page until there are no more pages.
+        """
+        q = 's:ktk'
+        data = loads(scryfake.resp['cards_search'], strict=False)['data']
+        expected = data + data
+        self.assertEqual(list(scrycli.iter_cards_search(q)), expected)
+    
+    def test_iter_cards_search_Page(self):
+        """scrycli.iter_cards_search() should start from the given 
+        page.
+        """
+        q = 's:ktk'
+        data = loads(scryfake.resp['cards_search'], strict=False)['data']
+        result = scrycli.iter_cards_search(q, page=2)
+        self.assertEqual(list(result), data)
+    
+    def test_iter_cards_search_Prefetch(self):
+        """scrycli.iter_cards_search() should yield the same cards 
+        when prefetching the next page.
+        """
+        q = 's:ktk'
+        data = loads(scryfake.resp['cards_search'], strict=False)['data']
+        expected = data + data
+        result = scrycli.iter_cards_search(q, prefetch=True)
+        self.assertEqual(list(result), expected)
+    
+    def test_iter_cards_search_PrefetchClose(self):
+        """scrycli.iter_cards_search() should stop cleanly if it is 
+        closed while a page is being prefetched.
+        """
+        q = 's:ktk'
+        data = loads(scryfake.resp['cards_search'], strict=False)['data']
+        result = scrycli.iter_cards_search(q, prefetch=True)
+        self.assertEqual(next(result), data[0])
+        result.close()
+        self.assertRaises(StopIteration, next, result)
+    
+    def test_iter_cards_search_Stream(self):
+        """scrycli.iter_cards_search() should yield the same cards 
+        when streaming the pages.
+        """
+        q = 's:ktk'
+        data = loads(scryfake.resp['cards_search'], strict=False)['data']
+        expected = data + data
+        result = scrycli.iter_cards_search(q, stream=True)
+        self.assertEqual(list(result), expected)
+    
+    def test_iter_cards_search_StreamPrefetch(self):
+        """scrycli.iter_cards_search() negative test: streamed pages 
+        cannot be prefetched.
+        """
+        q = 's:ktk'
+        self.assertRaises(ValueError, scrycli.iter_cards_search, q, 
+                          prefetch=True, stream=True)
+    
+    
+    # Tests for cards_collection_chunk() and cards_collection().
+    def test_cards_collection_chunk(self):
+        """scrycli.cards_collection_chunk() should return the cards 
+        found and the identifiers that were not found.
+        """
+        data = loads(scryfake.resp['cards'], strict=False)['data']
+        missing = {'name': 'Spam'}
+        identifiers = [
+            {'id': data[2]['id']},
+            missing,
+            {'set': 'emn', 'collector_number': '130a'},
+        ]
+        result = scrycli.cards_collection_chunk(identifiers)
+        self.assertEqual(result['data'], [data[2], data[3]])
+        self.assertEqual(result['not_found'], [missing])
+    
+    def test_cards_collection(self):
+        """scrycli.cards_collection() should send the identifiers in 
+        chunks and combine the results in order.
+        """
+        cards = loads(scryfake.resp['cards'], strict=False)['data']
+        search = loads(scryfake.resp['cards_search'], strict=False)['data']
+        missing = [{'name': 'Spam {}'.format(i)} for i in range(80)]
+        identifiers = ([{'id': cards[0]['id']}] + missing 
+                       + [{'name': search[1]['name']}])
+        result = scrycli.cards_collection(identifiers)
+        self.assertEqual(result['data'], [cards[0], search[1]])
+        self.assertEqual(result['not_found'], missing)
+    
+    def test_cards_collection_Size(self):
+        """scrycli.cards_collection() should send COLLECTION_SIZE 
+        identifiers in each request.
+        """
+        data = loads(scryfake.resp['cards_search'], strict=False)['data']
+        identifiers = [{'id': card['id']} for card in data]
+        size = scrycli.COLLECTION_SIZE
+        chunk = scrycli.cards_collection_chunk
+        chunks = []
+        def fake_chunk(identifiers):
+            chunks.append(identifiers)
+            return chunk(identifiers)
+        scrycli.COLLECTION_SIZE = 3
+        scrycli.cards_collection_chunk = fake_chunk
+        try:
+            result = scrycli.cards_collection(identifiers, 1)
+        finally:
+            scrycli.COLLECTION_SIZE = size
+            scrycli.cards_collection_chunk = chunk
+        self.assertEqual(result['data'], data)
+        self.assertEqual([len(c) for c in chunks], [3, 1])
+    
+    def test_cards_collection_Empty(self):
+        """scrycli.cards_collection() should not make a request for 
+        an empty list of identifiers.
+        """
+        expected = {'object': 'list', 'not_found': [], 'data': []}
+        self.assertEqual(scrycli.cards_collection([]), expected)
+    
+    
+    # Tests for retries.
+    def test_retry(self):
+        """Requests that fail with a temporary error should be 
+        retried until they succeed.
+        """
+        expected = loads(scryfake.resp['sets_code'], strict=False)
+        policy = scrycli.RETRY
+        scrycli.RETRY = retry.RetryPolicy(3, backoff=.01)
+        scryfake.flaky[:] = [503, 429]
+        try:
+            self.assertEqual(scrycli.sets_code('flaky'), expected)
+            stats = scrycli.RETRY.stats()
+        finally:
+            scrycli.RETRY = policy
+            scryfake.flaky[:] = []
+        self.assertEqual(stats['retries'], 2)
+        self.assertEqual(stats['exhausted'], 0)
+    
+    def test_retry_Exhausted(self):
+        """Requests that keep failing should raise the error once 
+        the attempts run out.
+        """
+        policy = scrycli.RETRY
+        scrycli.RETRY = retry.RetryPolicy(2, backoff=.01)
+        scryfake.flaky[:] = [503, 503, 503]
+        try:
+            self.assertRaises(scrycli.HTTPServerError, 
+                              scrycli.sets_code, 'flaky')
+            stats = scrycli.RETRY.stats()
+        finally:
+            scrycli.RETRY = policy
+            scryfake.flaky[:] = []
+        self.assertEqual(stats['retries'], 1)
+        self.assertEqual(stats['exhausted'], 1)
+    
+    def test_retry_Off(self):
+        """Failed requests should not be retried if RETRY is None."""
+        policy = scrycli.RETRY
+        scrycli.RETRY = None
+        scryfake.flaky[:] = [503]
+        try:
+            self.assertRaises(scrycli.HTTPServerError, 
+                              scrycli.sets_code, 'flaky')
+            self.assertEqual(scryfake.flaky, [])
+        finally:
+            scrycli.RETRY = policy
+            scryfake.flaky[:] = []
+    
+    @unittest.skipUnless(aiohttp, 'aiohttp is not installed')
+    def test_aio_retry(self):
+        """aio requests that fail with a temporary error should be 
+        retried until they succeed.
+        """
+        expected = loads(scryfake.resp['sets_code'], strict=False)
+        policy = scrycli.RETRY
+        scrycli.RETRY = retry.RetryPolicy(3, backoff=.01)
+        scryfake.flaky[:] = [502]
+        try:
+            self.assertEqual(self.run_aio(aio.sets_code('flaky')), expected)
+            self.assertEqual(scrycli.RETRY.retries, 1)
+        finally:
+            scrycli.RETRY = policy
+            scryfake.flaky[:] = []
+    
+    
+    # Tests for the result cache.
+    def test_result_cache(self):
+        """A repeat API call should return the cached result without 
+        a request when PV.tbcache is set.
+        """
+        expected = loads(scryfake.resp['sets_code'], strict=False)
+        get = scrycli._get
+        requests = []
+        def fake_get(url, params={}):
+            requests.append(url)
+            return get(url, params)
+        scrycli._get = fake_get
+        PV.tbcache = PV.ResultCache()
+        try:
+            self.assertEqual(scrycli.sets_code('mmq'), expected)
+            self.assertEqual(scrycli.sets_code('mmq'), expected)
+        finally:
+            scrycli._get = get
+            PV.tbcache = None
+        self.assertEqual(len(requests), 1)
+    
+    
+    # Tests for request coalescing.
+    def test_single_flight(self):
+        """Identical API calls made at the same time should share one 
+        request and get the same result.
+        """
+        expected = loads(scryfake.resp['sets_code'], strict=False)
+        flights = flight.SingleFlight()
+        get = scrycli._get
+        requests = []
+        def fake_get(url, params={}):
+            requests.append(url)
+            deadline = monotonic() + 2
+            while flights.shared < 3 and monotonic() < deadline:
+                sleep(.01)
+            return get(url, params)
+        results = []
+        def call():
+            results.append(scrycli.sets_code('mmq'))
+        threads = [Thread(target=call) for _ in range(4)]
+        scrycli.FLIGHTS = flights
+        scrycli._get = fake_get
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            scrycli._get = get
+            scrycli.FLIGHTS = None
+        self.assertEqual(len(requests), 1)
+        self.assertEqual(results, [expected] * 4)
+        self.assertTrue(all(result is results[0] for result in results))
+    
+    def test_single_flight_Off(self):
+        """API calls should not be coalesced by default."""
+        expected = loads(scryfake.resp['sets_code'], strict=False)
+        self.assertIsNone(scrycli.FLIGHTS)
+        self.assertEqual(scrycli.sets_code('mmq'), expected)
+    
+    
+    # Tests for iter_cards_searches() and iter_cards_in_sets().
+    def test_iter_cards_in_sets(self):
+        """scrycli.iter_cards_in_sets() should yield every card in 
+        each set with the code of its set.
+        """
+        data = loads(scryfake.resp['cards_search'], strict=False)['data']
+        result = list(scrycli.iter_cards_in_sets(['ktk', 'frf'], 2))
+        self.assertEqual(len(result), 4 * len(data))
+        for code in ('ktk', 'frf'):
+            cards = [card for key, card in result if key == code]
+            self.assertEqual(cards, data + data)
+    
+    def test_iter_cards_searches_Grouped(self):
+        """scrycli.iter_cards_searches() should yield the cards of 
+        each search together when the order is grouped.
+        """
+        data = loads(scryfake.resp['cards_search'], strict=False)['data']
+        queries = ['s:ktk', 's:frf', 's:dtk']
+        result = scrycli.iter_cards_searches(queries, 3, 'grouped')
+        keys = [key for key, _ in result]
+        self.assertEqual(len(keys), 3 * 2 * len(data))
+        changes = [i for i in range(1, len(keys)) if keys[i] != keys[i - 1]]
+        self.assertEqual(len(changes), 2)
+    
+    def test_iter_cards_searches_Input(self):
+        """scrycli.iter_cards_searches() should yield the cards of 
+        each search in the order the searches were given when the 
+        order is input.
+        """
+        data = loads(scryfake.resp['cards_search'], strict=False)['data']
+        queries = {'a': 's:ktk', 'b': 's:frf', 'c': 's:dtk'}
+        result = scrycli.iter_cards_searches(queries, 3, 'input')
+        expected = [(key, card) for key in 'abc' for card in data + data]
+        self.assertEqual(list(result), expected)
+    
+    def test_iter_cards_searches_Errors(self):
+        """scrycli.iter_cards_searches() should keep going when a 
+        search fails and put its exception in the errors dict.
+        """
+        data = loads(scryfake.resp['cards_search'], strict=False)['data']
+        cards_search = scrycli.cards_search
+        def fake_search(q, **kwargs):
+            if q == 's:bad':
+                raise ValueError('bad search')
+            return cards_search(q, **kwargs)
+        errors = {}
+        scrycli.cards_search = fake_search
+        try:
+            result = list(scrycli.iter_cards_searches(
+                ['s:ktk', 's:bad'], 2, 'input', errors
+            ))
+        finally:
+            scrycli.cards_search = cards_search
+        self.assertEqual(result, [('s:ktk', card) for card in data + data])
+        self.assertEqual(list(errors), ['s:bad'])
+        self.assertIsInstance(errors['s:bad'], ValueError)
+    
+    def test_iter_cards_searches_Raise(self):
+        """scrycli.iter_cards_searches() should raise the exception of 
+        a failed search if it isn't given an errors dict.
+        """
+        cards_search = scrycli.cards_search
+        def fake_search(q, **kwargs):
+            raise ValueError('bad search')
+        scrycli.cards_search = fake_search
+        try:
+            result = scrycli.iter_cards_searches(['s:bad'])
+            self.assertRaises(ValueError, list, result)
+        finally:
+            scrycli.cards_search = cards_search
+    
+    def test_iter_cards_searches_Order(self):
+        """scrycli.iter_cards_searches() negative test: the order 
+        must be valid.
+        """
+        self.assertRaises(ValueError, scrycli.iter_cards_searches, 
+                          ['s:ktk'], order='spam')
+    
+    
+    # Tests for checkpointed paging.
+    def test_iter_cards_search_Checkpoint(self):
+        """scrycli.iter_cards_search() should resume after the last 
+        page finished and delete the checkpoint when it is done.
+        """
+        q = 's:ktk'
+        data = loads(scryfake.resp['cards_search'], strict=False)['data']
+        with TemporaryDirectory() as dir:
+            path = os.path.join(dir, 'ktk.checkpoint')
+            result = scrycli.iter_cards_search(q, checkpoint=path)
+            first = [next(result) for _ in range(len(data) + 1)]
+            result.close()
+            self.assertEqual(first, data + data[:1])
+            with open(path) as fh:
+                self.assertEqual(loads(fh.read())['page'], 1)
+            
+            result = scrycli.iter_cards_search(q, checkpoint=path)
+            self.assertEqual(list(result), data)
+            self.assertFalse(os.path.exists(path))
+    
+    def test_iter_cards_search_CheckpointStream(self):
+        """scrycli.iter_cards_search() should save checkpoints when 
+        streaming the pages.
+        """
+        q = 's:ktk'
+        data = loads(scryfake.resp['cards_search'], strict=False)['data']
+        with TemporaryDirectory() as dir:
+            path = os.path.join(dir, 'ktk.checkpoint')
+            result = scrycli.iter_cards_search(q, stream=True, 
+                                               checkpoint=path)
+            for _ in range(len(data) + 1):
+                next(result)
+            result.close()
+            result = scrycli.iter_cards_search(q, stream=True, 
+                                               checkpoint=path)
+            self.assertEqual(list(result), data)
+    
+    def test_iter_cards_search_CheckpointSearch(self):
+        """scrycli.iter_cards_search() negative test: the checkpoint 
+        must be for the same search.
+        """
+        with TemporaryDirectory() as dir:
+            path = os.path.join(dir, 'ktk.checkpoint')
+            result = scrycli.iter_cards_search('s:ktk', checkpoint=path)
+            for _ in range(5):
+                next(result)
+            result.close()
+            self.assertRaises(ValueError, scrycli.iter_cards_search, 
+                              's:frf', checkpoint=path)
+    
+    def test_ingest_cards_search(self):
+        """scrycli.ingest_cards_search() should resume with the page 
+        the sink was writing when it failed, without storing its 
+        cards twice.
+        """
+        data = loads(scryfake.resp['cards_search'], strict=False)['data']
+        db = store.Store(':memory:')
+        calls = []
+        def sink(cards):
+            calls.append(len(cards))
+            db.put_cards(cards[:2])
+            if len(calls) == 2:
+                raise RuntimeError('crash')
+            db.put_cards(cards)
+        with TemporaryDirectory() as dir:
+            path = os.path.join(dir, 'ktk.checkpoint')
+            self.assertRaises(RuntimeError, scrycli.ingest_cards_search, 
+                              sink, 's:ktk', checkpoint=path)
+            count = scrycli.ingest_cards_search(sink, 's:ktk', 
+                                                checkpoint=path)
+            self.assertFalse(os.path.exists(path))
+        self.assertEqual(count, len(data))
+        self.assertEqual(calls, [len(data)] * 3)
+        self.assertEqual(db.count_cards(), len(data))
+        db.close()
+    
+    
+    # Tests for bulk_data().
+    def test_bulk_data(self):
+        """Unit test for scrycli.bulk_data()."""
+        expected = loads(scryfake.resp['bulk_data'])
+        self.assertEqual(scrycli.bulk_data(), expected)
+    
+    
+    # Tests for download_bulk().
+    def test_download_bulk(self):
+        """scrycli.download_bulk() should save the bulk data file."""
+        uri = ('https://data.scryfall.io/default-cards/'
+               'default-cards-20190301100000.json')
+        with TemporaryDirectory() as dir:
+            path = os.path.join(dir, 'cards.json')
+            result = scrycli.download_bulk(uri, path)
+            self.assertEqual(result, path)
+            with open(path, 'rb') as fh:
+                self.assertEqual(fh.read(), scryfake.resp['bulk_cards'])
+            self.assertFalse(os.path.exists(path + '.part'))
+    
+    def test_download_bulk_Resume(self):
+        """scrycli.download_bulk() should resume an interrupted 
+        download.
+        """
+        uri = ('https://data.scryfall.io/default-cards/'
+               'default-cards-20190301100000.json')
+        expected = scryfake.resp['bulk_cards']
+        with TemporaryDirectory() as dir:
+            path = os.path.join(dir, 'cards.json')
+            with open(path + '.part', 'wb') as fh:
+                fh.write(expected[:1000])
+            scrycli.download_bulk(uri, path)
+            with open(path, 'rb') as fh:
+                self.assertEqual(fh.read(), expected)
+    
+    def test_download_bulk_ResumeComplete(self):
+        """scrycli.download_bulk() should finish a download that was 
+        interrupted after the last byte was written.
+        """
+        uri = ('https://data.scryfall.io/default-cards/'
+               'default-cards-20190301100000.json')
+        expected = scryfake.resp['bulk_cards']
+        with TemporaryDirectory() as dir:
+            path = os.path.join(dir, 'cards.json')
+            with open(path + '.part', 'wb') as fh:
+                fh.write(expected)
+            scrycli.download_bulk(uri, path)
+            with open(path, 'rb') as fh:
+                self.assertEqual(fh.read(), expected)
+    
+    def test_download_bulk_Retry(self):
+        """scrycli.download_bulk() should retry a resumed download 
+        that fails with a temporary error.
+        """
+        uri = ('https://data.scryfall.io/default-cards/'
+               'default-cards-20190301100000.json')
+        expected = scryfake.resp['bulk_cards']
+        policy = scrycli.RETRY
+        scrycli.RETRY = retry.RetryPolicy(3, backoff=.01)
+        scryfake.flaky[:] = [503]
+        try:
+            with TemporaryDirectory() as dir:
+                path = os.path.join(dir, 'cards.json')
+                with open(path + '.part', 'wb') as fh:
+                    fh.write(expected[:1000])
+                scrycli.download_bulk(uri, path)
+                with open(path, 'rb') as fh:
+                    self.assertEqual(fh.read(), expected)
+            stats = scrycli.RETRY.stats()
+        finally:
+            scrycli.RETRY = policy
+            scryfake.flaky[:] = []
+        self.assertEqual(stats['retries'], 1)
+    
+    
+    # Tests for bulk_cards().
+    def test_bulk_cards(self):
+        """scrycli.bulk_cards() should yield each validated card in 
+        the bulk data file.
+        """
+        expected = loads(scryfake.resp['cards'], strict=False)['data']
+        with TemporaryDirectory() as dir:
+            path = os.path.join(dir, 'cards.json')
+            with open(path, 'wb') as fh:
+                fh.write(scryfake.resp['bulk_cards'])
+            result = scrycli.bulk_cards(path)
+            self.assertEqual(list(result), expected)
+    
+    def test_bulk_cards_Gzip(self):
+        """scrycli.bulk_cards() should read gzip compressed files."""
+        expected = loads(scryfake.resp['cards'], strict=False)['data']
+        with TemporaryDirectory() as dir:
+            path = os.path.join(dir, 'cards.json')
+            with gzip.open(path, 'wb') as fh:
+                fh.write(scryfake.resp['bulk_cards'])
+            result = scrycli.bulk_cards(path)
+            self.assertEqual(list(result), expected)
+    
+    def test_bulk_cards_Cache(self):
+        """scrycli.bulk_cards() should yield the cards every time it 
+        is called when PV.tbcache is set.
+        """
+        expected = loads(scryfake.resp['cards'], strict=False)['data']
+        PV.tbcache = PV.ResultCache()
+        try:
+            with TemporaryDirectory() as dir:
+                path = os.path.join(dir, 'cards.json')
+                with open(path, 'wb') as fh:
+                    fh.write(scryfake.resp['bulk_cards'])
+                self.assertEqual(list(scrycli.bulk_cards(path)), expected)
+                self.assertEqual(list(scrycli.bulk_cards(path)), expected)
+        finally:
+            PV.tbcache = None
+    
+    
+    # Tests for bulk.ingest().
+    def test_ingest(self):
+        """bulk.ingest() should download the bulk data file and pass 
+        its cards to the sink in batches.
+        """
+        expected = loads(scryfake.resp['cards'], strict=False)['data']
+        batches = []
+        with TemporaryDirectory() as dir:
+            count = bulk.ingest(batches.append, dir=dir, batch_size=2)
+            self.assertTrue(os.path.exists(os.path.join(
+                dir, 
+                'default-cards-20190301100000.json'
+            )))
+        self.assertEqual(count, len(expected))
+        self.assertEqual(sum(batches, []), expected)
+        self.assertTrue(all(len(batch) <= 2 for batch in batches))
+    
+    def test_ingest_BadType(self):
+        """bulk.ingest() negative test: unknown bulk data type."""
+        err = ValueError
+        msg_re = 'Scryfall.com has no bulk data of type spam.'
+        self.assertRaisesRegex(err, msg_re, bulk.ingest, list.append, 
+                               'spam')
+    
+    
+    # Tests for aio.
+    def run_aio(self, coro):
+        """Run a coroutine, closing the aio session before the event 
+        loop closes.
+        """
+        async def main():
+            try:
+                return await coro
+            finally:
+                await aio.close()
+        return asyncio.run(main())
+    
+    @unittest.skipUnless(aiohttp, 'requires aiohttp')
+    def test_aio_sets(self):
+        """aio.sets() should return the validated set list."""
+        expected = loads(scryfake.resp['sets'], strict=False)
+        self.assertEqual(self.run_aio(aio.sets()), expected)
+    
+    @unittest.skipUnless(aiohttp, 'requires aiohttp')
+    def test_aio_session_Loop(self):
+        """aio should close the session left open by a finished event 
+        loop, with a warning, before opening one for a new loop.
+        """
+        expected = loads(scryfake.resp['sets_code'], strict=False)
+        self.assertEqual(asyncio.run(aio.sets_code('mmq')), expected)
+        session = aio._session
+        with self.assertWarns(ResourceWarning):
+            result = self.run_aio(aio.sets_code('mmq'))
+        self.assertEqual(result, expected)
+        self.assertTrue(session.closed)
+    
+    @unittest.skipUnless(aiohttp, 'requires aiohttp')
+    def test_aio_sets_code(self):
+        """aio.sets_code() should return the validated set."""
+        expected = loads(scryfake.resp['sets_code'], strict=False)
+        self.assertEqual(self.run_aio(aio.sets_code('mmq')), expected)
+    
+    @unittest.skipUnless(aiohttp, 'requires aiohttp')
+    def test_aio_cards_search_Concurrent(self):
+        """aio.cards_search() calls should run concurrently on one 
+        event loop and share the session.
+        """
+        expected = loads(scryfake.resp['cards_search'], strict=False)
+        async def main():
+            calls = [aio.cards_search('s:ktk'), aio.cards(), 
+                     aio.cards_search('s:ktk', include_extras=True)]
+            return await asyncio.gather(*calls)
+        search, cards, extras = self.run_aio(main())
+        self.assertEqual(search, expected)
+        self.assertEqual(extras, expected)
+        self.assertEqual(cards['data'][0]['set'], 'uma')
+    
+    @unittest.skipUnless(aiohttp, 'requires aiohttp')
+    def test_aio_iter_cards_search(self):
+        """aio.iter_cards_search() should yield each card on each 
+        page, with or without prefetching.
+        """
+        data = loads(scryfake.resp['cards_search'], strict=False)['data']
+        async def main(prefetch):
+            result = aio.iter_cards_search('s:ktk', prefetch=prefetch)
+            return [card async for card in result]
+        for prefetch in (False, True):
+            self.assertEqual(self.run_aio(main(prefetch)), data + data)
+    
+    @unittest.skipUnless(aiohttp, 'requires aiohttp')
+    def test_aio_get_404(self):
+        """aio._get() should raise the scrycli exceptions."""
+        url = SCRYFAKE_FQDN + '/spam'
+        self.assertRaises(scrycli.HTTPClientError, self.run_aio, 
+                          aio._get(url))
+    
+    
     # Tests for _get().
+    def test_get_Cache(self):
+        """scrycli._get() should use fresh cached responses."""
+        code = 'mmq'
+        expected = loads(scryfake.resp['sets_code'])
+        with TemporaryDirectory() as tmp:
+            scrycli.CACHE = cache.HTTPCache(os.path.join(tmp, 'cache.db'))
+            try:
+                self.assertEqual(scrycli.sets_code(code), expected)
+                self.assertEqual(scrycli.sets_code(code), expected)
+                self.assertEqual(scrycli.CACHE.misses, 1)
+                self.assertEqual(scrycli.CACHE.hits, 1)
+            finally:
+                scrycli.CACHE.close()
+                scrycli.CACHE = None
+    
+    def test_get_CacheRevalidate(self):
+        """scrycli._get() should revalidate stale cached responses."""
+        code = 'mmq'
+        expected = loads(scryfake.resp['sets_code'])
+        with TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'cache.db')
+            scrycli.CACHE = cache.HTTPCache(path, ttl=0)
+            try:
+                self.assertEqual(scrycli.sets_code(code), expected)
+                self.assertEqual(scrycli.sets_code(code), expected)
+                self.assertEqual(scrycli.CACHE.stale, 1)
+            finally:
+                scrycli.CACHE.close()
+                scrycli.CACHE = None
+    
     def test_get_404(self):
         """scrycli._get() negative case: return code 404."""
         code='zzz'
@@ -95,20 +765,252 @@ class ScrycliTestCase(unittest.TestCase):
         err = scrycli.HTTPClientError
         msg = '404: NOT FOUND'
         self.assertRaisesRegex(err, msg, scrycli.sets_code, code)
+    
+    
+    # Tests for close().
+    def test_close(self):
+        """scrycli.close() should drop the pooled session, and calls 
+        before it should reuse the same session.
+        """
+        scrycli.sets()
+        session = scrycli._session
+        scrycli.sets()
+        self.assertIs(scrycli._session, session)
+        scrycli.close()
+        self.assertIsNone(scrycli._session)
         
     
     @classmethod
     def tearDownClass(cls):
         """Tear down test instances and data."""
+        # Close the pooled HTTP session.
+        scrycli.close()
+        
         # Shutdown the Scryfake instance.
         get('http://127.0.0.1:5000/shutdown')
         
         # Point scrycli back at Scryfall.com just in case.
         global FQDN
         scrycli.FQDN = FQDN
+        scrycli.BULK_FQDN = config.bulk_fqdn
+        aio.FQDN = config.fqdn
         FQDN = None
 
 
+class BulkTestCase(unittest.TestCase):
+    """Unit tests for bulk.py."""
+    def test_emit(self):
+        """bulk.emit() should pass the cards to the sink in batches."""
+        batches = []
+        result = bulk.emit(iter(range(5)), batches.append, 2)
+        self.assertEqual(result, 5)
+        self.assertEqual(batches, [[0, 1], [2, 3], [4]])
+    
+    def test_emit_BadBatch(self):
+        """bulk.emit() negative test: batch size less than one."""
+        err = ValueError
+        msg_re = 'Batch size must be at least 1.'
+        self.assertRaisesRegex(err, msg_re, bulk.emit, [], list, 0)
+
+
+class RecordsTestCase(unittest.TestCase):
+    """Unit tests for records.py."""
+    def setUp(self):
+        self.cards = loads(scryfake.resp['cards'], strict=False)['data']
+        self.sets = loads(scryfake.resp['sets'], strict=False)['data']
+    
+    def test_Card(self):
+        """Card.from_json() should build a slotted record with nested 
+        records and tuples.
+        """
+        card = records.Card.from_json(self.cards[0])
+        self.assertFalse(hasattr(card, '__dict__'))
+        self.assertEqual(card.name, 'Nourishing Shoal')
+        self.assertEqual(card.colors, ('G',))
+        self.assertIsInstance(card.legalities, records.Legalities)
+        self.assertEqual(card.legalities.modern, 'legal')
+        self.assertEqual(card.legalities.f_1v1, 'legal')
+        self.assertIsInstance(card.image_uris, records.ImageURIs)
+        self.assertIsNone(card.loyalty)
+    
+    def test_Card_Interned(self):
+        """Card records should share one copy of enum strings."""
+        a, b = records.cards(self.cards[:2])
+        self.assertIs(a.rarity, b.rarity)
+        self.assertIs(a.layout, b.layout)
+        self.assertIs(a.legalities.modern, b.legalities.modern)
+    
+    def test_Card_to_dict(self):
+        """Card.to_dict() should rebuild the validated object."""
+        for obj in self.cards:
+            card = records.Card.from_json(obj)
+            self.assertEqual(card.to_dict(), obj)
+            self.assertEqual(records.Card.from_json(card.to_dict()), card)
+    
+    def test_Set(self):
+        """records.sets() should convert set objects to records."""
+        result = list(records.sets(self.sets))
+        self.assertEqual(result[1].code, 'rna')
+        self.assertEqual(result[1].to_dict(), self.sets[1])
+        self.assertEqual(repr(result[1]), 
+                         "Set(name='Ravnica Allegiance', "
+                         "id='97a7fd84-8d89-45a3-b48b-c951f6a3f9f1', "
+                         "code='rna')")
+
+
+class StoreTestCase(unittest.TestCase):
+    """Unit tests for store.py."""
+    def setUp(self):
+        self.store = store.Store(':memory:')
+        self.cards = loads(scryfake.resp['cards'], strict=False)['data']
+        self.sets = loads(scryfake.resp['sets'], strict=False)['data']
+    
+    def tearDown(self):
+        self.store.close()
+    
+    def test_put_cards(self):
+        """Store.put_cards() should store the cards so they can be 
+        looked up.
+        """
+        card = self.cards[0]
+        self.assertEqual(self.store.put_cards(self.cards), len(self.cards))
+        self.assertEqual(self.store.count_cards(), len(self.cards))
+        self.assertEqual(self.store.get_card(card['id']), card)
+    
+    def test_put_cards_Upsert(self):
+        """Store.put_cards() should replace cards already stored."""
+        self.store.put_cards(self.cards)
+        card = dict(self.cards[0], name='Spam')
+        self.store.put_cards([card,])
+        self.assertEqual(self.store.count_cards(), len(self.cards))
+        self.assertEqual(self.store.get_card(card['id']), card)
+        self.assertEqual(self.store.find_cards(name='Spam'), [card,])
+    
+    def test_put_cards_Sink(self):
+        """A Store should work as a sink for bulk.emit()."""
+        count = bulk.emit(self.cards, self.store, 2)
+        self.assertEqual(count, len(self.cards))
+        self.assertEqual(self.store.count_cards(), len(self.cards))
+    
+    def test_find_cards(self):
+        """Store.find_cards() should return the cards that match all 
+        of the given values.
+        """
+        self.store.put_cards(self.cards)
+        card = self.cards[0]
+        result = self.store.find_cards(
+            set_code=card['set'], 
+            collector_number=card['collector_number'],
+            lang=card['lang']
+        )
+        self.assertEqual(result, [card,])
+        result = self.store.find_cards(oracle_id=card['oracle_id'])
+        self.assertIn(card, result)
+    
+    def test_find_cards_BadColumn(self):
+        """Store.find_cards() negative test: unknown column."""
+        err = ValueError
+        msg_re = 'Cannot look up cards by spam.'
+        self.assertRaisesRegex(err, msg_re, self.store.find_cards, 
+                               spam='eggs')
+    
+    def test_get_card_Missing(self):
+        """Store.get_card() should return None for unknown cards."""
+        self.assertIsNone(self.store.get_card('spam'))
+    
+    def test_put_sets(self):
+        """Store.put_sets() should store the sets so they can be 
+        looked up by code.
+        """
+        self.assertEqual(self.store.put_sets(self.sets), len(self.sets))
+        self.assertEqual(self.store.get_set('rna'), self.sets[1])
+        self.assertIsNone(self.store.get_set('spam'))
+    
+    def test_Store_WAL(self):
+        """Store should open file databases in WAL mode."""
+        with TemporaryDirectory() as dir:
+            s = store.Store(os.path.join(dir, 'cards.db'))
+            try:
+                mode = s._conn.execute('PRAGMA journal_mode').fetchone()
+                self.assertEqual(mode[0], 'wal')
+            finally:
+                s.close()
+
+
+@unittest.skipUnless(numpy, 'requires NumPy')
+class TableTestCase(unittest.TestCase):
+    """Unit tests for table.py."""
+    def setUp(self):
+        self.cards = loads(scryfake.resp['cards'], strict=False)['data']
+        self.cards += loads(scryfake.resp['cards_search'], 
+                            strict=False)['data']
+        self.table = table.CardTable(self.cards)
+    
+    def test_CardTable(self):
+        """CardTable should build a typed array for each column."""
+        self.assertEqual(len(self.table), len(self.cards))
+        self.assertEqual(self.table.cmc.dtype, numpy.float64)
+        self.assertEqual(self.table.released_at[0], 
+                         numpy.datetime64('2018-12-07'))
+        self.assertTrue(numpy.isnan(self.table.usd[1]))
+        self.assertEqual(self.table.usd[0], 1.19)
+        rarity = self.table.categories['rarity']
+        self.assertEqual(rarity[self.table.rarity[4]], 'common')
+        self.assertEqual(self.table.categories['set'], ['uma', 'emn', 'ktk'])
+    
+    def test_masks(self):
+        """The CardTable masks should select rows by category, color, 
+        and legality.
+        """
+        mask = self.table.category_mask('set', 'ktk', 'emn')
+        self.assertEqual(int(mask.sum()), 5)
+        mask = self.table.color_mask('BG')
+        self.assertEqual(self.table.name[mask].tolist(), [
+            'Abomination of Gudul', 
+            'Abzan Ascendancy',
+        ])
+        mask = self.table.color_mask('G', 'color_identity', exact=True)
+        self.assertEqual(int(mask.sum()), 2)
+        mask = self.table.color_mask('')
+        self.assertEqual(self.table.name[mask].tolist(), ['Abzan Banner',])
+        mask = self.table.legal_mask('standard')
+        self.assertEqual(int(mask.sum()), 0)
+    
+    def test_filter(self):
+        """CardTable.filter() should select the rows of every column."""
+        result = self.table.filter(self.table.cmc >= 4)
+        self.assertEqual(len(result), 2)
+        self.assertEqual(result.name.tolist(), [
+            'Abomination of Gudul', 
+            'Abzan Battle Priest',
+        ])
+        self.assertEqual(result.count_by('rarity'), {
+            'common': 1, 
+            'uncommon': 1,
+        })
+    
+    def test_count_by(self):
+        """CardTable.count_by() should count the rows in each group."""
+        self.assertEqual(self.table.count_by('set'), {
+            'uma': 3, 
+            'emn': 1, 
+            'ktk': 4,
+        })
+        self.assertEqual(self.table.count_by('colors'), {
+            '': 1, 'W': 1, 'R': 1, 'G': 3, 'WBG': 1, 'UBG': 1,
+        })
+        self.assertEqual(self.table.count_by('cmc')[3.0], 3)
+        self.assertRaises(ValueError, self.table.count_by, 'name')
+    
+    def test_sum_by(self):
+        """CardTable.sum_by() should sum a column in each group, with 
+        missing values as zero.
+        """
+        result = self.table.sum_by('set', 'usd')
+        self.assertAlmostEqual(result['uma'], 47.45)
+        self.assertAlmostEqual(result['ktk'], 0.44)
+
+
 class UtilityTestCase(unittest.TestCase):
     """Unit tests for utility.py."""
     # Tests for build_query().
@@ -127,6 +1029,718 @@ class UtilityTestCase(unittest.TestCase):
         self.assertEqual(utility.parse_manacost(s), expected)
 
 
+class CacheTestCase(unittest.TestCase):
+    """Unit tests for cache.py."""
+    def setUp(self):
+        """Create an empty cache."""
+        self.cache = cache.HTTPCache(':memory:')
+        self.url = 'https://api.scryfall.com/sets/mmq'
+    
+    def tearDown(self):
+        """Close the cache."""
+        self.cache.close()
+    
+    
+    # Tests for HTTPCache.get().
+    def test_get_Miss(self):
+        """HTTPCache.get() should return None if not cached."""
+        self.assertIsNone(self.cache.get(self.url, {}))
+        self.assertEqual(self.cache.misses, 1)
+    
+    def test_get_Params(self):
+        """HTTPCache.get() should key responses by their parameters."""
+        self.cache.put(self.url, {'pretty': True}, 'text/plain', b'spam')
+        self.assertIsNone(self.cache.get(self.url, {}))
+        entry = self.cache.get(self.url, {'pretty': True})
+        self.assertEqual(entry.content, b'spam')
+    
+    def test_get_Stale(self):
+        """HTTPCache.get() should return stale responses with their 
+        validators.
+        """
+        self.cache.ttl = 0
+        self.cache.put(self.url, {}, 'text/plain', b'spam', etag='"1"', 
+                       last_modified='Sat, 26 Jan 2019 00:00:00 GMT')
+        expected = cache.Entry('text/plain', b'spam', '"1"', 
+                               'Sat, 26 Jan 2019 00:00:00 GMT', False)
+        self.assertEqual(self.cache.get(self.url, {}), expected)
+    
+    
+    # Tests for HTTPCache.refresh().
+    def test_refresh(self):
+        """HTTPCache.refresh() should make a stale response fresh."""
+        self.cache.ttl = 60
+        self.cache.put(self.url, {}, 'text/plain', b'spam')
+        with self.cache._conn:
+            self.cache._conn.execute('UPDATE responses SET stored = 0')
+        self.assertFalse(self.cache.get(self.url, {}).fresh)
+        self.cache.refresh(self.url, {})
+        self.assertTrue(self.cache.get(self.url, {}).fresh)
+    
+    
+    # Tests for HTTPCache.put().
+    def test_put_Evict(self):
+        """HTTPCache.put() should evict the least recently used 
+        responses when the cache is full.
+        """
+        self.cache.maxsize = 10
+        self.cache.put(self.url + '1', {}, 'text/plain', b'1234')
+        self.cache.put(self.url + '2', {}, 'text/plain', b'1234')
+        self.cache.get(self.url + '1', {})
+        self.cache.put(self.url + '3', {}, 'text/plain', b'1234')
+        self.assertIsNone(self.cache.get(self.url + '2', {}))
+        self.assertIsNotNone(self.cache.get(self.url + '1', {}))
+        self.assertEqual(self.cache.size(), 8)
+    
+    
+    # Tests for HTTPCache.purge().
+    def test_purge_Endpoint(self):
+        """HTTPCache.purge() should only remove the responses for 
+        the given endpoint and the paths under it.
+        """
+        fqdn = 'https://api.scryfall.com'
+        self.cache.put(fqdn + '/sets', {}, 'text/plain', b'spam')
+        self.cache.put(fqdn + '/sets/mmq', {}, 'text/plain', b'spam')
+        self.cache.put(fqdn + '/setsx', {}, 'text/plain', b'spam')
+        self.cache.put(fqdn + '/cards', {}, 'text/plain', b'spam')
+        self.assertEqual(self.cache.purge('/sets'), 2)
+        self.assertIsNotNone(self.cache.get(fqdn + '/setsx', {}))
+        self.assertIsNotNone(self.cache.get(fqdn + '/cards', {}))
+    
+    def test_purge_All(self):
+        """HTTPCache.purge() should remove all responses if no 
+        endpoint is given.
+        """
+        self.cache.put(self.url, {}, 'text/plain', b'spam')
+        self.assertEqual(self.cache.purge(), 1)
+        self.assertEqual(self.cache.size(), 0)
+
+
+class IndexTestCase(unittest.TestCase):
+    """Unit tests for index.py."""
+    def setUp(self):
+        self.cards = loads(scryfake.resp['cards'], strict=False)['data']
+        self.search = loads(scryfake.resp['cards_search'], 
+                            strict=False)['data']
+        self.index = index.CardIndex(self.cards)
+    
+    def test_get(self):
+        """CardIndex should look up cards by ID, by set and collector 
+        number, and by Oracle ID.
+        """
+        card = self.cards[1]
+        self.assertEqual(self.index.get(card['id']), card)
+        self.assertIsNone(self.index.get('spam'))
+        result = self.index.get_by_number('uma', '175', 'ja')
+        self.assertEqual(result, card)
+        result = self.index.get_by_number('uma', '175')
+        self.assertEqual(result, self.cards[0])
+        result = self.index.get_by_oracle_id(card['oracle_id'])
+        self.assertEqual(result, self.cards[:2])
+    
+    def test_complete(self):
+        """CardIndex.complete() should return the names that start 
+        with the prefix, ignoring case.
+        """
+        self.index.add(self.search)
+        self.assertEqual(self.index.complete('NO'), [
+            'Noble Hierarch', 
+            'Nourishing Shoal',
+        ])
+        self.assertEqual(self.index.complete('abzan', limit=2), [
+            'Abzan Ascendancy', 
+            'Abzan Banner',
+        ])
+        self.assertEqual(self.index.complete('spam'), [])
+    
+    def test_search(self):
+        """CardIndex.search() should return the cards with all of the 
+        words.
+        """
+        self.index.add(self.search)
+        result = self.index.search(type='human creature')
+        self.assertEqual([card['name'] for card in result], [
+            'Noble Hierarch', 
+            'Hanweir Garrison', 
+            'Abzan Battle Priest',
+        ])
+        result = self.index.search(text='exile', type='instant')
+        self.assertEqual(result, self.cards[:2])
+        self.assertEqual(self.index.search(text='spam'), [])
+        self.assertEqual(self.index.search(), [])
+    
+    def test_add_Incremental(self):
+        """CardIndex.add() should index new pages and replace cards 
+        already indexed.
+        """
+        self.assertEqual(self.index(self.search), len(self.search))
+        self.assertEqual(len(self.index), len(self.cards + self.search))
+        card = dict(self.cards[3], type_line='Artifact')
+        self.index.add([card,])
+        self.assertEqual(len(self.index), len(self.cards + self.search))
+        self.assertEqual(self.index.get(card['id']), card)
+        result = self.index.search(type='soldier')
+        self.assertEqual(result, [])
+        result = self.index.search(type='artifact')
+        self.assertEqual([c['name'] for c in result], [
+            'Hanweir Garrison', 
+            'Abzan Banner',
+        ])
+    
+    def test_add_Compact(self):
+        """CardIndex.add() should leave tombstones for replaced cards 
+        and compact them away once they are most of the index.
+        """
+        min_dead = index._min_dead
+        index._min_dead = 2
+        try:
+            for _ in range(3):
+                self.index.add(self.cards)
+        finally:
+            index._min_dead = min_dead
+        self.assertLessEqual(len(self.index._cards), 2 * len(self.cards))
+        self.assertEqual(len(self.index), len(self.cards))
+        oracle_id = self.cards[0]['oracle_id']
+        self.assertEqual(self.index.get_by_oracle_id(oracle_id), 
+                         self.cards[:2])
+        card = self.cards[3]
+        self.assertEqual(self.index.get_by_number(
+            card['set'], card['collector_number'], card['lang']
+        ), card)
+        result = self.index.search(type='soldier')
+        self.assertEqual(result, [card,])
+    
+    def test_compact(self):
+        """CardIndex.compact() should keep every lookup working."""
+        self.index.add(self.cards[2:])
+        self.index.compact()
+        self.assertEqual(len(self.index._cards), len(self.cards))
+        self.assertEqual(self.index.search(type='soldier'), 
+                         [self.cards[3],])
+        self.assertEqual(self.index.complete('nob'), ['Noble Hierarch',])
+
+
+class QueryTestCase(unittest.TestCase):
+    """Unit tests for query.py."""
+    @classmethod
+    def setUpClass(cls):
+        cls.store = store.Store(':memory:')
+        for key in ('cards', 'cards_search'):
+            data = loads(scryfake.resp[key], strict=False)['data']
+            cls.store.put_cards(data)
+    
+    @classmethod
+    def tearDownClass(cls):
+        cls.store.close()
+    
+    def names(self, q, **kwargs):
+        """Search the store and return the names of the cards."""
+        result = query.cards_search(self.store, q, **kwargs)
+        return [card['name'] for card in result['data']]
+    
+    def test_parse(self):
+        """query.parse() should build the syntax tree of a query."""
+        q = '(c:ug OR c=r) and not r>=rare "goblin guide" !"Abzan Banner"'
+        expected = ('and', [
+            ('or', [
+                ('term', 'color', ':', 'ug'), 
+                ('term', 'color', '=', 'r'),
+            ]),
+            ('not', ('term', 'rarity', '>=', 'rare')),
+            ('term', 'name', ':', 'goblin guide'),
+            ('term', 'name', '==', 'Abzan Banner'),
+        ])
+        self.assertEqual(query.parse(q), expected)
+    
+    def test_parse_BadKeyword(self):
+        """query.parse() negative test: unknown keyword."""
+        err = ValueError
+        msg_re = 'Unknown search keyword spam.'
+        self.assertRaisesRegex(err, msg_re, query.parse, 'spam:eggs')
+    
+    def test_parse_Unbalanced(self):
+        """query.parse() negative test: unbalanced parentheses."""
+        self.assertRaises(ValueError, query.parse, '(s:ktk or s:uma')
+        self.assertRaises(ValueError, query.parse, 's:ktk)')
+    
+    def test_compile_query(self):
+        """query.compile_query() should build a parameterized SQL 
+        condition.
+        """
+        q = 's:KTK -t:creature'
+        expected = (
+            "(set_code = ? AND "
+            "NOT COALESCE(type_line LIKE ? ESCAPE '\\', 0))", 
+            ['ktk', '%creature%'],
+        )
+        self.assertEqual(query.compile_query(q), expected)
+    
+    def test_cards_search_Set(self):
+        """query.cards_search() should find the cards in a set, 
+        sorted by name.
+        """
+        expected = [
+            'Abomination of Gudul', 
+            'Abzan Ascendancy', 
+            'Abzan Banner', 
+            'Abzan Battle Priest',
+        ]
+        self.assertEqual(self.names('set:ktk'), expected)
+    
+    def test_cards_search_Boolean(self):
+        """query.cards_search() should handle and, or, not, and 
+        grouping.
+        """
+        q = '(t:creature or o:"mana cost") -s:ktk'
+        expected = ['Hanweir Garrison', 'Noble Hierarch', 'Nourishing Shoal']
+        self.assertEqual(self.names(q), expected)
+        q = 'not (s:ktk or s:uma)'
+        self.assertEqual(self.names(q), ['Hanweir Garrison',])
+    
+    def test_cards_search_Colors(self):
+        """query.cards_search() should compare colors as sets."""
+        self.assertEqual(self.names('c:bg s:ktk'), [
+            'Abomination of Gudul', 
+            'Abzan Ascendancy',
+        ])
+        self.assertEqual(self.names('c=g'), [
+            'Noble Hierarch', 
+            'Nourishing Shoal',
+        ])
+        self.assertEqual(self.names('c:c'), ['Abzan Banner',])
+        self.assertEqual(self.names('id<=wg'), [
+            'Abzan Battle Priest', 
+            'Nourishing Shoal',
+        ])
+        self.assertEqual(self.names('c:m'), [
+            'Abomination of Gudul', 
+            'Abzan Ascendancy',
+        ])
+        self.assertEqual(self.names('c!=c'), [
+            'Abomination of Gudul', 
+            'Abzan Ascendancy', 
+            'Abzan Battle Priest', 
+            'Hanweir Garrison', 
+            'Noble Hierarch', 
+            'Nourishing Shoal',
+        ])
+        self.assertEqual(self.names('c<m'), [
+            'Abzan Banner', 
+            'Abzan Battle Priest', 
+            'Hanweir Garrison', 
+            'Noble Hierarch', 
+            'Nourishing Shoal',
+        ])
+        everything = self.names('s:ktk or s:uma or s:emn')
+        self.assertEqual(self.names('id!=c'), everything)
+    
+    def test_cards_search_Faces(self):
+        """query.cards_search() should search the Oracle text of the 
+        faces of multi-faced cards, and negated terms should keep 
+        cards that don't have the field.
+        """
+        card = dict(loads(scryfake.resp['cards'], strict=False)['data'][0])
+        del card['oracle_text']
+        del card['foil']
+        card['layout'] = 'transform'
+        card['card_faces'] = [
+            {'name': 'Spam', 'oracle_text': 'Flying'},
+            {'name': 'Eggs', 'oracle_text': 'Trample'},
+        ]
+        s = store.Store(':memory:')
+        try:
+            s.put_cards([card,])
+            for q, expected in (
+                ('o:trample', [card['name'],]),
+                ('-o:flying', []),
+                ('-o:haste', [card['name'],]),
+                ('-is:foil', [card['name'],]),
+            ):
+                result = query.cards_search(s, q)['data']
+                self.assertEqual([c['name'] for c in result], expected)
+        finally:
+            s.close()
+    
+    def test_cards_search_ColorsOp(self):
+        """query.cards_search() negative test: colorless and 
+        multicolored only support some operators.
+        """
+        err = ValueError
+        self.assertRaises(err, query.compile_query, 'c<c')
+        self.assertRaises(err, query.compile_query, 'c>m')
+    
+    def test_cards_search_AllColors(self):
+        """query.cards_search() should handle comparisons to all 
+        five colors.
+        """
+        everything = self.names('s:ktk or s:uma or s:emn')
+        self.assertEqual(self.names('c<=wubrg'), everything)
+        self.assertEqual(self.names('c<wubrg'), everything)
+        self.assertEqual(self.names('c>=wubrg'), [])
+    
+    def test_cards_search_Identity(self):
+        """query.cards_search() should find cards whose color 
+        identity fits within the colors for id:.
+        """
+        self.assertEqual(self.names('id:wg'), [
+            'Abzan Battle Priest', 
+            'Nourishing Shoal',
+        ])
+    
+    def test_cards_search_Wildcards(self):
+        """query.cards_search() should match LIKE wildcards in the 
+        query literally.
+        """
+        self.assertEqual(self.names('abzan%banner'), [])
+        self.assertEqual(self.names('abzan_banner'), [])
+        self.assertEqual(self.names('o:"%"'), [])
+        self.assertEqual(query.compile_query('o:50%')[1], ['%50\\%%',])
+    
+    def test_cards_search_CmcRarity(self):
+        """query.cards_search() should compare cmc and rarity."""
+        self.assertEqual(self.names('cmc>=4'), [
+            'Abomination of Gudul', 
+            'Abzan Battle Priest',
+        ])
+        self.assertEqual(self.names('r<rare s:ktk'), [
+            'Abomination of Gudul', 
+            'Abzan Banner', 
+            'Abzan Battle Priest',
+        ])
+        self.assertEqual(self.names('r:u'), ['Abzan Battle Priest',])
+    
+    def test_cards_search_Is(self):
+        """query.cards_search() should handle is: fields and layouts."""
+        self.assertEqual(self.names('is:reprint'), [
+            'Noble Hierarch', 
+            'Nourishing Shoal',
+        ])
+        self.assertEqual(self.names('is:meld'), ['Hanweir Garrison',])
+    
+    def test_cards_search_Name(self):
+        """query.cards_search() should match names by bare words and 
+        exactly with !.
+        """
+        self.assertEqual(self.names('abzan ba'), [
+            'Abzan Banner', 
+            'Abzan Battle Priest',
+        ])
+        self.assertEqual(self.names('!"Abzan Banner"'), ['Abzan Banner',])
+    
+    def test_cards_search_Unique(self):
+        """query.cards_search() should honor unique and the language 
+        options.
+        """
+        q = 'Nourishing'
+        self.assertEqual(self.names(q), ['Nourishing Shoal',])
+        result = self.names(q, include_multilingual=True)
+        self.assertEqual(result, ['Nourishing Shoal',])
+        result = self.names(q, unique='prints', include_multilingual=True)
+        self.assertEqual(result, ['Nourishing Shoal', 'Nourishing Shoal'])
+        result = query.cards_search(self.store, q + ' lang:ja')
+        self.assertEqual(result['data'][0]['lang'], 'ja')
+    
+    def test_cards_search_Order(self):
+        """query.cards_search() should sort by the given order and 
+        direction.
+        """
+        result = self.names('s:ktk', order='cmc', dir='desc')
+        self.assertEqual(result[0], 'Abomination of Gudul')
+        result = self.names('s:ktk', order='rarity')
+        self.assertEqual(result[0], 'Abzan Ascendancy')
+    
+    def test_cards_search_Page(self):
+        """query.cards_search() should return the results in pages 
+        like Scryfall.com.
+        """
+        result = query.cards_search(self.store, 's:ktk')
+        self.assertEqual(result['object'], 'list')
+        self.assertEqual(result['total_cards'], 4)
+        self.assertFalse(result['has_more'])
+        result = query.cards_search(self.store, 's:ktk', page=2)
+        self.assertEqual(result['data'], [])
+    
+    def test_cards_search_BadOrder(self):
+        """query.cards_search() negative test: invalid order."""
+        err = ValueError
+        msg_re = 'Invalid sort order spam.'
+        self.assertRaisesRegex(err, msg_re, query.cards_search, 
+                               self.store, 's:ktk', order='spam')
+
+
+class CheckpointTestCase(unittest.TestCase):
+    """Unit tests for checkpoint.py."""
+    # Tests for Checkpoint.
+    def test_save(self):
+        """Checkpoint.save() should save the page so it can be 
+        loaded, without leaving a temporary file.
+        """
+        with TemporaryDirectory() as dir:
+            path = os.path.join(dir, 'spam.checkpoint')
+            cp = checkpoint.Checkpoint(path, 'eggs')
+            self.assertEqual(cp.load(), 0)
+            cp.save(2, 'https://api.scryfall.com/cards?page=3')
+            cp.save(3)
+            self.assertEqual(checkpoint.Checkpoint(path, 'eggs').load(), 3)
+            self.assertEqual(os.listdir(dir), ['spam.checkpoint'])
+            cp.clear()
+            self.assertEqual(os.listdir(dir), [])
+    
+    def test_load_Fingerprint(self):
+        """Checkpoint.load() negative test: the fingerprint must 
+        match.
+        """
+        with TemporaryDirectory() as dir:
+            path = os.path.join(dir, 'spam.checkpoint')
+            checkpoint.Checkpoint(path, 'eggs').save(1)
+            cp = checkpoint.Checkpoint(path, 'bacon')
+            self.assertRaises(ValueError, cp.load)
+    
+    def test_load_Invalid(self):
+        """Checkpoint.load() negative test: the file must be a 
+        checkpoint.
+        """
+        with TemporaryDirectory() as dir:
+            path = os.path.join(dir, 'spam.checkpoint')
+            with open(path, 'w') as fh:
+                fh.write('spam')
+            cp = checkpoint.Checkpoint(path, 'eggs')
+            self.assertRaises(ValueError, cp.load)
+    
+    # Tests for fingerprint().
+    def test_fingerprint(self):
+        """fingerprint() should ignore missing parameters and their 
+        order, and tell different searches apart.
+        """
+        a = checkpoint.fingerprint('cards_search', 
+                                   {'q': 's:ktk', 'order': None})
+        b = checkpoint.fingerprint('cards_search', {'q': 's:ktk'})
+        c = checkpoint.fingerprint('cards_search', {'q': 's:frf'})
+        self.assertEqual(a, b)
+        self.assertNotEqual(a, c)
+
+
+class FlightTestCase(unittest.TestCase):
+    """Unit tests for flight.py."""
+    # Tests for SingleFlight.
+    def test_do(self):
+        """SingleFlight.do() should return the result of the call."""
+        flights = flight.SingleFlight()
+        self.assertEqual(flights.do('spam', max, 1, 2), 2)
+        self.assertEqual(flights.in_flight(), 0)
+    
+    def test_do_Shared(self):
+        """SingleFlight.do() should run concurrent calls with the same 
+        key once and give every caller the result.
+        """
+        flights = flight.SingleFlight()
+        release = Event()
+        runs = []
+        def fn():
+            runs.append(1)
+            release.wait(2)
+            return object()
+        results = []
+        threads = [Thread(target=lambda: results.append(flights.do('k', fn)))
+                   for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        deadline = monotonic() + 2
+        while flights.shared < 2 and monotonic() < deadline:
+            sleep(.01)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(runs), 1)
+        self.assertEqual(flights.calls, 1)
+        self.assertEqual(flights.shared, 2)
+        self.assertTrue(all(result is results[0] for result in results))
+    
+    def test_do_Exception(self):
+        """SingleFlight.do() should raise the exception of the call 
+        for the caller that ran it, and a copy chained to it for 
+        each waiter.
+        """
+        flights = flight.SingleFlight()
+        release = Event()
+        def fn():
+            release.wait(2)
+            raise ValueError('spam')
+        errors = []
+        def call():
+            try:
+                flights.do('k', fn)
+            except ValueError as ex:
+                errors.append(ex)
+        threads = [Thread(target=call) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        deadline = monotonic() + 2
+        while flights.shared < 1 and monotonic() < deadline:
+            sleep(.01)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(errors), 2)
+        original = [ex for ex in errors if ex.__cause__ is None]
+        copies = [ex for ex in errors if ex.__cause__ is not None]
+        self.assertEqual(len(original), 1)
+        self.assertIs(copies[0].__cause__, original[0])
+        self.assertEqual(copies[0].args, ('spam',))
+    
+    def test_do_Sequential(self):
+        """SingleFlight.do() should run the call again once the call 
+        in flight has finished.
+        """
+        flights = flight.SingleFlight()
+        runs = []
+        flights.do('k', runs.append, 1)
+        flights.do('k', runs.append, 2)
+        self.assertEqual(runs, [1, 2])
+        self.assertEqual(flights.shared, 0)
+
+
+class RetryTestCase(unittest.TestCase):
+    """Unit tests for retry.py."""
+    # Tests for RetryPolicy.
+    def test_delay(self):
+        """RetryPolicy.delay() should double the wait for each retry 
+        up to max_backoff.
+        """
+        policy = retry.RetryPolicy(4, backoff=1, max_backoff=3, jitter=0)
+        waits = [policy.delay(attempt, 500) for attempt in range(1, 5)]
+        self.assertEqual(waits, [1, 2, 3, None])
+        self.assertEqual(policy.stats(), {
+            'retries': 3,
+            'retry_seconds': 6,
+            'exhausted': 1,
+        })
+    
+    def test_delay_Jitter(self):
+        """RetryPolicy.delay() should wait a random part of the 
+        backoff.
+        """
+        policy = retry.RetryPolicy(2, backoff=1, jitter=.5, budget=100)
+        for _ in range(50):
+            wait = policy.delay(1, 503)
+            self.assertTrue(.5 <= wait <= 1)
+    
+    def test_delay_RetryAfter(self):
+        """RetryPolicy.delay() should use the Retry-After header 
+        instead of the backoff.
+        """
+        policy = retry.RetryPolicy(backoff=1, jitter=0)
+        self.assertEqual(policy.delay(1, 429, '7'), 7)
+    
+    def test_delay_RetryAfterLong(self):
+        """RetryPolicy.delay() should not retry when the Retry-After 
+        header is longer than max_backoff.
+        """
+        policy = retry.RetryPolicy(max_backoff=30, jitter=0)
+        self.assertIsNone(policy.delay(1, 429, '3600'))
+        self.assertEqual(policy.stats()['exhausted'], 1)
+        self.assertEqual(policy.stats()['retries'], 0)
+    
+    def test_delay_Status(self):
+        """RetryPolicy.delay() should not retry other statuses."""
+        policy = retry.RetryPolicy()
+        self.assertIsNone(policy.delay(1, 404))
+        self.assertEqual(policy.stats()['exhausted'], 0)
+    
+    def test_delay_Budget(self):
+        """RetryPolicy.delay() should stop retrying when the budget 
+        is spent, and requests should refill it.
+        """
+        policy = retry.RetryPolicy(budget=2, budget_ratio=.5)
+        self.assertIsNotNone(policy.delay(1, 503))
+        self.assertIsNotNone(policy.delay(1, 503))
+        self.assertIsNone(policy.delay(1, 503))
+        policy.record_request()
+        policy.record_request()
+        self.assertIsNotNone(policy.delay(1, 503))
+    
+    def test_RetryPolicy_Invalid(self):
+        """RetryPolicy negative test: attempts and jitter must be 
+        valid.
+        """
+        self.assertRaises(ValueError, retry.RetryPolicy, 0)
+        self.assertRaises(ValueError, retry.RetryPolicy, jitter=2)
+    
+    # Tests for parse_retry_after().
+    def test_parse_retry_after(self):
+        """parse_retry_after() should read seconds and HTTP dates."""
+        self.assertEqual(retry.parse_retry_after('3'), 3)
+        self.assertEqual(retry.parse_retry_after(
+            'Wed, 21 Oct 2015 07:28:00 GMT'
+        ), 0)
+        self.assertIsNone(retry.parse_retry_after(None))
+        self.assertIsNone(retry.parse_retry_after('spam'))
+
+
+class RateLimiterTestCase(unittest.TestCase):
+    """Unit tests for ratelimit.py."""
+    # Tests for RateLimiter.
+    def test_acquire_Burst(self):
+        """RateLimiter.acquire() should not wait within the burst."""
+        limiter = ratelimit.RateLimiter(1, burst=3)
+        start = monotonic()
+        for _ in range(3):
+            limiter.acquire()
+        self.assertLess(monotonic() - start, .5)
+    
+    def test_acquire_Limit(self):
+        """RateLimiter.acquire() should wait once the burst is 
+        used up.
+        """
+        limiter = ratelimit.RateLimiter(10, burst=2)
+        start = monotonic()
+        for _ in range(4):
+            limiter.acquire()
+        self.assertGreaterEqual(monotonic() - start, .19)
+    
+    def test_acquire_Elapsed(self):
+        """RateLimiter.acquire() should only wait for the time 
+        remaining since the last request.
+        """
+        limiter = ratelimit.RateLimiter(5)
+        limiter.acquire()
+        sleep(.2)
+        start = monotonic()
+        limiter.acquire()
+        self.assertLess(monotonic() - start, .1)
+    
+    def test_acquire_Threads(self):
+        """RateLimiter.acquire() should limit requests made from 
+        several threads.
+        """
+        limiter = ratelimit.RateLimiter(20)
+        threads = [Thread(target=limiter.acquire) for _ in range(5)]
+        start = monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertGreaterEqual(monotonic() - start, .19)
+    
+    def test_acquire_async(self):
+        """RateLimiter.acquire_async() should limit requests made 
+        from several tasks.
+        """
+        limiter = ratelimit.RateLimiter(20)
+        async def main():
+            tasks = [limiter.acquire_async() for _ in range(5)]
+            await asyncio.gather(*tasks)
+        start = monotonic()
+        asyncio.run(main())
+        self.assertGreaterEqual(monotonic() - start, .19)
+    
+    def test_RateLimiter_BadRate(self):
+        """RateLimiter() negative test: rate of zero."""
+        err = ValueError
+        msg_re = 'Rate must be greater than zero. Was 0.'
+        self.assertRaisesRegex(err, msg_re, ratelimit.RateLimiter, 0)
+
+
 class PVTestCase(unittest.TestCase):
     """Unit tests for pyvalidate.pyvalidate."""
     # Tests for isvalid().
@@ -211,6 +1825,28 @@ class PVTestCase(unittest.TestCase):
         self.assertRaisesRegex(err, msg_re, PV.isvalid, item, name, 
                                vtype, pattern=pattern)
     
+    def test_isvalid_CompiledPattern(self):
+        """PV.isvalid() negative test: compiled string pattern."""
+        item = 'spam'
+        name = 'String'
+        vtype = str
+        pattern = re_compile('^e.*s$')
+        err = ValueError
+        msg_re = r'String must match pattern \^e\.\*s\$\.'
+        self.assertRaisesRegex(err, msg_re, PV.isvalid, item, name, 
+                               vtype, pattern=pattern)
+    
+    def test_isvalid_FrozensetEnum(self):
+        """PV.isvalid() test: enum as a frozenset."""
+        name = 'Beatle'
+        vtype = str
+        enum = frozenset(['John', 'Paul', 'George', 'Ringo'])
+        self.assertTrue(PV.isvalid('Ringo', name, vtype, enum=enum))
+        err = ValueError
+        msg_re = 'Beatle does not match a value in list.'
+        self.assertRaisesRegex(err, msg_re, PV.isvalid, 'Mick', name, 
+                               vtype, enum=enum)
+    
     
     # Tests for isvalidseq().
     def test_isvalidseq_HappyTuple(self):
@@ -620,6 +2256,394 @@ class PVTestCase(unittest.TestCase):
             "score": 98
         }
         self.assertEqual(result, expected)
+    
+    def test_iter_httpjson_Happy(self):
+        """PV.iter_httpjson positive test."""
+        ctype = 'application/json; charset=utf-8'
+        chunks = [b'{"object": "list", "data": [{"score"', 
+                  b': 98}, {"score": 5', b'0}], "has_more": false}']
+        name = 'Test HTTPJSON'
+        val = PV.isvalidmap
+        valkwargs = {
+            'req': {
+                'score': {
+                    'val': PV.isvalid,
+                    'valkwargs': {'validtype': int, 'min': 50,},
+                },
+            },
+        }
+        envelope = {
+            'val': PV.isvalidmap,
+            'valkwargs': {
+                'req': {
+                    'object': {
+                        'val': PV.isvalid,
+                        'valkwargs': {'validtype': str,},
+                    },
+                    'data': {
+                        'val': PV.isvalid,
+                        'valkwargs': {'validtype': list,},
+                    },
+                    'has_more': {
+                        'val': PV.isvalid,
+                        'valkwargs': {'validtype': bool,},
+                    },
+                },
+            },
+        }
+        items = PV.iter_httpjson(ctype, chunks, name, val, valkwargs, 
+                                 envelope)
+        result = []
+        while True:
+            try:
+                result.append(next(items))
+            except StopIteration as ex:
+                fields = ex.value
+                break
+        self.assertEqual(result, [{'score': 98}, {'score': 50}])
+        self.assertEqual(fields, {
+            'object': 'list', 
+            'data': [], 
+            'has_more': False,
+        })
+    
+    def test_iter_httpjson_BadItem(self):
+        """PV.iter_httpjson negative test: the items before the 
+        invalid item are yielded before the exception is raised.
+        """
+        ctype = 'application/json; charset=utf-8'
+        chunks = [b'[{"score": 98}, {"score": 4', b'9}]']
+        name = 'Test HTTPJSON'
+        val = PV.isvalidmap
+        valkwargs = {
+            'req': {
+                'score': {
+                    'val': PV.isvalid,
+                    'valkwargs': {'validtype': int, 'min': 50,},
+                },
+            },
+        }
+        items = PV.iter_httpjson(ctype, chunks, name, val, valkwargs)
+        self.assertEqual(next(items), {'score': 98})
+        err = ValueError
+        msg_re = 'Test HTTPJSON:1:score must be at least 50.'
+        self.assertRaisesRegex(err, msg_re, next, items)
+    
+    def test_iter_httpjson_BadCtype(self):
+        """PV.iter_httpjson negative test: the Content-Type is 
+        validated before any content is read.
+        """
+        ctype = 'text/html; charset=utf-8'
+        chunks = iter(())
+        err = ValueError
+        self.assertRaises(err, PV.iter_httpjson, ctype, chunks, 'spam', 
+                          PV.isvalid, {'validtype': int})
+    
+    def test_validate_httpjson_Leaves(self):
+        """PV.validate_httpjson positive test: normalize the decoded 
+        strings rather than the text.
+        """
+        ctype = 'application/json; charset=utf-8'
+        content = '{"name": "Montre\u0301al"}'.encode('utf_8')
+        name = 'Test HTTPJSON'
+        val = PV.isvalidmap
+        valkwargs = {
+            'req': {
+                'name': {
+                    'val': PV.isvalid,
+                    'valkwargs': {
+                        'validtype': str,
+                    }
+                },
+            }
+        }
+        expected = {'name': 'Montr\u00e9al'}
+        current = N.decoder
+        try:
+            for decoder in N.decoders:
+                N.set_decoder(decoder)
+                result = PV.validate_httpjson(ctype, content, name, val, 
+                                              valkwargs, 
+                                              normalize_leaves=True)
+                self.assertEqual(result, expected)
+        finally:
+            N.set_decoder(current)
+
+
+    # Tests for compile_validator().
+    def assertSameResult(self, spec, item, name):
+        """Assert that the compiled and interpreted forms of a 
+        validator give the same result for an item.
+        """
+        def run(fn, *args, **kwargs):
+            try:
+                return fn(*args, **kwargs)
+            except Exception as ex:
+                return type(ex), str(ex)
+        
+        val = spec['val']
+        valkwargs = spec['valkwargs']
+        expected = run(val, item, name, **valkwargs)
+        compiled = PV.compile_validator(val, valkwargs)
+        self.assertEqual(run(compiled, item, name), expected)
+        return expected
+    
+    def test_compile_validator_Happy(self):
+        """PV.compile_validator() positive test: a card list."""
+        spec = config.cvals['sf_cardlist']
+        item = loads(scryfake.resp['cards_search'], strict=False)
+        result = self.assertSameResult(spec, item, 'cards_search')
+        self.assertTrue(result)
+    
+    def test_compile_validator_Errors(self):
+        """PV.compile_validator() negative tests: compiled validators 
+        should raise the same exceptions as the interpreted ones.
+        """
+        spec = config.cvals['sf_card']
+        card = loads(scryfake.resp['cards_search'], strict=False)['data'][0]
+        changes = [
+            ('cmc', 'spam'),
+            ('rarity', 'spam'),
+            ('id', 'spam'),
+            ('set', 'x'),
+            ('set', 'spamspam'),
+            ('color_identity', ['W', 'X']),
+            ('color_identity', 3),
+            ('legalities', {'spam': 'legal'}),
+            ('mana_cost', '{W}{X}{Q}{Z}{spam}'),
+            ('uri', 'http://api.scryfall.com/'),
+            ('spam', 'eggs'),
+        ]
+        for key, value in changes:
+            item = dict(card)
+            item[key] = value
+            result = self.assertSameResult(spec, item, 'card')
+            self.assertIsInstance(result, tuple)
+        item = dict(card)
+        del item['name']
+        del item['lang']
+        result = self.assertSameResult(spec, item, 'card')
+        self.assertEqual(result[0], KeyError)
+        self.assertSameResult(spec, [card], 'card')
+    
+    def test_compile_validator_Custom(self):
+        """PV.compile_validator() should call validators that have 
+        no compiler with their keyword arguments.
+        """
+        spec = {
+            'val': PV.isvalidurl,
+            'valkwargs': {'vscheme': 'https'},
+        }
+        self.assertSameResult(spec, 'https://spam.test', 'URL')
+        self.assertSameResult(spec, 'http://spam.test', 'URL')
+    
+    
+    # Tests for NamePath.
+    def test_NamePath(self):
+        """PV.NamePath should render as the joined path."""
+        name = PV.NamePath(PV.NamePath('Python', 'pet'), 0)
+        self.assertEqual(str(name), 'Python:pet:0')
+        self.assertEqual(name + ':name', 'Python:pet:0:name')
+        self.assertEqual('{} is bad.'.format(name), 'Python:pet:0 is bad.')
+        self.assertEqual(name, 'Python:pet:0')
+    
+    def test_NamePath_Nested(self):
+        """Exceptions from nested validation should name the full 
+        path to the invalid item.
+        """
+        spec = config.cvals['sf_cardlist']
+        item = loads(scryfake.resp['cards_search'], strict=False)
+        item['data'][1]['legalities']['modern'] = 'spam'
+        err = ValueError
+        msg_re = ('^cards_search:data:1:legalities:modern does not match '
+                  'a value in list.$')
+        compiled = PV.compile_validator(spec['val'], spec['valkwargs'])
+        self.assertRaisesRegex(err, msg_re, compiled, item, 'cards_search')
+        self.assertRaisesRegex(err, msg_re, spec['val'], item, 
+                               'cards_search', **spec['valkwargs'])
+    
+    
+    # Tests for compile_mode().
+    def test_compile_mode(self):
+        """PV.compile_mode() should only validate what the mode 
+        covers.
+        """
+        spec = config.cvals['sf_cardlist']
+        item = loads(scryfake.resp['cards_search'], strict=False)
+        item['data'][1]['legalities']['modern'] = 'spam'
+        name = 'cards_search'
+        
+        def compile(mode, sample=.1):
+            return PV.compile_mode(spec['val'], spec['valkwargs'], 
+                                   mode, sample)
+        
+        self.assertRaises(ValueError, compile('full'), item, name)
+        self.assertRaises(ValueError, compile('sampled', 1), item, name)
+        self.assertTrue(compile('sampled', 0)(item, name))
+        self.assertTrue(compile('structural')(item, name))
+        self.assertTrue(compile('off')(item, name))
+        
+        item['has_more'] = 'spam'
+        self.assertRaises(TypeError, compile('sampled', 0), item, name)
+        self.assertRaises(TypeError, compile('structural'), item, name)
+        self.assertTrue(compile('off')(item, name))
+        
+        del item['has_more']
+        self.assertRaises(KeyError, compile('structural'), item, name)
+    
+    def test_compile_mode_BadMode(self):
+        """PV.compile_mode() negative test: unknown mode."""
+        err = ValueError
+        msg_re = 'spam is not a validation mode.'
+        self.assertRaisesRegex(err, msg_re, PV.compile_mode, PV.isvalid, 
+                               {'validtype': str}, 'spam')
+    
+    
+    # Tests for ResultCache.
+    def test_ResultCache_Evict(self):
+        """PV.ResultCache should evict the least recently used 
+        result when full.
+        """
+        cache = PV.ResultCache(2)
+        cache.put('spam', 1)
+        cache.put('eggs', 2)
+        cache.get('spam')
+        cache.put('bacon', 3)
+        self.assertRaises(KeyError, cache.get, 'eggs')
+        self.assertEqual(cache.get('spam'), 1)
+        self.assertEqual(len(cache), 2)
+    
+    
+    # Tests for trust_boundary().
+    def test_trust_boundary_Cache(self):
+        """PV.trust_boundary() should only validate the same output 
+        once when tbcache is set.
+        """
+        calls = []
+        def val(ctype, content, name):
+            calls.append(name)
+            return loads(content)
+        
+        @PV.trust_boundary
+        def spam(content):
+            return 'application/json', content
+        
+        PV.tbvals['spam'] = {'val': val, 'valkwargs': {}}
+        PV.tbcache = PV.ResultCache()
+        try:
+            self.assertEqual(spam(b'[1]'), [1])
+            self.assertEqual(spam(b'[1]'), [1])
+            self.assertEqual(spam(b'[2]'), [2])
+            self.assertEqual(calls, ['spam', 'spam'])
+            self.assertEqual(PV.tbcache.hits, 1)
+        finally:
+            PV.tbcache = None
+            del PV.tbvals['spam']
+            del PV.tbstats['spam']
+    
+    def test_trust_boundary_CacheCall(self):
+        """PV.trust_boundary() should return a fresh cached result 
+        without calling the function again.
+        """
+        calls = []
+        @PV.trust_boundary
+        def spam(content, pretty=False):
+            calls.append(content)
+            return 'application/json', content
+        
+        PV.tbvals['spam'] = {'val': lambda c, s, n: loads(s), 
+                             'valkwargs': {}}
+        PV.tbcache = PV.ResultCache()
+        try:
+            self.assertEqual(spam(b'[1]'), [1])
+            self.assertEqual(spam(b'[1]', pretty=False), [1])
+            self.assertEqual(spam(content=b'[1]'), [1])
+            self.assertEqual(calls, [b'[1]'])
+            self.assertEqual(PV.tbstats['spam']['cache_hits'], 2)
+        finally:
+            PV.tbcache = None
+            del PV.tbvals['spam']
+            del PV.tbstats['spam']
+    
+    def test_trust_boundary_CacheStale(self):
+        """PV.trust_boundary() should call the function again for a 
+        stale result, and only validate the output if it changed.
+        """
+        calls = []
+        def val(ctype, content, name):
+            calls.append(content)
+            return loads(content)
+        
+        output = [b'[1]']
+        @PV.trust_boundary
+        def spam():
+            return 'application/json', output[0]
+        
+        PV.tbvals['spam'] = {'val': val, 'valkwargs': {}}
+        PV.tbcache = PV.ResultCache(ttl=0)
+        try:
+            self.assertEqual(spam(), [1])
+            self.assertEqual(spam(), [1])
+            output[0] = b'[2]'
+            self.assertEqual(spam(), [2])
+            self.assertEqual(calls, [b'[1]', b'[2]'])
+        finally:
+            PV.tbcache = None
+            del PV.tbvals['spam']
+            del PV.tbstats['spam']
+    
+    def test_trust_boundary_CacheSample(self):
+        """PV.trust_boundary() should not return a result cached 
+        under a different sample.
+        """
+        calls = []
+        def val(ctype, content, name):
+            calls.append(name)
+            return loads(content)
+        
+        @PV.trust_boundary
+        def spam(content):
+            return 'application/json', content
+        
+        PV.tbvals['spam'] = {'val': val, 'valkwargs': {}, 'sample': .1}
+        PV.tbcache = PV.ResultCache()
+        try:
+            spam(b'[1]')
+            PV.tbvals['spam']['sample'] = .5
+            spam(b'[1]')
+            self.assertEqual(calls, ['spam', 'spam'])
+        finally:
+            PV.tbcache = None
+            del PV.tbvals['spam']
+            del PV.tbstats['spam']
+    
+    def test_trust_boundary_Mode(self):
+        """PV.trust_boundary() should use the mode in tbvals and 
+        record it in tbstats.
+        """
+        @PV.trust_boundary
+        def spam(content):
+            return 'application/json; charset=utf-8', content
+        
+        PV.tbvals['spam'] = {
+            'val': PV.validate_httpjson,
+            'valkwargs': {
+                'val': PV.isvalidseq,
+                'valkwargs': {
+                    'val': PV.isvalid,
+                    'valkwargs': {'validtype': int},
+                },
+            },
+        }
+        try:
+            self.assertRaises(TypeError, spam, b'[1, "eggs"]')
+            PV.tbvals['spam']['mode'] = 'structural'
+            self.assertEqual(spam(b'[1, "eggs"]'), [1, 'eggs'])
+            self.assertEqual(PV.tbstats['spam']['mode'], 'structural')
+            self.assertEqual(PV.tbstats['spam']['calls'], 1)
+        finally:
+            del PV.tbvals['spam']
+            del PV.tbstats['spam']
 
 
 class NormalizeTestCase(unittest.TestCase):
@@ -637,6 +2661,25 @@ class NormalizeTestCase(unittest.TestCase):
         expected = '\u03a9'
         self.assertEqual(N.canonicalize(text), expected)
 
+    def test_canonicalize_Normalized(self):
+        """N.canonicalize() should return text that is already in 
+        normal form without copying it.
+        """
+        for text in ('Montreal', 'Montr\u00e9al'):
+            self.assertIs(N.canonicalize(text), text)
+    
+    def test_canonicalize_Decomposed(self):
+        """N.canonicalize() should compose decomposed text."""
+        text = 'Montre\u0301al'
+        expected = 'Montr\u00e9al'
+        self.assertEqual(N.canonicalize(text), expected)
+    
+    def test_canonicalize_NoForm(self):
+        """N.canonicalize() should only decode if there is no form."""
+        text = 'Montre\u0301al'.encode('utf_8')
+        expected = 'Montre\u0301al'
+        self.assertEqual(N.canonicalize(text, dest_form=None), expected)
+    
     def test_canonicalize_BadCharacter(self): 
         text = b'Montr\xe9al'
         name = 'city'
@@ -660,6 +2703,22 @@ class NormalizeTestCase(unittest.TestCase):
                                dest_form=form)
     
     
+    # Tests for canonicalize_leaves().
+    def test_canonicalize_leaves(self):
+        """N.canonicalize_leaves() should normalize the keys and 
+        strings of decoded JSON.
+        """
+        item = {
+            'name': 'Montre\u0301al',
+            'cafe\u0301': ['\u2126', 3, None, {'spam': 'eggs'}],
+        }
+        expected = {
+            'name': 'Montr\u00e9al',
+            'caf\u00e9': ['\u03a9', 3, None, {'spam': 'eggs'}],
+        }
+        self.assertEqual(N.canonicalize_leaves(item), expected)
+    
+    
     # Tests for from_json().
     def test_from_json_Happy(self):
         """N.from_json() positive test."""
@@ -681,6 +2740,76 @@ class NormalizeTestCase(unittest.TestCase):
         err = TypeError
         msg_re = 'Text was not valid JSON.'
         self.assertRaisesRegex(err, msg_re, N.from_json, text)
+    
+    def test_iter_json_Object(self):
+        """N.iter_json() should yield the items of the streamed array 
+        and return the other fields, however the text is chunked.
+        """
+        text = ('{"object": "list", "data": [1, "caf\u00e9", '
+                '{"a": [2, {"b": null}]}, [], "]}"], "has_more": true}')
+        data = text.encode('utf_8')
+        for size in (1, 2, 3, 7, len(data)):
+            chunks = (data[i:i + size] for i in range(0, len(data), size))
+            items = N.iter_json(chunks, 'data')
+            result = []
+            while True:
+                try:
+                    result.append(next(items))
+                except StopIteration as ex:
+                    fields = ex.value
+                    break
+            self.assertEqual(result, loads(text)['data'])
+            self.assertEqual(fields, {
+                'object': 'list', 
+                'data': [], 
+                'has_more': True,
+            })
+    
+    def test_iter_json_Array(self):
+        """N.iter_json() should stream a top-level array."""
+        chunks = [' [ 1, ', '2 , {"spam"', ': "eggs"} ] ']
+        result = list(N.iter_json(chunks))
+        self.assertEqual(result, [1, 2, {'spam': 'eggs'}])
+    
+    def test_iter_json_BadJSON(self):
+        """N.iter_json() negative test: invalid JSON."""
+        chunks = [b'[1, 2', b' 3]']
+        items = N.iter_json(chunks)
+        self.assertEqual(next(items), 1)
+        err = TypeError
+        msg_re = 'Text was not valid JSON.'
+        self.assertRaisesRegex(err, msg_re, list, items)
+    
+    def test_from_json_Decoders(self):
+        """N.from_json() should give the same results with each 
+        registered decoder, from str or bytes.
+        """
+        text = scryfake.resp['cards_search']
+        expected = loads(text, strict=False)
+        current = N.decoder
+        try:
+            for decoder in N.decoders:
+                N.set_decoder(decoder)
+                self.assertEqual(N.from_json(text), expected)
+                self.assertEqual(N.from_json(text.decode()), expected)
+                self.assertRaises(TypeError, N.from_json, b'{]')
+        finally:
+            N.set_decoder(current)
+    
+    
+    # Tests for set_decoder().
+    def test_set_decoder_BadName(self):
+        """N.set_decoder() negative test: unknown decoder."""
+        err = ValueError
+        msg_re = 'No JSON decoder named spam.'
+        self.assertRaisesRegex(err, msg_re, N.set_decoder, 'spam')
+    
+    def test_decoder_Default(self):
+        """The stdlib json decoder should be the default even if 
+        other decoders are registered.
+        """
+        self.assertEqual(config.json_decoder, None)
+        self.assertEqual(N.decoder, 'json')
 
     
     # Tests for from_ctype().